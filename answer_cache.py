@@ -0,0 +1,157 @@
+"""
+Semantic response cache for the FAQ path of `/chat`.
+
+A new question whose embedding is within a cosine-similarity threshold of a cached
+question with the same intent reuses the cached grounded answer, skipping retrieval
+and generation. Entries are evicted least-recently-used first, and the whole cache is
+dropped whenever the watched FAQ file changes.
+
+An answer can be stored with a scope (e.g. a session name) when it depends on more than
+the question, such as the conversation it was generated in; it is then only reused for
+lookups with the same scope. Unscoped answers are shared by every lookup.
+"""
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def file_fingerprint(path):
+    """Returns a SHA-256 digest of a file's content, or None if it cannot be read."""
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def files_fingerprint(paths):
+    """Returns the fingerprints of several files, in order."""
+    return tuple(file_fingerprint(path) for path in paths)
+
+
+def files_stat(paths):
+    """Returns (mtime, size) for each file, or None for files that cannot be read."""
+    stats = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            stats.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            stats.append(None)
+    return tuple(stats)
+
+
+class SemanticAnswerCache:
+    """
+    A size-bounded cache of answers keyed by question embedding and intent.
+
+    Args:
+        threshold (float): Minimum cosine similarity between questions for a cache hit.
+        max_size (int): Maximum number of cached answers.
+        source_path (str or list, optional): File, or files, whose changes invalidate the cache (the FAQ).
+    """
+
+    def __init__(self, threshold=0.95, max_size=256, source_path=None):
+        self.threshold = threshold
+        self.max_size = max_size
+        self.source_path = source_path
+        self._source_paths = [source_path] if isinstance(source_path, str) else list(source_path or [])
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # id -> (intent, normalized vector, question, answer, scope)
+        self._next_id = 0
+        self._matrix = None  # (ids, stacked vectors), rebuilt lazily after changes
+        self._lock = threading.Lock()
+        self._source_stat = None
+        self._source_fingerprint = files_fingerprint(self._source_paths)
+        self._check_source()
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_source(self):
+        """Clears the cache if the watched files changed since the last check."""
+        if not self._source_paths:
+            return
+        stat = files_stat(self._source_paths)
+        if stat == self._source_stat:
+            return
+
+        self._source_stat = stat
+        fingerprint = files_fingerprint(self._source_paths)
+        if fingerprint != self._source_fingerprint:
+            logger.info("FAQ file changed, clearing the answer cache", extra={"path": self.source_path})
+            self._source_fingerprint = fingerprint
+            self._entries.clear()
+            self._matrix = None
+
+    def lookup(self, vector, intent, scope=None):
+        """
+        Returns the cached answer for the most similar question with the same intent, or None.
+
+        Args:
+            vector (list): Embedding of the new question.
+            intent (str): Detected intent of the new question.
+            scope (str, optional): Also consider answers stored with this scope.
+        """
+        query = self._normalize(vector)
+        with self._lock:
+            self._check_source()
+            if self._matrix is None and self._entries:
+                ids = list(self._entries)
+                self._matrix = (ids, np.stack([self._entries[i][1] for i in ids]))
+            if self._matrix is None:
+                self.misses += 1
+                return None
+
+            ids, matrix = self._matrix
+            if matrix.shape[1] != query.shape[0]:
+                self.misses += 1
+                return None
+            scores = matrix @ query
+            for position in np.argsort(-scores):
+                if scores[position] < self.threshold:
+                    break
+                entry_id = ids[position]
+                entry = self._entries[entry_id]
+                if entry[0] == intent and entry[4] in (None, scope):
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    return entry[3]
+            self.misses += 1
+            return None
+
+    def store(self, vector, intent, question, answer, scope=None):
+        """
+        Caches an answer, evicting the least recently used entries beyond `max_size`.
+
+        Args:
+            scope (str, optional): Only reuse the answer for lookups with this scope; None shares it.
+        """
+        with self._lock:
+            self._check_source()
+            self._entries[self._next_id] = (intent, self._normalize(vector), question, answer, scope)
+            self._next_id += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def clear(self):
+        """Drops every cached answer."""
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self):
+        """Returns hit/miss counters and the number of cached answers."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
@@ -0,0 +1,450 @@
+"""
+Local appointment slot parser.
+
+Extracts the date, time and purpose of an appointment request ("tomorrow at 2 PM for a
+study room") with rules, so most booking turns need no LLM extraction call. Relative
+dates ("tomorrow", "next Friday", "in 3 days") are resolved against a reference clock in
+the library's time zone, and times without AM/PM ("at 3") are resolved with the library's
+opening hours, which are also used to reject slots when the library is closed.
+
+Every field comes with a confidence score: 0.0 when the message has no cue for it at all,
+low values for vague cues ("next week", "in the afternoon") and high values for explicit
+ones. The server asks the LLM only for fields below its threshold.
+"""
+import datetime
+import os
+import re
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+FIELDS = ("date", "time", "purpose")
+
+# Opening hours by weekday (Monday is 0), as (opening, closing) times; None when closed
+OPENING_HOURS = {
+    0: (datetime.time(9), datetime.time(20)),
+    1: (datetime.time(9), datetime.time(20)),
+    2: (datetime.time(9), datetime.time(20)),
+    3: (datetime.time(9), datetime.time(20)),
+    4: (datetime.time(9), datetime.time(20)),
+    5: (datetime.time(10), datetime.time(18)),
+    6: None,
+}
+
+LIBRARY_TIMEZONE = os.getenv("LIBRARY_TIMEZONE", "America/New_York")
+
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+MONTHS = ("january", "february", "march", "april", "may", "june", "july", "august", "september",
+          "october", "november", "december")
+NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "a": 1, "an": 1}
+HOUR_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9,
+              "ten": 10, "eleven": 11, "twelve": 12}
+
+_MONTH_NAMES = r"jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec"
+_MONTH = rf"(?P<month>{_MONTH_NAMES})[a-z]*\.?"
+_DAY = r"(?P<day>\d{1,2})(?:st|nd|rd|th)?"
+_YEAR = r"(?:,?\s+(?P<year>\d{4}))?"
+
+ISO_DATE = re.compile(r"\b(?P<year>\d{4})-(?P<month>\d{1,2})-(?P<day>\d{1,2})\b")
+NUMERIC_DATE = re.compile(r"\b(?P<month>\d{1,2})/(?P<day>\d{1,2})(?:/(?P<year>\d{2,4}))?\b")
+MONTH_DAY = re.compile(rf"\b{_MONTH}\s+{_DAY}\b{_YEAR}", re.IGNORECASE)
+DAY_MONTH = re.compile(rf"\b(?:the\s+)?{_DAY}\s+(?:of\s+)?{_MONTH}{_YEAR}", re.IGNORECASE)
+RELATIVE_DAY = re.compile(r"\b(?P<word>today|tonight|tomorrow|day\s+after\s+tomorrow)\b", re.IGNORECASE)
+IN_DAYS = re.compile(r"\bin\s+(?P<count>\d+|one|two|three|four|five|six|seven|a|an)\s+(?P<unit>days?|weeks?)\b",
+                     re.IGNORECASE)
+WEEKDAY = re.compile(r"\b(?:(?P<modifier>this|next|on|coming)\s+)?(?P<weekday>(?:mon|tues|wednes|thurs|fri|satur|sun)day)\b",
+                     re.IGNORECASE)
+VAGUE_DATE = re.compile(r"\b(this|next)\s+(week|weekend|month)|\bsoon\b|\bsometime\b|\blater\b", re.IGNORECASE)
+
+_MERIDIEM = r"[ap]\.?m\.?(?!\w)"
+_HOUR_WORD = "|".join(HOUR_WORDS)
+# Time phrases, which are never what an appointment is for ("a room for two o'clock")
+_TIME_PHRASE = (rf"(?:(?:\d{{1,2}}|{_HOUR_WORD})(?::\d{{2}})?\s*(?:o['’]?clock\b|{_MERIDIEM})|(?:half|quarter)\s+(?:past|to)\b"
+                r"|noon\b|midday\b|lunch(?:time)?\b|(?:the\s+)?(?:morning|afternoon|evening)\b)")
+
+# "from 2 to 4pm", "2-4 PM", "between 10:30 and noon": the appointment starts at the first time
+TIME_RANGE = re.compile(
+    r"(?<![\d/-])(?:(?P<between>between)\s+|from\s+)?(?P<hour>\d{1,2})(?::(?P<minute>\d{2}))?\s*"
+    rf"(?P<meridiem>{_MERIDIEM})?\s*(?:-|–|to|until|till|(?P<and>and))\s*"
+    rf"(?P<end_hour>\d{{1,2}})(?::(?P<end_minute>\d{{2}}))?\s*(?P<end_meridiem>{_MERIDIEM})?(?![\d/-])",
+    re.IGNORECASE,
+)
+O_CLOCK = re.compile(rf"\b(?P<hour>\d{{1,2}}|{_HOUR_WORD})\s+o['’]?clock\b", re.IGNORECASE)
+CLOCK_TIME = re.compile(r"\b(?P<hour>\d{1,2})(?::(?P<minute>\d{2}))?\s*(?P<meridiem>a\.?m\.?|p\.?m\.?)(?=\W|$)",
+                        re.IGNORECASE)
+TWENTY_FOUR_HOUR = re.compile(r"\b(?P<hour>[01]?\d|2[0-3]):(?P<minute>[0-5]\d)\b")
+BARE_HOUR = re.compile(r"\b(?:at|around|by)\s+(?P<hour>\d{1,2})(?::(?P<minute>\d{2}))?(?!\s*(?:/|-|\d|st\b|nd\b|rd\b|th\b))",
+                       re.IGNORECASE)
+NOON = re.compile(r"\b(?P<word>noon|midday)\b", re.IGNORECASE)
+VAGUE_TIME = re.compile(r"\b(morning|afternoon|evening|tonight|lunch(time)?|after\s+work|after\s+school)\b", re.IGNORECASE)
+PART_OF_DAY = re.compile(r"\b(?:in\s+the\s+)?(?P<part>morning|afternoon|evening|tonight)\b", re.IGNORECASE)
+
+# Services that can be booked (from the assistant's system prompt)
+SERVICES = re.compile(
+    r"\b(study\s+rooms?|meeting\s+rooms?|group\s+rooms?|rooms?|consultation|librarian|research\s+help|"
+    r"book\s+pick-?ups?|pick\s*up|pickups?|holds?|events?|class(es)?|workshops?|storytime|tour|"
+    r"computers?|tutoring|membership|library\s+card|book\s+clubs?)\b",
+    re.IGNORECASE,
+)
+# Words that end a purpose phrase: the date and time parts of the request
+_STOP = (r"(?=\s+(?:on|at|around|by|from|this|next|tomorrow|today|tonight|in\s+\d|in\s+the\s+(?:morning|afternoon|evening))\b"
+         r"|\s+(?:mon|tues|wednes|thurs|fri|satur|sun)day\b|\s*[,.;!?]|\s+and\s+(?:at|on)\b|$"
+         rf"|\s+(?:{_MONTH_NAMES})[a-z]*\.?\s+\d|\s+(?:the\s+)?\d{{1,2}}(?:st|nd|rd|th)?\s+(?:of\s+)?(?:{_MONTH_NAMES})"
+         r"|\s+\d{1,2}/\d{1,2}\b|\s+\d{4}-\d{1,2}-\d{1,2}\b"
+         rf"|\s+(?:for\s+)?{_TIME_PHRASE})")
+# Connectors left dangling when a phrase ends at a date or time ("a room for" in "a room for Tuesday")
+TRAILING_CONNECTOR = re.compile(r"\s+(?:for|to|at|on|in|by|from|around)$", re.IGNORECASE)
+FOR_PURPOSE = re.compile(rf"\b(?P<connector>for)\s+(?P<purpose>(?!(?:\d|today|tomorrow|tonight|{_TIME_PHRASE}|next|this|the\s+day|the\s+\d|"
+                         rf"(?:mon|tues|wednes|thurs|fri|satur|sun)day|(?:{_MONTH_NAMES})[a-z]*\.?\s+\d))[^,.;!?]+?){_STOP}",
+                         re.IGNORECASE)
+TO_PURPOSE = re.compile(r"\b(?P<connector>to|so\s+I\s+can|so\s+we\s+can)\s+"
+                        r"(?P<purpose>(?:discuss|talk|learn|work|study|pick|use|print|attend|register|join|meet|go\s+over|"
+                        rf"review|ask|find|research|practice|prepare|return|renew|sign)\b[^,.;!?]*?){_STOP}", re.IGNORECASE)
+BOOKED_OBJECT = re.compile(rf"\b(?:book|reserve|schedule|request|sign\s+(?:me|us)\s+up\s+for|register\s+(?:me|us)\s+for)"
+                           rf"\s+(?P<purpose>(?:a|an|the|my|our)?\s*[^,.;!?]+?){_STOP}", re.IGNORECASE)
+GENERIC_PURPOSE = re.compile(r"^(?:a|an|the|my|our)?\s*(appointment|slot|time|meeting|session|booking|reservation|it|one)$",
+                             re.IGNORECASE)
+
+
+def format_time(value):
+    """Formats a time like "2:00 PM"."""
+    return value.strftime("%I:%M %p").lstrip("0")
+
+
+def format_date(value):
+    """Formats a date like "Monday, October 19, 2026"."""
+    return f"{value.strftime('%A, %B')} {value.day}, {value.year}"
+
+
+def format_opening_hours():
+    """Returns the opening hours as listed in the system prompt, one line per range of days."""
+    lines = []
+    day = 0
+    while day < 7:
+        hours = OPENING_HOURS[day]
+        last = day
+        while last + 1 < 7 and OPENING_HOURS[last + 1] == hours:
+            last += 1
+        days = WEEKDAYS[day].title() if last == day else f"{WEEKDAYS[day].title()}–{WEEKDAYS[last].title()}"
+        if hours is None:
+            lines.append(f"  - {days}: Closed")
+        else:
+            lines.append(f"  - {days}: {format_time(hours[0])} – {format_time(hours[1])}")
+        day = last + 1
+    return "\n".join(lines)
+
+
+def library_now():
+    """Returns the current time in the library's time zone (or the server's, if unknown)."""
+    try:
+        return datetime.datetime.now(ZoneInfo(LIBRARY_TIMEZONE))
+    except (ZoneInfoNotFoundError, ValueError):
+        return datetime.datetime.now()
+
+
+def _month_number(name):
+    name = name.lower().rstrip(".")
+    return next(i for i, month in enumerate(MONTHS, start=1) if month.startswith(name[:3]))
+
+
+def _upcoming(today, month, day, year=None):
+    """Returns the date for a month and day, in the next year if it has already passed this year."""
+    if year is not None:
+        year = int(year)
+        return datetime.date(year + 2000 if year < 100 else year, month, day)
+    candidate = datetime.date(today.year, month, day)
+    return candidate if candidate >= today else datetime.date(today.year + 1, month, day)
+
+
+def parse_date(text, today):
+    """
+    Finds the appointment date in `text`.
+
+    Returns:
+        tuple: (datetime.date or None, confidence).
+    """
+    for pattern, confidence in ((ISO_DATE, 0.95), (MONTH_DAY, 0.95), (DAY_MONTH, 0.95), (NUMERIC_DATE, 0.9)):
+        match = pattern.search(text)
+        if match is None:
+            continue
+        month = match.group("month")
+        month = int(month) if month.isdigit() else _month_number(month)
+        try:
+            date = _upcoming(today, month, int(match.group("day")), match.group("year"))
+        except ValueError:
+            return None, 0.3  # "February 30": a date was meant, but not a valid one
+        return date, confidence if match.group("year") or date.year == today.year else confidence - 0.1
+
+    match = RELATIVE_DAY.search(text)
+    if match is not None:
+        word = match.group("word").lower()
+        offset = 2 if word.startswith("day") else 1 if word == "tomorrow" else 0
+        return today + datetime.timedelta(days=offset), 0.95
+
+    match = IN_DAYS.search(text)
+    if match is not None:
+        count = match.group("count").lower()
+        count = int(count) if count.isdigit() else NUMBER_WORDS[count]
+        days = count * 7 if match.group("unit").lower().startswith("week") else count
+        return today + datetime.timedelta(days=days), 0.9 if days < 7 or count == 1 else 0.6
+
+    match = WEEKDAY.search(text)
+    if match is not None:
+        weekday = WEEKDAYS.index(match.group("weekday").lower())
+        days = (weekday - today.weekday()) % 7
+        if (match.group("modifier") or "").lower() == "next":
+            # "next Monday" is that day in the following week, with weeks starting on Sunday:
+            # said on a Friday it is three days away, said on a Sunday it is eight
+            following = today + datetime.timedelta(days=7 - (today.weekday() + 1) % 7 + (weekday + 1) % 7)
+            # Some people mean the nearest Monday instead, so skipping one is less certain
+            return following, 0.9 if (following - today).days in (days, 7) else 0.8
+        if days == 0:
+            # "Monday" said on a Monday usually means next week, but it is worth checking
+            return today + datetime.timedelta(days=7), 0.6
+        return today + datetime.timedelta(days=days), 0.9
+
+    if VAGUE_DATE.search(text):
+        return None, 0.3
+    return None, 0.0
+
+
+def _resolve_hour(hour, minute):
+    """Picks AM or PM for an hour without one: the reading that falls within opening hours."""
+    opening = min(hours[0] for hours in OPENING_HOURS.values() if hours)
+    closing = max(hours[1] for hours in OPENING_HOURS.values() if hours)
+    readings = [datetime.time(h, minute) for h in {hour % 12, hour % 12 + 12} if h < 24]
+    open_readings = [t for t in readings if opening <= t < closing]
+    if len(open_readings) == 1:
+        return open_readings[0], 0.85
+    return (open_readings or readings)[-1], 0.5
+
+
+def _range_start(match):
+    """
+    Returns the start of a time range ("from 2 to 4pm" starts at 2 PM), or None.
+
+    Returns:
+        tuple: (datetime.time, confidence) or None when the match is not a range of hours.
+    """
+    if match.group("and") and not match.group("between"):
+        return None  # "at 2 and 3 more people": not a range
+    hour, minute = int(match.group("hour")), int(match.group("minute") or 0)
+    end_hour, end_minute = int(match.group("end_hour")), int(match.group("end_minute") or 0)
+    if not (1 <= hour <= 12 and 1 <= end_hour <= 12 and minute <= 59 and end_minute <= 59):
+        return None
+    meridiem = match.group("meridiem") or match.group("end_meridiem")
+    if meridiem is None:
+        return _resolve_hour(hour, minute)
+    pm = meridiem.lower().startswith("p")
+    if match.group("meridiem") is None and pm and (hour % 12, minute) > (end_hour % 12, end_minute):
+        pm = False  # "11 to 1pm" starts at 11 AM
+    return datetime.time(hour % 12 + (12 if pm else 0), minute), 0.9
+
+
+def parse_time(text):
+    """
+    Finds the appointment time in `text`. For a range ("from 2 to 4pm"), that is its start.
+
+    Returns:
+        tuple: (datetime.time or None, confidence).
+    """
+    match = TIME_RANGE.search(text)
+    start = _range_start(match) if match is not None else None
+    if start is not None:
+        return start
+
+    match = CLOCK_TIME.search(text)
+    if match is not None:
+        hour, minute = int(match.group("hour")), int(match.group("minute") or 0)
+        if not 1 <= hour <= 12 or minute > 59:
+            return None, 0.3
+        pm = match.group("meridiem").lower().startswith("p")
+        return datetime.time(hour % 12 + (12 if pm else 0), minute), 0.95
+
+    if NOON.search(text):
+        return datetime.time(12), 0.95
+
+    match = O_CLOCK.search(text)
+    if match is not None:
+        hour = match.group("hour").lower()
+        hour = int(hour) if hour.isdigit() else HOUR_WORDS[hour]
+        if 1 <= hour <= 12:
+            part = PART_OF_DAY.search(text)
+            if part is not None:
+                pm = part.group("part").lower() != "morning"
+                return datetime.time(hour % 12 + (12 if pm else 0)), 0.9
+            return _resolve_hour(hour, 0)
+
+    match = TWENTY_FOUR_HOUR.search(text)
+    if match is not None:
+        hour, minute = int(match.group("hour")), int(match.group("minute"))
+        if hour >= 13 or hour == 0:
+            return datetime.time(hour, minute), 0.95
+        return _resolve_hour(hour, minute)
+
+    match = BARE_HOUR.search(text)
+    if match is not None:
+        hour, minute = int(match.group("hour")), int(match.group("minute") or 0)
+        part = PART_OF_DAY.search(text)
+        if 1 <= hour <= 12 and minute <= 59 and part is not None:
+            # "at 6 in the evening"
+            pm = part.group("part").lower() != "morning"
+            return datetime.time(hour % 12 + (12 if pm else 0), minute), 0.9
+        if 1 <= hour <= 12 and minute <= 59:
+            return _resolve_hour(hour, minute)
+        if 13 <= hour <= 23 and minute <= 59:
+            return datetime.time(hour, minute), 0.9
+
+    if VAGUE_TIME.search(text):
+        return None, 0.3
+    return None, 0.0
+
+
+def parse_purpose(text):
+    """
+    Finds what the appointment is for in `text`.
+
+    Returns:
+        tuple: (str or None, confidence).
+    """
+    stated = []  # "for a group project", "to discuss my membership"
+    for pattern in (FOR_PURPOSE, TO_PURPOSE):
+        for match in pattern.finditer(text):
+            purpose = " ".join(match.group("purpose").split())
+            if purpose and not GENERIC_PURPOSE.match(purpose):
+                stated.append((match.start(), match.group("connector").lower(), purpose))
+
+    booked = None  # "book a study room"
+    for match in BOOKED_OBJECT.finditer(text):
+        purpose = TRAILING_CONNECTOR.sub("", " ".join(match.group("purpose").split()))
+        if purpose and not GENERIC_PURPOSE.match(purpose):
+            booked = purpose
+            break
+
+    if stated:
+        _, connector, purpose = min(stated)
+        if booked is not None and SERVICES.search(booked) and purpose not in booked and booked not in purpose:
+            purpose = f"{booked} {connector} {purpose}"
+        confidence = 0.85
+    elif booked is not None:
+        purpose = booked
+        confidence = 0.8 if SERVICES.search(booked) else 0.6
+    else:
+        return (None, 0.3) if SERVICES.search(text) else (None, 0.0)
+    # Anything longer than a short phrase is better summarized by the LLM
+    if len(purpose.split()) > 10:
+        confidence = 0.5
+    return purpose, confidence
+
+
+def opening_hours_problem(date, time=None):
+    """
+    Checks a slot against the opening hours.
+
+    Returns:
+        tuple: (field to ask for again, explanation) or None if the library is open.
+    """
+    hours = OPENING_HOURS[date.weekday()]
+    day = WEEKDAYS[date.weekday()].title()
+    if hours is None:
+        return "date", f"The library is closed on {day}s."
+    if time is not None and not hours[0] <= time < hours[1]:
+        return "time", f"On {day}s the library is open {format_time(hours[0])} – {format_time(hours[1])}."
+    return None
+
+
+class AppointmentParser:
+    """
+    Rule-based appointment slot extraction with per-field confidence.
+
+    Args:
+        threshold (float): Minimum confidence for a field to be used without asking the LLM.
+        clock (callable, optional): Returns the current `datetime.datetime`; defaults to the
+            library's local time.
+    """
+
+    def __init__(self, threshold=0.8, clock=None):
+        self.threshold = threshold
+        self.clock = clock or library_now
+
+    def parse(self, text, now=None):
+        """
+        Extracts the appointment slot from a message.
+
+        Args:
+            text (str): The user message.
+            now (datetime.datetime, optional): Reference time for relative dates.
+
+        Returns:
+            dict: {"date": str, "time": str, "purpose": str, "confidence": {field: float},
+            "problem": (field, explanation) or None}. Fields below the threshold are empty
+            strings. Dates are resolved, e.g. "Monday, October 19, 2026", and times read
+            like "2:00 PM". `problem` is set when the slot falls outside opening hours or in
+            the past; the offending field is left empty then.
+        """
+        now = now or self.clock()
+        date, date_confidence = parse_date(text, now.date())
+        time, time_confidence = parse_time(text)
+        purpose, purpose_confidence = parse_purpose(text)
+        confidence = {"date": date_confidence, "time": time_confidence, "purpose": purpose_confidence}
+        confident = {field: confidence[field] >= self.threshold for field in FIELDS}
+
+        problem = self.check(date if confident["date"] else None, time if confident["time"] else None, now)
+        result = {
+            "date": format_date(date) if confident["date"] else "",
+            "time": format_time(time) if confident["time"] else "",
+            "purpose": purpose if confident["purpose"] else "",
+            "confidence": confidence,
+            "problem": problem,
+        }
+        if problem is not None:
+            result[problem[0]] = ""
+        return result
+
+    def check(self, date, time, now=None):
+        """
+        Checks a (partial) slot against the opening hours and the current time.
+
+        Args:
+            date (datetime.date or None): The appointment date, if known.
+            time (datetime.time or None): The appointment time, if known.
+
+        Returns:
+            tuple: (field to ask for again, explanation) or None if the slot is possible.
+        """
+        now = now or self.clock()
+        if date is None:
+            return None
+        if date < now.date():
+            return "date", "That date has already passed."
+        problem = opening_hours_problem(date, time)
+        if problem is None and time is not None and date == now.date() and time <= now.time().replace(tzinfo=None):
+            return "time", "That time has already passed today."
+        return problem
+
+    def resolve(self, details, now=None):
+        """
+        Normalizes merged appointment details (e.g. "tomorrow" and "2 PM" from the LLM) to
+        resolved dates and times, and checks the slot against the opening hours.
+
+        Args:
+            details (dict): {"date", "time", "purpose"} as text.
+
+        Returns:
+            tuple: (normalized details, problem), where problem is (field, explanation) or
+            None and the offending field is emptied. Values that cannot be read are kept as
+            they are and not checked.
+        """
+        now = now or self.clock()
+        details = dict(details)
+        date, date_confidence = parse_date(details.get("date") or "", now.date())
+        time, time_confidence = parse_time(details.get("time") or "")
+        date = date if date_confidence >= self.threshold else None
+        time = time if time_confidence >= self.threshold else None
+        if date is not None:
+            details["date"] = format_date(date)
+        if time is not None:
+            details["time"] = format_time(time)
+
+        problem = self.check(date, time, now)
+        if problem is not None:
+            details[problem[0]] = ""
+        return details, problem
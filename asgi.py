@@ -0,0 +1,203 @@
+"""
+ASGI entry point for the chat server.
+
+Under a WSGI server every chat request holds a worker thread while its turn runs on the
+shared event loop, so the turns in flight per process are capped by the server's threads.
+Served by an ASGI server instead, `/chat` and `/chat/stream` are awaited on the shared loop
+(`async_runtime.wait()` and `aiterate()`) and hold no thread while their model calls are in
+flight; concurrent turns are then bounded by the model call limits (`CHAT_MAX_CONCURRENCY`,
+`EMBEDDING_MAX_CONCURRENCY`) and the request queue, not by a thread pool.
+
+Every other route (sessions, history, batches, stats and metrics) is served by the Flask app
+from `server.create_app()`, one worker thread per request: those requests make no model
+calls and finish quickly.
+
+Usage:
+    uvicorn --factory asgi:create_app --port 5000
+"""
+import asyncio
+import contextlib
+import io
+import json
+import sys
+
+import async_runtime
+import server
+
+JSON_HEADERS = [(b"content-type", b"application/json")]
+
+
+def wsgi_environ(scope, body):
+    """Builds the WSGI environ for an ASGI HTTP request whose body has been read."""
+    server_name, server_port = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": str(server_port or 80),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", []):
+        name, value = name.decode("latin-1").lower(), value.decode("latin-1")
+        if name == "content-type":
+            environ["CONTENT_TYPE"] = value
+        elif name != "content-length":
+            key = "HTTP_" + name.upper().replace("-", "_")
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def json_payload(scope, body):
+    """Returns the JSON object a request sent, or None (Flask then answers it with its own error)."""
+    headers = dict(scope.get("headers", []))
+    if headers.get(b"content-type", b"").split(b";")[0].strip() != b"application/json":
+        return None
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+async def read_body(receive):
+    body = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        body.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(body)
+
+
+async def send_json(send, status, data):
+    await send({"type": "http.response.start", "status": status, "headers": JSON_HEADERS})
+    await send({"type": "http.response.body", "body": json.dumps(data).encode("utf-8")})
+
+
+async def valid_session(session_name):
+    return bool(session_name) and await asyncio.to_thread(server.session_store.exists, session_name)
+
+
+class ChatASGIApp:
+    """
+    ASGI app serving the chat turns on the shared event loop and the rest of the API with Flask.
+
+    Args:
+        wsgi_app (flask.Flask): The app built by `server.create_app()`.
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self.routes = {"/chat": self.chat, "/chat/stream": self.chat_stream}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+        body = await read_body(receive)
+        if body is None:
+            return  # The client went away before sending its request
+        route = self.routes.get(scope["path"]) if scope["method"] == "POST" else None
+        payload = json_payload(scope, body) if route is not None else None
+        if payload is not None:
+            await route(payload, receive, send)
+        else:
+            await self.wsgi(scope, body, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def chat(self, payload, receive, send):
+        """POST /chat, as in `server.chat`."""
+        session_name, user_input = payload.get("session_name"), payload.get("message")
+        if not await valid_session(session_name):
+            await send_json(send, 400, {"error": "Invalid session."})
+            return
+        final_response = await async_runtime.wait(server.chat_turn(session_name, user_input))
+        await send_json(send, 200, {"response": final_response})
+
+    async def chat_stream(self, payload, receive, send):
+        """POST /chat/stream, as in `server.chat_stream`; stops generating when the client disconnects."""
+        session_name, user_input = payload.get("session_name"), payload.get("message")
+        if not await valid_session(session_name):
+            await send_json(send, 400, {"error": "Invalid session."})
+            return
+
+        async def relay():
+            headers = [(b"content-type", b"text/event-stream; charset=utf-8")]
+            headers += [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                        for name, value in server.SSE_HEADERS.items()]
+            await send({"type": "http.response.start", "status": 200, "headers": headers})
+            async for event in async_runtime.aiterate(server.stream_turn(session_name, user_input)):
+                await send({"type": "http.response.body", "body": event.encode("utf-8"), "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+
+        async def disconnected():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+
+        streaming = asyncio.ensure_future(relay())
+        watcher = asyncio.ensure_future(disconnected())
+        try:
+            await asyncio.wait({streaming, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            watcher.cancel()
+            if not streaming.done():
+                streaming.cancel()  # The client went away: stop generating
+        with contextlib.suppress(asyncio.CancelledError):
+            await streaming  # Re-raises errors from sending the response
+
+    async def wsgi(self, scope, body, send):
+        """Serves a request with the Flask app in worker threads."""
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+            return lambda data: None  # The legacy write() callable; Flask does not use it
+
+        iterable = await asyncio.to_thread(self.wsgi_app, wsgi_environ(scope, body), start_response)
+        try:
+            await send({"type": "http.response.start", "status": response["status"], "headers": response["headers"]})
+            chunks = iter(iterable)
+            while (chunk := await asyncio.to_thread(next, chunks, None)) is not None:
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(iterable, "close"):
+                await asyncio.to_thread(iterable.close)
+
+
+def create_app(warmup=None):
+    """
+    Builds the ASGI app.
+
+    Args:
+        warmup (str, optional): Passed to `server.create_app()`.
+
+    Returns:
+        ChatASGIApp: The app, serving the chat API.
+    """
+    return ChatASGIApp(server.create_app(warmup))
@@ -0,0 +1,128 @@
+"""
+Shared event loop for the async chat pipeline.
+
+Flask views are synchronous, and Flask's own async-view support starts a fresh event
+loop for every request, which breaks pooled async HTTP clients ("Event loop is closed")
+and prevents calls from different requests sharing connections. Instead, each process
+runs one long-lived event loop in a daemon thread. Views submit coroutines to it with
+`run()`, and every awaited model call from every request is multiplexed on that loop.
+
+The ASGI app (`asgi.py`) awaits the same loop from its server's loop with `wait()` and
+`aiterate()`, so a request in flight there holds no thread at all.
+"""
+import asyncio
+import queue
+import threading
+
+_loop = None
+_lock = threading.Lock()
+
+
+def get_loop():
+    """Returns the process-wide event loop, starting its thread on first use."""
+    global _loop
+    with _lock:
+        if _loop is None or _loop.is_closed():
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="chat-event-loop", daemon=True)
+            thread.start()
+            _loop = loop
+        return _loop
+
+
+def run(coro, timeout=None):
+    """
+    Runs a coroutine on the shared event loop and waits for its result.
+
+    Args:
+        coro: The coroutine to run.
+        timeout (float, optional): Seconds to wait before raising TimeoutError.
+
+    Returns:
+        The coroutine's result; exceptions raised by the coroutine are re-raised here.
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, get_loop())
+    try:
+        return future.result(timeout)
+    except TimeoutError:
+        future.cancel()
+        raise
+
+
+def submit(coro):
+    """
+    Schedules a coroutine on the shared event loop without waiting for it, e.g. for
+    background work that should not delay the response.
+
+    Returns:
+        concurrent.futures.Future: The coroutine's eventual result.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+async def wait(coro):
+    """
+    Awaits a coroutine running on the shared event loop from another event loop (e.g. an
+    ASGI server's). Cancelling the caller cancels the coroutine.
+    """
+    return await asyncio.wrap_future(submit(coro))
+
+
+_DONE = object()
+
+
+async def _pump(agen, put):
+    """Runs an async generator to the end in one task, handing each item to `put`."""
+    try:
+        async for item in agen:
+            put((item, None))
+    except Exception as e:
+        put((_DONE, e))
+    else:
+        put((_DONE, None))
+
+
+def iterate(agen):
+    """
+    Iterates over an async generator running on the shared event loop from a synchronous
+    caller, e.g. a streaming WSGI response. The generator runs in a single task, so context
+    variables it sets (such as the request trace) stay valid across items. Closing the
+    iterator early cancels the generator.
+
+    Yields:
+        The generator's items; its exception, if any, is re-raised here.
+    """
+    items = queue.Queue()
+    future = submit(_pump(agen, items.put))
+    try:
+        while True:
+            item, error = items.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        future.cancel()
+
+
+async def aiterate(agen):
+    """Like `iterate()`, for callers on another event loop."""
+    loop = asyncio.get_running_loop()
+    items = asyncio.Queue()
+
+    def put(entry):
+        if not loop.is_closed():  # The caller may be gone
+            loop.call_soon_threadsafe(items.put_nowait, entry)
+
+    future = submit(_pump(agen, put))
+    try:
+        while True:
+            item, error = await items.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        future.cancel()
@@ -0,0 +1,91 @@
+"""
+Replays many chat messages through the chatbot, e.g. support transcripts for QA audits.
+
+Reads JSON Lines of {"session_name", "message"[, "id"]} and writes one JSON line per message
+as soon as it is answered: {"index", "session_name", "response", "ok"[, "id"]}, or
+{"index", "error"} for messages that were rejected. Messages of the same session are answered
+in order; different sessions are processed in parallel.
+
+By default the chatbot runs in-process (set FAKE_BACKENDS=1 to replay offline); pass `--url`
+to send the messages to a running server's /chat/batch endpoint instead.
+
+Usage:
+    python batch_chat.py transcripts.jsonl -o results.jsonl --create-sessions
+    FAKE_BACKENDS=1 python batch_chat.py transcripts.jsonl --concurrency 16
+    python batch_chat.py transcripts.jsonl --url http://localhost:5000
+"""
+import argparse
+import json
+import sys
+
+
+def run_in_process(lines, out, concurrency, create_sessions, chunk_size):
+    """Answers the messages with the chatbot in this process, `chunk_size` messages at a time."""
+    import async_runtime
+    import server
+
+    items = server.read_batch("\n".join(lines))
+    for offset in range(0, len(items), chunk_size):
+        accepted, rejected = server.validate_batch(items[offset:offset + chunk_size], create_sessions)
+
+        def write(result, accepted=accepted, offset=offset):
+            result = server.batch_result(accepted, result) if "error" not in result else result
+            result["index"] += offset  # Position in the input
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+
+        for result in rejected:
+            write(result)
+        if accepted:
+            async_runtime.run(server.process_batch([item for _, item in accepted], write, concurrency))
+
+
+def run_remote(lines, out, url, create_sessions, chunk_size):
+    """Sends the messages to a running server's /chat/batch endpoint, `chunk_size` at a time."""
+    import requests
+
+    for offset in range(0, len(lines), chunk_size):
+        response = requests.post(
+            url.rstrip("/") + "/chat/batch",
+            params={"create_sessions": int(create_sessions)},
+            data="\n".join(lines[offset:offset + chunk_size]).encode("utf-8"),
+            headers={"Content-Type": "application/x-ndjson"},
+            stream=True,
+        )
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            if line:
+                result = json.loads(line)
+                if "index" in result:
+                    result["index"] += offset
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSON Lines of {\"session_name\", \"message\"} ('-' for stdin)")
+    parser.add_argument("-o", "--output", help="Write results here instead of stdout")
+    parser.add_argument("--url", help="Base URL of a running server (default: run in-process)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Sessions processed in parallel (in-process only)")
+    parser.add_argument("--create-sessions", action="store_true", help="Create sessions that do not exist yet")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Messages per batch")
+    args = parser.parse_args()
+
+    source = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+    with source:
+        lines = [line for line in source.read().splitlines() if line.strip()]
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        if args.url:
+            run_remote(lines, out, args.url, args.create_sessions, args.chunk_size)
+        else:
+            run_in_process(lines, out, args.concurrency, args.create_sessions, args.chunk_size)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
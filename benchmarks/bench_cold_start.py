@@ -0,0 +1,120 @@
+"""
+Cold-start benchmark for the chat server.
+
+Starts fresh Python processes and times, in each:
+- import: `import server`;
+- create_app: building the Flask app without a warmup;
+- first_request: the first /chat request, which loads the FAQ and creates the clients;
+- second_request: the next /chat request, for comparison;
+- warmup: a blocking `warm_up()` (FAQ sync plus clients) in a separate process.
+
+It also lists which heavy client libraries were imported by `import server` alone (there
+should be none). Runs with the offline fakes from `fake_backends` (`FAKE_BACKENDS=1`), so
+no API key or network access is needed; the FAQ embedding cache is synced once before
+the runs, as `python ingest_faq.py` would.
+
+Usage:
+    python -m benchmarks.bench_cold_start --runs 5
+    python -m benchmarks.bench_cold_start --json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imported lazily by the server; none of them should be loaded by `import server`
+HEAVY_MODULES = ["openai", "langchain_openai", "langchain_community", "langchain", "pinecone",
+                 "langchain_core.runnables", "fake_backends"]
+
+
+def child(mode):
+    """Runs one cold start in this (fresh) process and prints its timings as JSON."""
+    timings = {}
+    started = time.perf_counter()
+    import server
+    timings["import_ms"] = (time.perf_counter() - started) * 1000
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+
+    if mode == "warmup":
+        started = time.perf_counter()
+        server.warm_up()
+        timings["warmup_ms"] = (time.perf_counter() - started) * 1000
+    else:
+        started = time.perf_counter()
+        app = server.create_app(warmup="off")
+        timings["create_app_ms"] = (time.perf_counter() - started) * 1000
+
+        client = app.test_client()
+        client.post('/new_session', json={"session_name": "cold_start"})
+        for label, message in [("first_request_ms", "What are the library hours?"),
+                               ("second_request_ms", "Can I renew a book online?")]:
+            started = time.perf_counter()
+            response = client.post('/chat', json={"session_name": "cold_start", "message": message})
+            timings[label] = (time.perf_counter() - started) * 1000
+            assert response.status_code == 200, response.get_data(as_text=True)
+
+    print(json.dumps({"timings": timings, "heavy_modules_on_import": loaded}))
+
+
+def run_child(mode, env):
+    """Starts a fresh interpreter for one cold start and returns its report."""
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_cold_start", "--child", mode],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def summarize(samples):
+    return {
+        "median_ms": round(statistics.median(samples), 1),
+        "min_ms": round(min(samples), 1),
+        "max_ms": round(max(samples), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes per measurement")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    parser.add_argument("--child", choices=["request", "warmup"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return
+
+    env = dict(os.environ, FAKE_BACKENDS="1", STARTUP_WARMUP="off", LOG_LEVEL="WARNING")
+    run_child("warmup", env)  # Fill the FAQ embedding cache, as the ingestion step would
+
+    samples = {}
+    heavy = set()
+    for _ in range(args.runs):
+        for mode in ["request", "warmup"]:
+            report = run_child(mode, env)
+            heavy.update(report["heavy_modules_on_import"])
+            for name, value in report["timings"].items():
+                samples.setdefault(name, []).append(value)
+
+    results = {
+        "runs": args.runs,
+        "heavy_modules_on_import": sorted(heavy),
+        "timings": {name.removesuffix("_ms"): summarize(values) for name, values in samples.items()},
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"cold start over {args.runs} fresh processes (FAKE_BACKENDS=1)")
+    for name, stats in results["timings"].items():
+        print(f"  {name:<16} median {stats['median_ms']:8.1f} ms   min {stats['min_ms']:8.1f} ms   max {stats['max_ms']:8.1f} ms")
+    print(f"  heavy modules loaded by `import server`: {', '.join(results['heavy_modules_on_import']) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
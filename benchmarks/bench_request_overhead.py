@@ -0,0 +1,149 @@
+"""
+Per-request client overhead benchmark.
+
+Compares building model clients and the conversation chain on every message (the old
+behaviour of `analyze_sentiment`, `detect_intent`, `extract_appointment_details` and
+`chat()`) against reusing the shared clients from `model_clients`.
+
+Two measurements are reported:
+- construction: the cost of obtaining the clients and chain for one message;
+- round trip: a chat completion against a local OpenAI-compatible HTTP stub, showing
+  the cost of opening a new connection per request versus reusing the pool.
+
+No API key or network access is needed.
+
+Usage:
+    python -m benchmarks.bench_request_overhead --iterations 200
+"""
+import argparse
+import json
+import os
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")  # Clients refuse to build without a key
+
+import openai  # noqa: E402
+from langchain_core.chat_history import InMemoryChatMessageHistory  # noqa: E402
+from langchain_core.prompts import ChatPromptTemplate  # noqa: E402
+from langchain_core.runnables.history import RunnableWithMessageHistory  # noqa: E402
+from langchain_openai import ChatOpenAI  # noqa: E402
+
+import model_clients  # noqa: E402
+
+PROMPT = ChatPromptTemplate.from_messages([("system", "You are a library assistant."), ("human", "{input}")])
+HISTORY = InMemoryChatMessageHistory()
+
+COMPLETION = json.dumps({
+    "id": "chatcmpl-bench", "object": "chat.completion", "created": 0, "model": "gpt-4o-mini",
+    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "neutral"}}],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}).encode("utf-8")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers every POST with a fixed chat completion, keeping connections alive."""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # Otherwise delayed ACKs add ~40 ms to every kept-alive response
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(COMPLETION)))
+        self.end_headers()
+        self.wfile.write(COMPLETION)
+
+    def log_message(self, *args):
+        pass
+
+
+def per_request_clients():
+    """What every message used to build."""
+    llm = ChatOpenAI(model="gpt-4o-mini", api_key=os.environ["OPENAI_API_KEY"])
+    client = openai.OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+    conversation = RunnableWithMessageHistory(PROMPT | llm, get_session_history=lambda session_id: HISTORY)
+    return llm, client, conversation
+
+
+_shared_conversation = None
+
+
+def shared_clients():
+    """What every message does now."""
+    global _shared_conversation
+    llm = model_clients.get_chat_llm()
+    client = model_clients.get_openai_client()
+    if _shared_conversation is None:
+        _shared_conversation = RunnableWithMessageHistory(PROMPT | llm, get_session_history=lambda session_id: HISTORY)
+    return llm, client, _shared_conversation
+
+
+def time_calls(func, iterations):
+    """Returns per-call latencies in milliseconds."""
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "mean_ms": statistics.fmean(samples),
+        "p50_ms": samples[len(samples) // 2],
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}/v1"
+    messages = [{"role": "user", "content": "What are your hours?"}]
+
+    def new_client_round_trip():
+        with openai.OpenAI(api_key=os.environ["OPENAI_API_KEY"], base_url=base_url) as client:
+            client.chat.completions.create(model="gpt-4o-mini", messages=messages)
+
+    pooled = openai.OpenAI(
+        api_key=os.environ["OPENAI_API_KEY"], base_url=base_url, http_client=model_clients.get_http_client()
+    )
+
+    def pooled_round_trip():
+        pooled.chat.completions.create(model="gpt-4o-mini", messages=messages)
+
+    shared_clients()  # First use builds the shared clients, as it would on the first message
+    pooled_round_trip()
+    results = {
+        "construction": {
+            "per_request": summarize(time_calls(per_request_clients, args.iterations)),
+            "shared": summarize(time_calls(shared_clients, args.iterations)),
+        },
+        "round_trip": {
+            "new_connection": summarize(time_calls(new_client_round_trip, args.iterations)),
+            "pooled_connection": summarize(time_calls(pooled_round_trip, args.iterations)),
+        },
+    }
+    server.shutdown()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for section, variants in results.items():
+        print(section)
+        for name, stats in variants.items():
+            print(f"  {name:<18} mean {stats['mean_ms']:8.3f} ms   p50 {stats['p50_ms']:8.3f} ms   p95 {stats['p95_ms']:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
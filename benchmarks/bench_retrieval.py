@@ -0,0 +1,344 @@
+"""
+Retrieval quality and latency benchmark for the FAQ RAG path.
+
+Runs the labeled questions in `benchmarks/data/retrieval_questions.jsonl` (user questions in
+their own words, each labeled with the `FAQ_library.txt` question it should retrieve)
+through each retrieval backend and reports recall@k and MRR per FAQ entry (chunks of one
+entry count as that entry), plus per-query latency percentiles. Latency is timed after a
+first pass has cached the query embeddings, so it measures the index queries and rank fusion,
+not the embeddings API.
+
+Backends:
+- production: what /chat does for an FAQ question: the `lexical_faq_answer` keyword shortcut
+  first (the obvious keyword match is the only entry), then `retrieve_faq`, on the local
+  float32 index. Its report adds the share of questions the shortcut answered;
+- hybrid: `retrieve_faq`, which `query_faq_pinecone` answers from, on the local float32 index;
+- hybrid_int8: the same on the int8-quantized local index (rescored, see LOCAL_INDEX_RESCORE);
+- dense: the local vector index alone;
+- lexical: the BM25 keyword index alone;
+- pinecone: `retrieve_faq` on Pinecone (needs PINECONE_API_KEY, or FAKE_BACKENDS=1 for the fake).
+
+Embeddings are replayed from a recording in `benchmarks/data/retrieval_embeddings` (per
+embedding model), so runs are offline and repeatable. `--record` embeds whatever the
+recording lacks with the configured model (needs OPENAI_API_KEY) and saves it. Without a
+recording the benchmark stops, unless `--embeddings fake` asks for the hash-based fake
+embeddings from `fake_backends`: those only exercise the code, their quality numbers say
+nothing about real retrieval, so the run warns and its results are marked
+`"fake_embeddings": true`. Results are only compared with a baseline of the same embeddings.
+
+`--output` writes the results as JSON for comparison over time; `--baseline` compares with
+an earlier results file and exits with status 1 if any recall@k or MRR dropped by more
+than `--tolerance`.
+
+Usage:
+    python -m benchmarks.bench_retrieval
+    python -m benchmarks.bench_retrieval --backends hybrid dense --output retrieval.json
+    python -m benchmarks.bench_retrieval --record
+    python -m benchmarks.bench_retrieval --baseline retrieval.json
+    python -m benchmarks.bench_retrieval --embeddings fake  # Smoke test without a recording
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import faq_search_rag
+from benchmarks.load_test import percentile
+from embedding_store import EmbeddingStore, QueryEmbeddingCache
+from lexical_index import BM25Index
+from vector_index import LocalVectorIndex
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+DEFAULT_QUESTIONS = os.path.join(DATA_DIR, "retrieval_questions.jsonl")
+DEFAULT_RECORDING = os.path.join(DATA_DIR, "retrieval_embeddings")
+BACKENDS = ["production", "hybrid", "hybrid_int8", "dense", "lexical", "pinecone"]
+OFFLINE_BACKENDS = ["production", "hybrid", "hybrid_int8", "dense", "lexical"]
+FAKE_WARNING = "recall and MRR from fake embeddings do not reflect real retrieval quality"
+MRR_DEPTH = 10
+
+
+class RecordedEmbeddings:
+    """
+    Embeddings client that replays vectors from an `EmbeddingStore`.
+
+    Args:
+        store (EmbeddingStore): The recording.
+        live (optional): Embeddings client for texts the recording lacks; their vectors are
+            added to the store. Without it, a missing text raises KeyError.
+    """
+
+    def __init__(self, store, live=None):
+        self.store = store
+        self.live = live
+
+    def embed_documents(self, texts):
+        keys = [self.store.key(text) for text in texts]
+        missing = [text for text, key in zip(texts, keys) if self.store.get(key) is None]
+        if missing:
+            if self.live is None:
+                raise KeyError(f"{len(missing)} texts are not recorded, e.g. {missing[0]!r}; run with --record")
+            for text, vector in zip(missing, self.live.embed_documents(missing)):
+                self.store.put(self.store.key(text), vector)
+        return [self.store.get(key).tolist() for key in keys]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def load_questions(path):
+    """Loads {"question", "faq"} pairs; "faq" is the FAQ question (or a list of them) to retrieve."""
+    with open(path, "r", encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    for row in rows:
+        row["relevant"] = {row["faq"]} if isinstance(row["faq"], str) else set(row["faq"])
+    return rows
+
+
+def entry_ranking(doc_ids, entry_of):
+    """Maps ranked vector IDs to their FAQ entries (questions), keeping each entry's best rank."""
+    ranking = []
+    for doc_id in doc_ids:
+        entry = entry_of.get(doc_id)
+        if entry is not None and entry not in ranking:
+            ranking.append(entry)
+    return ranking
+
+
+def recall_at_k(ranking, relevant, k):
+    """Share of the relevant entries found in the top k."""
+    return len(relevant.intersection(ranking[:k])) / len(relevant)
+
+
+def reciprocal_rank(ranking, relevant, depth=MRR_DEPTH):
+    """1 / rank of the first relevant entry within `depth`, or 0."""
+    for rank, entry in enumerate(ranking[:depth], start=1):
+        if entry in relevant:
+            return 1.0 / rank
+    return 0.0
+
+
+@contextlib.contextmanager
+def configured(module, **attributes):
+    """Temporarily sets module attributes, e.g. the retrieval backend and clients."""
+    saved = {name: getattr(module, name) for name in attributes}
+    for name, value in attributes.items():
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(module, name, value)
+
+
+def ranker(backend, depth):
+    """Returns a function ranking vector IDs for a question with `backend`."""
+    if backend == "production":
+        def production(question):
+            match = faq_search_rag.lexical_faq_match(question)
+            if match is not None:
+                return [match["id"]]
+            return [doc_id for doc_id, _ in faq_search_rag.retrieve_faq(question, top_k=depth)]
+        return production
+    if backend == "lexical":
+        return lambda question: [match["id"] for match in faq_search_rag.lexical_index.search(question, top_k=depth)]
+    if backend == "dense":
+        def dense(question):
+            vector = faq_search_rag.as_embedding(faq_search_rag.embed_query(question), dimension=1536)
+            results = faq_search_rag.get_index().query(vector=vector, top_k=depth, include_metadata=False, namespace="faq")
+            return [match["id"] for match in results["matches"]]
+        return dense
+    return lambda question: [doc_id for doc_id, _ in faq_search_rag.retrieve_faq(question, top_k=depth)]
+
+
+def evaluate_backend(backend, docs, questions, embeddings, workdir, ks, repeat):
+    """
+    Syncs the FAQ into `backend`, then ranks every question and times the rankings.
+
+    Returns:
+        dict: recall@k per k, MRR, latency percentiles and the questions whose labeled
+        entry was not ranked first; for "production", also the share of questions answered
+        by the keyword shortcut.
+    """
+    directory = os.path.join(workdir, backend)
+    attributes = {
+        "FAQ_CACHE_DIR": directory,
+        "get_embeddings": lambda: embeddings,
+        "query_cache": QueryEmbeddingCache(faq_search_rag.EMBEDDING_MODEL),
+        "lexical_index": BM25Index(),
+        "RETRIEVAL_BACKEND": "pinecone" if backend == "pinecone" else "local",
+    }
+    if backend != "pinecone":
+        attributes["LOCAL_INDEX_DIR"] = os.path.join(directory, "index")
+        attributes["local_index"] = LocalVectorIndex(
+            attributes["LOCAL_INDEX_DIR"],
+            dtype="int8" if backend == "hybrid_int8" else "float32",
+            rescore=faq_search_rag.LOCAL_INDEX_RESCORE
+        )
+
+    with configured(faq_search_rag, **attributes):
+        if backend != "lexical" and faq_search_rag.sync_faq_to_pinecone(docs) is None:
+            raise RuntimeError(f"Syncing the FAQ to the {backend} backend failed")
+        faq_search_rag.build_lexical_index(docs)
+
+        entry_of = {faq_search_rag.document_id(i, doc): doc.metadata["question"] for i, doc in enumerate(docs)}
+        rank = ranker(backend, max(max(ks), MRR_DEPTH) * 2)  # Extra depth: chunks of one entry collapse
+        rankings = [entry_ranking(rank(row["question"]), entry_of) for row in questions]
+        if backend == "production":
+            shortcuts = sum(faq_search_rag.lexical_faq_match(row["question"]) is not None for row in questions)
+
+        latencies = []
+        for _ in range(repeat):
+            for row in questions:
+                started = time.perf_counter()
+                rank(row["question"])
+                latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+
+    report = {f"recall@{k}": round(statistics.mean(
+        recall_at_k(ranking, row["relevant"], k) for ranking, row in zip(rankings, questions)), 4) for k in ks}
+    report[f"mrr@{MRR_DEPTH}"] = round(statistics.mean(
+        reciprocal_rank(ranking, row["relevant"]) for ranking, row in zip(rankings, questions)), 4)
+    report["latency_ms"] = {
+        "p50": round(percentile(latencies, 50), 3),
+        "p95": round(percentile(latencies, 95), 3),
+        "p99": round(percentile(latencies, 99), 3),
+        "mean": round(statistics.mean(latencies), 3),
+    }
+    if backend == "production":
+        report["lexical_shortcut"] = round(shortcuts / len(questions), 4)
+    report["misses"] = [
+        {"question": row["question"], "expected": sorted(row["relevant"]), "retrieved": ranking[:3]}
+        for ranking, row in zip(rankings, questions) if not ranking or ranking[0] not in row["relevant"]
+    ]
+    return report
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compares quality metrics with an earlier run.
+
+    Returns:
+        list: (backend, metric, old, new) for every metric that dropped by more than `tolerance`.
+    """
+    regressions = []
+    for backend, metrics in results["backends"].items():
+        old_metrics = baseline.get("backends", {}).get(backend, {})
+        for metric, value in metrics.items():
+            if (metric.startswith("recall@") or metric.startswith("mrr@")) and metric in old_metrics:
+                if value < old_metrics[metric] - tolerance:
+                    regressions.append((backend, metric, old_metrics[metric], value))
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(DATA_DIR)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", default=DEFAULT_QUESTIONS, help="Labeled JSON Lines file")
+    parser.add_argument("--faq", default=faq_search_rag.FAQ_SOURCE, help="FAQ file, directory or glob pattern")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=OFFLINE_BACKENDS)
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5], help="Cut-offs for recall@k")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed passes over the questions")
+    parser.add_argument("--recording", default=DEFAULT_RECORDING, help="Recorded embeddings directory")
+    parser.add_argument("--embeddings", choices=["recorded", "fake"], default="recorded",
+                        help="Embedding source; fake is for smoke tests only")
+    parser.add_argument("--record", action="store_true", help="Embed texts missing from the recording and save them")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Earlier results file to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.02, help="Allowed drop in recall@k and MRR")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    store = EmbeddingStore(args.recording, faq_search_rag.EMBEDDING_MODEL)
+    source = args.embeddings
+    if source == "fake":
+        if args.record:
+            parser.error("--record needs --embeddings recorded")
+        print(f"WARNING: {FAKE_WARNING}", file=sys.stderr)
+        from fake_backends import FakeEmbeddings
+        embeddings = FakeEmbeddings(latency=0)
+    elif not args.record and not os.path.exists(store.vectors_path):
+        parser.error(f"no recorded {faq_search_rag.EMBEDDING_MODEL} embeddings in {args.recording}; "
+                     f"run with --record (needs OPENAI_API_KEY), or --embeddings fake for a smoke test")
+    else:
+        from model_clients import get_embeddings
+        embeddings = RecordedEmbeddings(store, live=get_embeddings() if args.record else None)
+
+    docs = faq_search_rag.load_faq_data(args.faq)
+    questions = load_questions(args.questions)
+    known = {doc.metadata["question"] for doc in docs}
+    unknown = sorted({entry for row in questions for entry in row["relevant"]} - known)
+    if unknown:
+        parser.error(f"labels not found in {args.faq}: {unknown}")
+    if source == "recorded" and not args.record:
+        texts = [doc.page_content for doc in docs] + [row["question"] for row in questions]
+        missing = sum(store.get(store.key(text)) is None for text in texts)
+        if missing:
+            parser.error(f"{missing} of {len(texts)} texts are not in the recording {args.recording}; run with --record")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        backends = {backend: evaluate_backend(backend, docs, questions, embeddings, workdir, args.k, args.repeat)
+                    for backend in args.backends}
+    if args.record:
+        store.save()
+
+    results = {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "embeddings": source,
+        "embedding_model": faq_search_rag.EMBEDDING_MODEL if source == "recorded" else "fake",
+        "fake_embeddings": source == "fake",
+        "questions": len(questions),
+        "faq_entries": len(known),
+        "backends": backends,
+    }
+    if source == "fake":
+        results["warning"] = FAKE_WARNING
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("embedding_model") != results["embedding_model"]:
+            parser.error(f"the baseline used {baseline.get('embedding_model')} embeddings, "
+                         f"this run {results['embedding_model']}; the results are not comparable")
+        regressions = compare(results, baseline, args.tolerance)
+        results["regressions"] = [
+            {"backend": backend, "metric": metric, "baseline": old, "current": new}
+            for backend, metric, old, new in regressions
+        ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{len(questions)} questions over {len(known)} FAQ entries, "
+              + (f"fake embeddings -- WARNING: {FAKE_WARNING}" if source == "fake" else f"{source} embeddings"))
+        for backend, report in backends.items():
+            quality = "   ".join(f"{name} {value:.3f}" for name, value in report.items()
+                                 if name.startswith("recall@") or name.startswith("mrr@"))
+            latency = report["latency_ms"]
+            print(f"  {backend:<12} {quality}   p50 {latency['p50']:7.3f} ms   p95 {latency['p95']:7.3f} ms   "
+                  f"p99 {latency['p99']:7.3f} ms   misses@1 {len(report['misses'])}"
+                  + (f"   keyword shortcut {report['lexical_shortcut']:.0%}" if "lexical_shortcut" in report else ""))
+        for backend, metric, old, new in regressions:
+            print(f"  regression: {backend} {metric} {old:.3f} -> {new:.3f}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
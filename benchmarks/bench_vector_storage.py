@@ -0,0 +1,90 @@
+"""
+Embedding storage benchmark for the local retrieval path.
+
+Builds a synthetic corpus of clustered 1536-dimension embeddings (related questions sit
+close together, as FAQ embeddings do) and compares, for every storage precision:
+- bytes per embedding, against a Python list of floats;
+- recall@k against an exact float32 scan, with and without rescoring;
+- query latency.
+
+No API key or network access is needed.
+
+Usage:
+    python -m benchmarks.bench_vector_storage --vectors 20000 --queries 100
+"""
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from vector_index import DTYPES, LocalVectorIndex
+
+
+def list_bytes(dimension):
+    """Size of an embedding held as a list of Python floats (the list plus one object per value)."""
+    values = [float(i) + 0.5 for i in range(dimension)]
+    return sys.getsizeof(values) + sum(sys.getsizeof(v) for v in values)
+
+
+def clustered(rng, count, centers, noise):
+    return centers[rng.integers(0, len(centers), size=count)] + noise * rng.normal(size=(count, centers.shape[1]))
+
+
+def time_queries(index, queries, top_k):
+    """Returns per-query latencies in milliseconds."""
+    samples = []
+    for query in queries:
+        started = time.perf_counter()
+        index.query(query, top_k=top_k, include_metadata=False)
+        samples.append((time.perf_counter() - started) * 1000)
+    return sorted(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--rescore", type=int, default=4, help="Candidates re-ranked per match with quantized dtypes")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(max(1, args.vectors // 50), args.dimension))
+    vectors = clustered(rng, args.vectors, centers, 0.4)
+    queries = clustered(rng, args.queries, centers, 0.4)
+
+    results = {"list_bytes_per_vector": list_bytes(args.dimension), "dtypes": {}}
+    with tempfile.TemporaryDirectory() as index_dir:
+        LocalVectorIndex(index_dir, dimension=args.dimension).upsert(
+            [(str(i), vector, {}) for i, vector in enumerate(vectors)]
+        )
+        for dtype in DTYPES:
+            for rescore in ([0] if dtype == "float32" else [0, args.rescore]):
+                index = LocalVectorIndex(index_dir, dimension=args.dimension, dtype=dtype, rescore=rescore)
+                latencies = time_queries(index, queries, args.top_k)
+                results["dtypes"][dtype if dtype == "float32" else f"{dtype}/rescore={rescore}"] = {
+                    "bytes_per_vector": index.memory_bytes() / args.vectors,
+                    f"recall@{args.top_k}": index.recall(queries, top_k=args.top_k),
+                    "p50_ms": statistics.median(latencies),
+                    "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+                }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"Python list of floats: {results['list_bytes_per_vector']:,} bytes per vector")
+    for name, stats in results["dtypes"].items():
+        ratio = results["list_bytes_per_vector"] / stats["bytes_per_vector"]
+        print(f"  {name:<20} {stats['bytes_per_vector']:8,.0f} B/vector ({ratio:5.1f}x smaller)   "
+              f"recall@{args.top_k} {stats[f'recall@{args.top_k}']:.3f}   "
+              f"p50 {stats['p50_ms']:7.3f} ms   p95 {stats['p95_ms']:7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
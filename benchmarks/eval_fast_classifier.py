@@ -0,0 +1,100 @@
+"""
+Offline evaluation of the local fast-path classifier.
+
+Replays a labeled message set through `FastClassifier` and reports how many messages
+it answers without the LLM (LLM-call avoidance) and how accurate those answers are.
+Messages below the confidence threshold are counted as LLM fallbacks and are not
+scored, since the LLM classifier decides them in production.
+
+Usage:
+    python -m benchmarks.eval_fast_classifier
+    python -m benchmarks.eval_fast_classifier --threshold 0.8 --embeddings
+"""
+import argparse
+import json
+import os
+
+from fast_classifier import FastClassifier
+
+DEFAULT_DATASET = os.path.join(os.path.dirname(__file__), "data", "labeled_messages.jsonl")
+
+
+def load_dataset(path):
+    """Loads {"message", "sentiment", "intent"} records from a JSON Lines file."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def route(sentiment, intent):
+    """Maps a classification to the branch `chat()` takes: negative messages escalate regardless of intent."""
+    return "negative_escalation" if sentiment == "negative" else intent
+
+
+def evaluate(classifier, dataset):
+    """
+    Runs the classifier over the dataset.
+
+    Returns:
+        dict: Counts and rates for fast-path coverage and accuracy, plus the misclassified messages.
+    """
+    answered = sentiment_correct = route_correct = 0
+    errors = []
+    for record in dataset:
+        result = classifier.classify(record["message"])
+        if not classifier.is_confident(result):
+            continue
+
+        answered += 1
+        sentiment_correct += result["sentiment"] == record["sentiment"]
+        predicted = route(result["sentiment"], result["intent"])
+        expected = route(record["sentiment"], record["intent"])
+        if predicted == expected:
+            route_correct += 1
+        else:
+            errors.append({"message": record["message"], "expected": expected, "predicted": predicted})
+
+    total = len(dataset)
+    return {
+        "messages": total,
+        "fast_path_answered": answered,
+        "llm_calls_avoided_rate": answered / total if total else 0.0,
+        "fast_path_route_accuracy": route_correct / answered if answered else 0.0,
+        "fast_path_sentiment_accuracy": sentiment_correct / answered if answered else 0.0,
+        "errors": errors,
+    }
+
+
+def build_classifier(threshold, use_embeddings):
+    """Creates the classifier, optionally with FAQ embedding prototypes (needs cached FAQ embeddings and an API key)."""
+    if not use_embeddings:
+        return FastClassifier(threshold=threshold)
+
+    from faq_search_rag import embed_query, load_cached_embeddings, load_faq_data
+    faq_vectors = load_cached_embeddings(load_faq_data("FAQ_library.txt"))
+    return FastClassifier(faq_vectors=faq_vectors, embed_query=embed_query, threshold=threshold)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", default=DEFAULT_DATASET, help="Labeled JSON Lines file")
+    parser.add_argument("--threshold", type=float, default=float(os.getenv("FAST_PATH_THRESHOLD", "0.85")))
+    parser.add_argument("--embeddings", action="store_true", help="Also match against cached FAQ embeddings")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    report = evaluate(build_classifier(args.threshold, args.embeddings), load_dataset(args.dataset))
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"Messages:                 {report['messages']}")
+    print(f"Answered locally:         {report['fast_path_answered']} "
+          f"({report['llm_calls_avoided_rate']:.1%} of classification LLM calls avoided)")
+    print(f"Routing accuracy (local): {report['fast_path_route_accuracy']:.1%}")
+    print(f"Sentiment accuracy:       {report['fast_path_sentiment_accuracy']:.1%}")
+    for error in report["errors"]:
+        print(f"  miss: {error['message']!r} expected={error['expected']} predicted={error['predicted']}")
+
+
+if __name__ == "__main__":
+    main()
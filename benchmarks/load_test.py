@@ -0,0 +1,221 @@
+"""
+Load generator for the chat API.
+
+Replays recorded chat traffic (JSON Lines of {"route", "session_name", "message"}) at a
+target request rate and reports, per route, the latency percentiles (p50/p95/p99), the
+achieved throughput and the error count. For `/chat/stream` the time to the first event
+is reported as well.
+
+Requests are sent open-loop: request i is due at `i / rps` seconds after the start, and
+its latency is measured from that moment, so time spent queued behind a saturated server
+counts against it instead of silently lowering the offered load.
+
+By default the server runs in-process with the offline fakes from `fake_backends`
+(`FAKE_BACKENDS=1`), with latencies set by the `--*-latency` options, so no API key or
+network access is needed. Pass `--url` to load-test a running server instead.
+
+Usage:
+    python -m benchmarks.load_test --rps 20 --requests 400
+    python -m benchmarks.load_test --chat-latency 0.3 --token-latency 0.02 --concurrency 32
+    python -m benchmarks.load_test --url http://localhost:5000 --rps 5
+    python -m benchmarks.load_test --url http://localhost:5000 --rps 200 --concurrency 256  # e.g. against asgi.py
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_TRAFFIC = os.path.join(os.path.dirname(__file__), "data", "recorded_chat.jsonl")
+
+
+def load_traffic(path):
+    """Loads recorded requests, in their original order, from a JSON Lines file."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(samples, q):
+    """Returns the q-th percentile (0-100) of sorted samples, by the nearest-rank method."""
+    if not samples:
+        return None
+    rank = max(1, int(-(-q * len(samples) // 100)))  # ceil(q * n / 100)
+    return samples[min(rank, len(samples)) - 1]
+
+
+def summarize(results, elapsed):
+    """
+    Aggregates request results per route.
+
+    Args:
+        results (list): {"route", "ok", "latency_ms", "first_byte_ms"} dicts.
+        elapsed (float): Wall-clock seconds the run took.
+
+    Returns:
+        dict: {route: {"requests", "errors", "throughput_rps", "p50_ms", "p95_ms", "p99_ms",
+        "max_ms"[, "first_byte_p50_ms", "first_byte_p95_ms"]}}.
+    """
+    report = {}
+    for route in sorted({result["route"] for result in results}):
+        route_results = [result for result in results if result["route"] == route]
+        latencies = sorted(result["latency_ms"] for result in route_results)
+        stats = {
+            "requests": len(route_results),
+            "errors": sum(not result["ok"] for result in route_results),
+            "throughput_rps": len(route_results) / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+            "max_ms": latencies[-1],
+        }
+        first_bytes = sorted(r["first_byte_ms"] for r in route_results if r.get("first_byte_ms") is not None)
+        if first_bytes:
+            stats["first_byte_p50_ms"] = percentile(first_bytes, 50)
+            stats["first_byte_p95_ms"] = percentile(first_bytes, 95)
+        report[route] = stats
+    return report
+
+
+def replay(traffic, send, rps, total, concurrency=16):
+    """
+    Sends `total` requests from `traffic` (cycling through it) at `rps` requests per second.
+
+    Args:
+        traffic (list): Recorded requests.
+        send (callable): `send(route, payload)` performs one request and returns
+            (ok, seconds to the first byte or None).
+        rps (float): Target request rate.
+        total (int): Number of requests to send.
+        concurrency (int): Requests in flight at most; beyond that, requests queue.
+
+    Returns:
+        tuple: (list of result dicts, elapsed seconds).
+    """
+    results = []
+    lock = threading.Lock()
+    started = time.perf_counter()
+
+    def run(i, record):
+        due = started + i / rps
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        payload = {"session_name": record["session_name"], "message": record["message"]}
+        try:
+            ok, first_byte = send(record["route"], payload)
+        except Exception as e:
+            print(f"Request to {record['route']} failed: {e}")
+            ok, first_byte = False, None
+        finished = time.perf_counter()
+        with lock:
+            results.append({
+                "route": record["route"],
+                "ok": ok,
+                "latency_ms": (finished - due) * 1000,
+                "first_byte_ms": None if first_byte is None else (first_byte - due) * 1000,
+            })
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for i in range(total):
+            # Submit each request when it is due, so queued work does not pile up in memory
+            delay = started + i / rps - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(run, i, traffic[i % len(traffic)])
+    return results, time.perf_counter() - started
+
+
+def in_process_client(args):
+    """Imports the server with the fake backends and returns (create_session, send) for its test client."""
+    os.environ["FAKE_BACKENDS"] = "1"
+    os.environ["FAKE_EMBEDDING_LATENCY"] = str(args.embedding_latency)
+    os.environ["FAKE_INDEX_LATENCY"] = str(args.index_latency)
+    os.environ["FAKE_CHAT_LATENCY"] = str(args.chat_latency)
+    os.environ["FAKE_TOKEN_LATENCY"] = str(args.token_latency)
+
+    import server  # noqa: E402 -- reads the settings above at import
+    local = threading.local()
+
+    def client():
+        if not hasattr(local, "client"):
+            local.client = server.app.test_client()
+        return local.client
+
+    def create_session(name):
+        client().post("/new_session", json={"session_name": name})
+
+    def send(route, payload):
+        response = client().post(route, json=payload, buffered=False)
+        first_byte = None
+        for chunk in response.response:
+            if first_byte is None and chunk:
+                first_byte = time.perf_counter()
+        response.close()
+        return response.status_code == 200, first_byte if route.endswith("/stream") else None
+
+    return create_session, send
+
+
+def http_client(base_url):
+    """Returns (create_session, send) for a server running at `base_url`."""
+    import requests  # noqa: E402
+    local = threading.local()
+
+    def session():
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        return local.session
+
+    def create_session(name):
+        session().post(f"{base_url}/new_session", json={"session_name": name}, timeout=30)
+
+    def send(route, payload):
+        streaming = route.endswith("/stream")
+        with session().post(f"{base_url}{route}", json=payload, stream=streaming, timeout=120) as response:
+            first_byte = None
+            for chunk in response.iter_content(chunk_size=None):
+                if first_byte is None and chunk:
+                    first_byte = time.perf_counter()
+            return response.status_code == 200, first_byte if streaming else None
+
+    return create_session, send
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--traffic", default=DEFAULT_TRAFFIC, help="Recorded requests, JSON Lines")
+    parser.add_argument("--rps", type=float, default=10.0, help="Target requests per second")
+    parser.add_argument("--requests", type=int, default=None, help="Requests to send (default: the traffic once)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Maximum requests in flight")
+    parser.add_argument("--url", help="Load-test a running server instead of an in-process one")
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="Seconds per fake embedding call")
+    parser.add_argument("--index-latency", type=float, default=0.02, help="Seconds per fake index request")
+    parser.add_argument("--chat-latency", type=float, default=0.2, help="Seconds before a fake chat reply")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="Seconds per streamed fake token")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    traffic = load_traffic(args.traffic)
+    create_session, send = http_client(args.url.rstrip("/")) if args.url else in_process_client(args)
+    for name in sorted({record["session_name"] for record in traffic}):
+        create_session(name)
+
+    results, elapsed = replay(traffic, send, args.rps, args.requests or len(traffic), args.concurrency)
+    report = {"target_rps": args.rps, "elapsed_s": elapsed, "routes": summarize(results, elapsed)}
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"\nTarget {args.rps:g} req/s, {len(results)} requests in {elapsed:.1f} s")
+    for route, stats in report["routes"].items():
+        line = (f"  {route:<13} {stats['requests']:5d} req  {stats['errors']:3d} err  "
+                f"{stats['throughput_rps']:7.2f} req/s   p50 {stats['p50_ms']:8.1f} ms   "
+                f"p95 {stats['p95_ms']:8.1f} ms   p99 {stats['p99_ms']:8.1f} ms")
+        if "first_byte_p50_ms" in stats:
+            line += f"   first byte p50 {stats['first_byte_p50_ms']:.1f} ms"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
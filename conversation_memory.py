@@ -0,0 +1,176 @@
+"""
+Bounded, token-aware conversation memory with a rolling summary.
+
+The full message history is kept for display, but the prompt only receives the last
+few turns verbatim (limited by both a turn count and a token budget) plus a running
+summary of everything older. The summary is updated incrementally in the background
+after a turn completes, so summarization never adds latency to a reply and the prompt
+size stays flat no matter how long a session gets.
+
+Neither path needs the whole history: the prompt only reads the newest `max_messages`
+messages, and a summary update only the messages after the summary's `upto` index
+(pass their absolute position as `offset`), so the per-turn cost is flat as well.
+"""
+import asyncio
+import logging
+import threading
+
+from langchain_core.messages import SystemMessage
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a library patron and the "
+    "NovelNest Library assistant. Update the summary with the new messages below. Keep "
+    "names, appointment details, open requests and anything the assistant promised; drop "
+    "small talk. Reply with the updated summary only, in at most {max_words} words.\n\n"
+    "Current summary:\n{summary}\n\nNew messages:\n{messages}"
+)
+
+_encoding = None
+_encoding_failed = False
+
+
+def count_tokens(text):
+    """
+    Counts tokens with tiktoken when its encoding is available, otherwise estimates
+    roughly four characters per token.
+    """
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            logger.warning("Token counting falls back to an estimate", extra={"error": str(e)})
+            _encoding_failed = True
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return len(text) // 4 + 1
+
+
+def message_tokens(message):
+    """Approximate prompt tokens for one chat message, including per-message overhead."""
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    return count_tokens(content) + 4
+
+
+def new_summary_state():
+    """Returns the per-session state the memory policy keeps next to the message history."""
+    return {"text": "", "upto": 0}
+
+
+class RollingSummaryMemory:
+    """
+    Chooses which messages go into the prompt and keeps each session's summary up to date.
+
+    Args:
+        summarize (coroutine function): `await summarize(prompt)` returns the model's reply text.
+        max_turns (int): Maximum number of recent user/assistant turns kept verbatim.
+        max_tokens (int): Token budget for the verbatim messages.
+        summary_max_words (int): Target length of the rolling summary.
+    """
+
+    def __init__(self, summarize, max_turns=6, max_tokens=1500, summary_max_words=150):
+        self.summarize = summarize
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.summary_max_words = summary_max_words
+        self._in_flight = set()  # Sessions with a summary update running
+        self._lock = threading.Lock()
+
+    @property
+    def max_messages(self):
+        """Most messages the verbatim window can hold; older ones never reach the prompt."""
+        return self.max_turns * 2
+
+    def window_start(self, messages):
+        """Returns the index of the oldest message kept verbatim."""
+        start = len(messages)
+        tokens = 0
+        for i in range(len(messages) - 1, -1, -1):
+            tokens += message_tokens(messages[i])
+            if len(messages) - i > self.max_messages or tokens > self.max_tokens:
+                break
+            start = i
+        return start
+
+    def context(self, state, messages):
+        """
+        Returns the history to put in the prompt: the summary (if any) followed by the
+        recent messages that fit the turn and token limits.
+
+        Args:
+            state (dict): The session's summary state (see `new_summary_state`).
+            messages (list): The session's message history, or at least its newest `max_messages`.
+        """
+        recent = messages[self.window_start(messages):]
+        if state and state.get("text"):
+            summary = SystemMessage(content=f"Summary of the earlier conversation: {state['text']}")
+            return [summary] + list(recent)
+        return list(recent)
+
+    def needs_update(self, state, messages, offset=0):
+        """True if some messages have left the verbatim window but are not summarized yet."""
+        return state["upto"] < offset + self.window_start(messages)
+
+    async def update(self, session_name, state, messages, offset=0):
+        """
+        Folds messages that left the verbatim window into the session's summary.
+
+        Args:
+            messages (list): The end of the session's history, covering at least every message
+                from `state["upto"]` on.
+            offset (int): Index of `messages[0]` in the full history.
+
+        Returns:
+            bool: True if `state` was updated.
+        """
+        end = offset + self.window_start(messages)
+        if state["upto"] >= end:
+            return False
+        new_messages = messages[max(state["upto"] - offset, 0):end - offset]
+        transcript = "\n".join(
+            f"{'Patron' if m.type == 'human' else 'Assistant'}: {m.content}" for m in new_messages
+        )
+        prompt = SUMMARY_PROMPT.format(
+            max_words=self.summary_max_words, summary=state["text"] or "(empty)", messages=transcript
+        )
+        text = (await self.summarize(prompt)).strip()
+        if not text:
+            return False
+        state["text"] = text
+        state["upto"] = end
+        return True
+
+    def schedule_update(self, session_name, state, messages, submit, save=None, offset=0):
+        """
+        Starts a background summary update if one is needed and none is running for this
+        session. Returns immediately.
+
+        Args:
+            messages (list): As in `update`.
+            offset (int): As in `update`.
+            submit (callable): Schedules a coroutine in the background, e.g. `async_runtime.submit`.
+            save (callable, optional): Called with the updated state, e.g. to persist it; runs in
+                a worker thread so a blocking store does not stall the event loop.
+        """
+        messages = list(messages)
+        if not self.needs_update(state, messages, offset):
+            return None
+        with self._lock:
+            if session_name in self._in_flight:
+                return None
+            self._in_flight.add(session_name)
+
+        async def run():
+            try:
+                if await self.update(session_name, state, messages, offset) and save is not None:
+                    await asyncio.to_thread(save, state)
+            except Exception as e:
+                logger.error("Error updating conversation summary", extra={"session": session_name, "error": str(e)})
+            finally:
+                with self._lock:
+                    self._in_flight.discard(session_name)
+
+        return submit(run())
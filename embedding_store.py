@@ -0,0 +1,356 @@
+"""
+On-disk embedding cache for the FAQ RAG pipeline.
+
+Embeddings are keyed by a hash of the embedding model and the entry content, so an
+unchanged FAQ can be reloaded on startup without calling the embeddings API again.
+The store also keeps a manifest of what was last upserted to each vector index, which
+lets the sync step upsert only new or changed entries and delete removed ones.
+
+Embeddings are held as packed float32 rows of one memory-mapped `.npy` matrix (about 6 KB
+per 1536-dimension embedding instead of roughly 50 KB as a list of Python floats), and
+`get` returns a read-only row of that matrix.
+
+`QueryEmbeddingCache` caches user-query embeddings in a bounded LRU/TTL map, optionally
+backed by a SQLite file shared between worker processes.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(text, model):
+    """
+    Computes the cache key for a piece of text embedded with a given model.
+
+    Args:
+        text (str): The text that is (or will be) embedded.
+        model (str): The embedding model name.
+
+    Returns:
+        str: A hex SHA-256 digest of the model name and text.
+    """
+    return hashlib.sha256(f"{model}\n{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    A cache of embeddings in a memory-mapped float32 matrix, plus a manifest of synced vector IDs.
+
+    Args:
+        cache_dir (str): Directory where the cache files are written.
+        model (str): The embedding model name, used as part of every cache key.
+    """
+
+    def __init__(self, cache_dir, model):
+        self.cache_dir = cache_dir
+        self.model = model
+        self.vectors_path = os.path.join(cache_dir, "embeddings.npy")
+        self.keys_path = os.path.join(cache_dir, "embedding_keys.json")
+        self.embeddings_path = os.path.join(cache_dir, "embeddings.json")  # Lists of floats, read for migration
+        self.manifest_path = os.path.join(cache_dir, "manifest.json")
+        self._rows, self._matrix = self._read_vectors()  # key -> row of the memory-mapped matrix
+        self._added = {}  # key -> float32 vector, not saved yet
+        self._manifest = self._read_json(self.manifest_path)
+        self._dirty = False
+
+    @staticmethod
+    def _read_json(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable embedding cache file", extra={"path": path, "error": str(e)})
+            return {}
+
+    @staticmethod
+    def _write_json(path, data):
+        # Write to a temporary file first so concurrent workers never read a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def _read_vectors(self):
+        """Returns ({key: row}, memory-mapped matrix), converting a cache written as JSON lists."""
+        keys = self._read_json(self.keys_path)
+        if keys:
+            try:
+                matrix = np.load(self.vectors_path, mmap_mode="r")
+                if matrix.ndim == 2 and len(matrix) == len(keys):
+                    return {key: row for row, key in enumerate(keys)}, matrix
+                logger.warning("Ignoring embedding cache file that does not match its keys", extra={"path": self.vectors_path, "keys_path": self.keys_path})
+            except (OSError, ValueError) as e:
+                logger.warning("Ignoring unreadable embedding cache file", extra={"path": self.vectors_path, "error": str(e)})
+            return {}, None
+
+        legacy = self._read_json(self.embeddings_path)
+        if not legacy:
+            return {}, None
+        try:
+            matrix = np.asarray(list(legacy.values()), dtype=np.float32)
+        except ValueError as e:
+            logger.warning("Ignoring unreadable embedding cache file", extra={"path": self.embeddings_path, "error": str(e)})
+            return {}, None
+        return {key: row for row, key in enumerate(legacy)}, matrix
+
+    def key(self, text):
+        """Returns the cache key for `text` under this store's model."""
+        return content_hash(text, self.model)
+
+    def get(self, key):
+        """Returns the cached embedding for `key` as a float32 array, or None if it is not cached."""
+        vector = self._added.get(key)
+        if vector is not None:
+            return vector
+        row = self._rows.get(key)
+        return None if row is None else self._matrix[row]
+
+    def put(self, key, vector):
+        """Caches the embedding for `key`."""
+        self._added[key] = np.array(vector, dtype=np.float32)
+        self._dirty = True
+
+    def prune(self, keep_keys):
+        """Drops cached embeddings whose keys are not in `keep_keys`."""
+        keep_keys = set(keep_keys)
+        stale = [key for key in list(self._rows) + list(self._added) if key not in keep_keys]
+        for key in stale:
+            self._rows.pop(key, None)
+            self._added.pop(key, None)
+        if stale:
+            self._dirty = True
+
+    def get_manifest(self, target):
+        """
+        Returns the {vector_id: content_hash} mapping last synced to `target`.
+
+        Args:
+            target (str): Identifies the index and namespace, e.g. "faq-index-new/faq".
+        """
+        return dict(self._manifest.get(target, {}))
+
+    def set_manifest(self, target, id_to_hash):
+        """Records the {vector_id: content_hash} mapping now present in `target`."""
+        self._manifest[target] = dict(id_to_hash)
+        self._dirty = True
+
+    def save(self):
+        """Persists the cache and manifest to disk if anything changed."""
+        if not self._dirty:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._write_vectors()
+        self._write_json(self.manifest_path, self._manifest)
+        self._dirty = False
+
+    def _write_vectors(self):
+        """Writes every cached embedding into a new matrix file, row by row, and maps it again."""
+        keys = [key for key in self._rows if key not in self._added] + list(self._added)
+        dimension = len(self.get(keys[-1])) if keys else 0
+        tmp_path = os.path.join(self.cache_dir, f"embeddings.{os.getpid()}.tmp.npy")
+        if keys:
+            out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(len(keys), dimension))
+            try:
+                for row, key in enumerate(keys):
+                    vector = self.get(key)
+                    if len(vector) != dimension:
+                        raise ValueError(f"Embedding {key} has dimension {len(vector)} (expected {dimension})")
+                    out[row] = vector
+                out.flush()
+            except ValueError:
+                del out
+                os.remove(tmp_path)
+                raise
+            del out
+        else:
+            np.save(tmp_path, np.empty((0, 0), dtype=np.float32))
+
+        # Vectors first, so a reader never sees keys that are newer than the matrix
+        self._matrix = None  # Release our memory map before replacing the file
+        os.replace(tmp_path, self.vectors_path)
+        self._write_json(self.keys_path, keys)
+        if os.path.exists(self.embeddings_path):
+            os.remove(self.embeddings_path)  # Converted to the matrix format
+        self._rows = {key: row for row, key in enumerate(keys)}
+        self._matrix = np.load(self.vectors_path, mmap_mode="r") if keys else None
+        self._added = {}
+
+
+def normalize_query(text):
+    """
+    Normalizes a query for cache lookups: lowercase, punctuation removed, whitespace collapsed.
+
+    "Library hours?" and "  library HOURS " map to the same key.
+    """
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+
+class QueryEmbeddingCache:
+    """
+    A bounded LRU/TTL cache of query embeddings with an optional shared on-disk tier.
+
+    Args:
+        model (str): The embedding model name, used as part of every cache key.
+        max_size (int): Maximum number of embeddings kept in memory.
+        ttl (float): Seconds an entry stays valid; 0 disables expiry.
+        disk_path (str, optional): SQLite file for the shared tier; None keeps the cache in memory only.
+    """
+
+    def __init__(self, model, max_size=1024, ttl=86400, disk_path=None):
+        self.model = model
+        self.max_size = max_size
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (created_at, vector)
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _connect(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.disk_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.disk_path, timeout=5, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings (key TEXT PRIMARY KEY, vector BLOB, created_at REAL)"
+            )
+            self._db.commit()
+        return self._db
+
+    def _expired(self, created_at):
+        return self.ttl and time.time() - created_at > self.ttl
+
+    def _remember(self, key, created_at, vector):
+        self._entries[key] = (created_at, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _disk_get(self, key):
+        row = self._connect().execute(
+            "SELECT vector, created_at FROM query_embeddings WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or self._expired(row[1]):
+            return None
+        return row[1], np.frombuffer(row[0], dtype=np.float32)
+
+    def _disk_put(self, key, created_at, vector):
+        db = self._connect()
+        db.execute(
+            "INSERT OR REPLACE INTO query_embeddings (key, vector, created_at) VALUES (?, ?, ?)",
+            (key, vector.tobytes(), created_at)
+        )
+        db.commit()
+
+    def _lookup(self, key):
+        """Returns the cached vector for `key` from memory or disk, counting a hit or a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not self._expired(entry[0]):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self._entries.pop(key, None)
+
+            if self.disk_path:
+                try:
+                    entry = self._disk_get(key)
+                except sqlite3.Error as e:
+                    logger.warning("Error reading query embedding cache", extra={"error": str(e)})
+                    entry = None
+                if entry is not None:
+                    self._remember(key, *entry)
+                    self.disk_hits += 1
+                    return entry[1]
+            self.misses += 1
+            return None
+
+    def _store(self, key, embedding):
+        """Caches a freshly computed embedding and returns it as a read-only float32 array."""
+        vector = np.array(embedding, dtype=np.float32)
+        vector.flags.writeable = False  # Shared by every caller that hits the cache
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, created_at, vector)
+            if self.disk_path:
+                try:
+                    self._disk_put(key, created_at, vector)
+                except sqlite3.Error as e:
+                    logger.warning("Error writing query embedding cache", extra={"error": str(e)})
+        return vector
+
+    def get_or_embed(self, query, embed):
+        """
+        Returns the cached embedding for `query`, calling `embed(query)` only on a miss.
+
+        Args:
+            query (str): The user query.
+            embed (callable): Computes the embedding for a query string.
+
+        Returns:
+            numpy.ndarray: The embedding as a read-only float32 array.
+        """
+        key = content_hash(normalize_query(query), self.model)
+        vector = self._lookup(key)
+        if vector is not None:
+            return vector
+        # Embed outside the lock so slow API calls do not serialize other lookups
+        return self._store(key, embed(query))
+
+    def get_or_embed_many(self, queries, embed_many):
+        """
+        Returns the embeddings of several queries, embedding all misses with one call.
+
+        Args:
+            queries (list): User queries; repeated and equivalent queries are embedded once.
+            embed_many (callable): Computes the embeddings for a list of query strings.
+
+        Returns:
+            list: One read-only float32 array per query, in order.
+        """
+        keys = [content_hash(normalize_query(query), self.model) for query in queries]
+        vectors = {}
+        missing = {}  # key -> query, in first-seen order
+        for key, query in zip(keys, queries):
+            if key in vectors or key in missing:
+                continue
+            vector = self._lookup(key)
+            if vector is None:
+                missing[key] = query
+            else:
+                vectors[key] = vector
+        if missing:
+            for key, embedding in zip(missing, embed_many(list(missing.values()))):
+                vectors[key] = self._store(key, embedding)
+        return [vectors[key] for key in keys]
+
+    def stats(self):
+        """Returns hit/miss counters and the current in-memory size."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+            }
+
+    def clear(self):
+        """Empties the in-memory tier and resets the counters (the disk tier is kept)."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = 0
@@ -0,0 +1,317 @@
+"""
+Offline, deterministic stand-ins for the OpenAI and Pinecone clients.
+
+Used for tests, local benchmarks and load tests, where calling the real APIs would be
+slow, costly and non-deterministic:
+- `FakeEmbeddings` replaces `OpenAIEmbeddings`: hash-based bag-of-words vectors, so the
+  same text always gets the same vector and texts sharing words are close.
+- `FakePinecone` replaces the Pinecone client; its indexes are `LocalVectorIndex`es.
+- `FakeChatModel` replaces `ChatOpenAI`, and `FakeOpenAI`/`FakeAsyncOpenAI` replace the
+  OpenAI clients used for JSON classification. Replies are derived from the prompt with
+  the fast-path classifier's rules.
+
+Every fake sleeps for a configurable latency per call, so throughput and tail latency can
+be measured realistically. Set `FAKE_BACKENDS=1` to make `faq_search_rag` and
+`model_clients` use them; `FAKE_EMBEDDING_LATENCY`, `FAKE_INDEX_LATENCY`,
+`FAKE_CHAT_LATENCY` and `FAKE_TOKEN_LATENCY` (seconds) set the default latencies.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from fast_classifier import FastClassifier
+from lexical_index import tokenize
+from vector_index import LocalVectorIndex
+
+FAKE_EMBEDDING_LATENCY = float(os.getenv("FAKE_EMBEDDING_LATENCY", "0"))
+FAKE_INDEX_LATENCY = float(os.getenv("FAKE_INDEX_LATENCY", "0"))
+FAKE_CHAT_LATENCY = float(os.getenv("FAKE_CHAT_LATENCY", "0"))
+FAKE_TOKEN_LATENCY = float(os.getenv("FAKE_TOKEN_LATENCY", "0"))
+
+EMBEDDING_DIMENSION = 1536
+
+_rules = FastClassifier()  # Rules only: no embeddings, so replies never recurse into the fakes
+
+TIME = re.compile(r"\b\d{1,2}(:\d{2})?\s*(am|pm|a\.m\.|p\.m\.)|\bnoon\b", re.IGNORECASE)
+DATE = re.compile(
+    r"\b(today|tomorrow|(next\s+)?(mon|tues|wednes|thurs|fri|satur|sun)day|"
+    r"(jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?\s+\d{1,2}(st|nd|rd|th)?|"
+    r"\d{1,2}/\d{1,2}(/\d{2,4})?)\b",
+    re.IGNORECASE,
+)
+PURPOSE = re.compile(r".*\b(?:to|for)\s+(?!\d)(?!(?:today|tomorrow)\b)(.+?)[.!?]*$", re.IGNORECASE)
+
+
+def hash_embedding(text, dimension=EMBEDDING_DIMENSION):
+    """
+    Returns a deterministic, L2-normalized embedding of `text`.
+
+    Each stemmed, non-stopword token adds ±1 at a position derived from its hash, so texts
+    with words in common have a high cosine similarity and unrelated texts are near 0.
+    """
+    vector = np.zeros(dimension, dtype=np.float32)
+    for token in tokenize(text) or [text.strip().lower()]:
+        digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        vector[value % dimension] += 1.0 if value >> 63 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class FakeEmbeddings:
+    """
+    Drop-in for `OpenAIEmbeddings` returning `hash_embedding` vectors.
+
+    Args:
+        dimension (int): Embedding dimension.
+        latency (float): Seconds slept per call (not per text), like one API request.
+    """
+
+    def __init__(self, dimension=EMBEDDING_DIMENSION, latency=None):
+        self.dimension = dimension
+        self.latency = FAKE_EMBEDDING_LATENCY if latency is None else latency
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return [hash_embedding(text, self.dimension).tolist() for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return [hash_embedding(text, self.dimension).tolist() for text in texts]
+
+    async def aembed_query(self, text):
+        return (await self.aembed_documents([text]))[0]
+
+
+class FakeIndex:
+    """A Pinecone-style index backed by a `LocalVectorIndex`, sleeping `latency` seconds per request."""
+
+    def __init__(self, index, latency=0.0):
+        self._index = index
+        self.latency = latency
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def upsert(self, vectors, namespace="default"):
+        self._wait()
+        self._index.upsert(vectors, namespace=namespace)
+
+    def delete(self, ids=None, namespace="default", delete_all=False):
+        self._wait()
+        self._index.delete(self._index.ids(namespace) if delete_all else ids, namespace=namespace)
+
+    def query(self, vector, top_k=3, include_metadata=True, namespace="default"):
+        self._wait()
+        return self._index.query(vector=vector, top_k=top_k, include_metadata=include_metadata, namespace=namespace)
+
+    def ids(self, namespace="default"):
+        return self._index.ids(namespace)
+
+    def describe_index_stats(self):
+        self._wait()
+        namespaces = {}
+        if os.path.isdir(self._index.index_dir):
+            for namespace in sorted(os.listdir(self._index.index_dir)):
+                namespaces[namespace] = {"vector_count": len(self._index.ids(namespace))}
+        return {
+            "dimension": self._index.dimension,
+            "namespaces": namespaces,
+            "total_vector_count": sum(ns["vector_count"] for ns in namespaces.values()),
+        }
+
+
+class FakePinecone:
+    """
+    Drop-in for the `Pinecone` client (`list_indexes`, `create_index`, `Index`).
+
+    Args:
+        index_dir (str, optional): Where indexes are stored; a temporary directory by default.
+        latency (float): Seconds slept per index request.
+    """
+
+    def __init__(self, index_dir=None, latency=None):
+        if index_dir is None:
+            self._tmp = tempfile.TemporaryDirectory()  # Removed with this object
+            index_dir = self._tmp.name
+        self.index_dir = index_dir
+        self.latency = FAKE_INDEX_LATENCY if latency is None else latency
+        self._indexes = {}
+        self._dimensions = {}
+        if os.path.isdir(index_dir):
+            self._dimensions = {name: EMBEDDING_DIMENSION for name in os.listdir(index_dir)}
+
+    def list_indexes(self):
+        names = sorted(self._dimensions)
+        return SimpleNamespace(names=lambda: list(names))
+
+    def create_index(self, name, dimension=EMBEDDING_DIMENSION, metric="cosine", spec=None, **kwargs):
+        if name in self._dimensions:
+            raise ValueError(f"Index {name} already exists")
+        os.makedirs(os.path.join(self.index_dir, name), exist_ok=True)
+        self._dimensions[name] = dimension
+
+    def Index(self, name):
+        index = self._indexes.get(name)
+        if index is None:
+            if name not in self._dimensions:
+                raise ValueError(f"Index {name} not found")
+            local = LocalVectorIndex(os.path.join(self.index_dir, name), dimension=self._dimensions[name])
+            index = self._indexes[name] = FakeIndex(local, self.latency)
+        return index
+
+
+def _appointment_details(text):
+    """Naive date/time/purpose extraction, enough to drive the booking flow."""
+    date, time_, purpose = DATE.search(text), TIME.search(text), PURPOSE.search(text)
+    return {
+        "date": date.group(0) if date else "",
+        "time": time_.group(0) if time_ else "",
+        "purpose": purpose.group(1) if purpose else "",
+    }
+
+
+def _classification(text):
+    """The fused classifier's JSON object for one message."""
+    sentiment = _rules.classify_sentiment(text)[0]
+    intent = _rules.classify_intent(text)[0]
+    appointment = _appointment_details(text) if intent == "appointment" else {"date": "", "time": "", "purpose": ""}
+    return {"sentiment": sentiment, "intent": intent, "appointment": appointment}
+
+
+def fake_reply(messages):
+    """
+    Returns the deterministic reply to a chat prompt.
+
+    Args:
+        messages (list): {"role", "content"} dicts, in order.
+
+    Returns:
+        str: JSON for the classification and extraction prompts, a single label for the
+        sentiment and intent prompts, and otherwise a short conversational answer that
+        repeats any "[Assistant]: ..." context (FAQ passages, booking confirmations).
+    """
+    system = " ".join(m["content"] for m in messages if m["role"] == "system")
+    user = next((m["content"] for m in reversed(messages) if m["role"] != "system"), "")
+
+    if system.startswith("Classify the user's message"):
+        return json.dumps(_classification(user))
+    if system.startswith("Classify each of the user's messages"):
+        return json.dumps({"results": [{"id": item["id"], **_classification(item["message"])} for item in json.loads(user)]})
+    if system.startswith("Extract appointment details"):
+        return json.dumps(_appointment_details(user))
+    if user.startswith("Analyze the sentiment"):
+        return _rules.classify_sentiment(user.split(":", 1)[-1])[0]
+    if user.startswith("Determine the intent"):
+        message = user.split("User Message:", 1)[-1].split("\n\n")[0]
+        return _rules.classify_intent(message)[0]
+    if user.startswith("You maintain a running summary"):
+        return "The patron asked: " + " ".join(user.split("New messages:", 1)[-1].split()[-40:])
+
+    context = user.split("[Assistant]:", 1)
+    if len(context) == 2:
+        return "Here is what I found. " + context[1].strip()
+    return "Thanks for reaching out to NovelNest Library! How can I help you today?"
+
+
+def _as_dicts(messages):
+    roles = {"human": "user", "ai": "assistant"}
+    return [{"role": roles.get(m.type, m.type), "content": m.content} for m in messages]
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Drop-in for `ChatOpenAI` answering with `fake_reply`.
+
+    `latency` is slept before the reply (time to first token), and `token_latency` between
+    streamed words.
+    """
+
+    latency: float = FAKE_CHAT_LATENCY
+    token_latency: float = FAKE_TOKEN_LATENCY
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None,
+                  **kwargs: Any) -> ChatResult:
+        text = fake_reply(_as_dicts(messages))
+        time.sleep(self.latency + self.token_latency * len(text.split()))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None,
+                         **kwargs: Any) -> ChatResult:
+        text = fake_reply(_as_dicts(messages))
+        await asyncio.sleep(self.latency + self.token_latency * len(text.split()))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None,
+                **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency)
+        for position, word in enumerate(fake_reply(_as_dicts(messages)).split(" ")):
+            if position and self.token_latency:
+                time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=(" " if position else "") + word))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency)
+        for position, word in enumerate(fake_reply(_as_dicts(messages)).split(" ")):
+            if position and self.token_latency:
+                await asyncio.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=(" " if position else "") + word))
+
+
+def _completion(messages, model):
+    return SimpleNamespace(
+        model=model,
+        choices=[SimpleNamespace(index=0, finish_reason="stop",
+                                 message=SimpleNamespace(role="assistant", content=fake_reply(messages)))],
+    )
+
+
+class FakeOpenAI:
+    """Drop-in for `openai.OpenAI` supporting `chat.completions.create`."""
+
+    def __init__(self, latency=None):
+        self.latency = FAKE_CHAT_LATENCY if latency is None else latency
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model, messages, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        return _completion(messages, model)
+
+
+class FakeAsyncOpenAI:
+    """Drop-in for `openai.AsyncOpenAI` supporting `chat.completions.create`."""
+
+    def __init__(self, latency=None):
+        self.latency = FAKE_CHAT_LATENCY if latency is None else latency
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, model, messages, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return _completion(messages, model)
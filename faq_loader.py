@@ -0,0 +1,182 @@
+"""
+Streaming FAQ loader.
+
+Reads one FAQ file, every `.txt` file under a directory, or the files matching a glob
+pattern, and yields one `Document` per FAQ entry (or per chunk of a long answer) without
+holding whole files in memory.
+
+FAQ files are plain text: a numbered line ("12. Can I book a study room?") starts a
+question, the lines after it are the answer, and a short standalone line before a
+question ("Programs & Services", or a Markdown "# Heading") names the section. The
+numbers themselves are ignored, so duplicated or missing numbers do no harm.
+
+Each document carries `source`, `section`, `question` and `chunk` metadata and a stable
+`id` derived from its source file, question and chunk number. Inserting or removing an
+entry leaves every other ID unchanged, so re-indexing only touches what changed.
+"""
+import glob
+import hashlib
+import os
+import re
+
+QUESTION_LINE = re.compile(r"^\s*\d+\.\s+(.*\S)")
+MARKDOWN_HEADING = re.compile(r"^\s*#+\s+(.*\S)")
+MAX_HEADING_LENGTH = 60
+
+
+def resolve_faq_files(source):
+    """
+    Returns the FAQ files named by `source`, sorted.
+
+    Args:
+        source (str): A file, a directory (all `.txt` files below it) or a glob pattern.
+    """
+    if os.path.isdir(source):
+        return sorted(glob.glob(os.path.join(source, "**", "*.txt"), recursive=True))
+    if os.path.isfile(source):
+        return [source]
+    return sorted(path for path in glob.glob(source, recursive=True) if os.path.isfile(path))
+
+
+def _is_heading_candidate(line, previous_blank):
+    """A short standalone line that could name the section of the next question."""
+    text = line.strip()
+    return (
+        previous_blank
+        and 0 < len(text) <= MAX_HEADING_LENGTH
+        and text[-1] not in ".?!:"
+        and ":" not in text
+        and not text.startswith(("-", "*", "•"))
+    )
+
+
+def parse_faq_entries(lines):
+    """
+    Parses FAQ lines into entries, one at a time.
+
+    Args:
+        lines (iterable): Lines of one FAQ file.
+
+    Yields:
+        dict: {"section": str, "question": str, "answer": str}. Answer lines are joined with
+        spaces, skipping blank lines.
+    """
+    section = ""
+    question = None
+    answer = []
+    pending = None  # Possible section heading, decided by the next non-blank line
+    previous_blank = True
+
+    for line in lines:
+        line = line.rstrip("\n")
+        if not line.strip():
+            previous_blank = True
+            continue
+
+        heading = MARKDOWN_HEADING.match(line)
+        match = QUESTION_LINE.match(line)
+        if heading or match:
+            if question is not None:
+                yield {"section": section, "question": question, "answer": " ".join(answer)}
+                question, answer = None, []
+            if heading:
+                section, pending = heading.group(1), None
+            else:
+                if pending is not None:
+                    section, pending = pending, None
+                question = match.group(1)
+        else:
+            if pending is not None and question is not None:
+                answer.append(pending)  # Not a heading after all
+            pending = None
+            if _is_heading_candidate(line, previous_blank or question is None):
+                pending = line.strip()
+            elif question is not None:
+                answer.append(line.strip())
+        previous_blank = False
+
+    if pending is not None and question is not None:
+        answer.append(pending)
+    if question is not None:
+        yield {"section": section, "question": question, "answer": " ".join(answer)}
+
+
+def chunk_text(text, chunk_size=1000, chunk_overlap=200):
+    """
+    Splits text into chunks of at most `chunk_size` characters on word boundaries, each
+    repeating up to `chunk_overlap` characters from the end of the previous chunk.
+    """
+    if len(text) <= chunk_size:
+        return [text]
+    words = text.split(" ")
+    chunks = []
+    start = 0
+    while start < len(words):
+        end = start
+        length = 0
+        while end < len(words) and (end == start or length + 1 + len(words[end]) <= chunk_size):
+            length += len(words[end]) + (1 if end > start else 0)
+            end += 1
+        chunks.append(" ".join(words[start:end]))
+        if end >= len(words):
+            break
+        # Step back over up to `chunk_overlap` characters, always moving forward
+        overlap_start = end
+        overlap = 0
+        while overlap_start - 1 > start and overlap + len(words[overlap_start - 1]) + 1 <= chunk_overlap:
+            overlap_start -= 1
+            overlap += len(words[overlap_start]) + 1
+        start = overlap_start
+    return chunks
+
+
+def stable_id(source, question, occurrence, chunk):
+    """Content-based vector ID: the same question in the same file always maps to the same ID."""
+    digest = hashlib.sha256(f"{source}\n{question}\n{occurrence}".encode("utf-8")).hexdigest()[:16]
+    return f"{digest}-{chunk}"
+
+
+def iter_faq_documents(source, chunk_size=1000, chunk_overlap=200):
+    """
+    Yields FAQ Documents from a file, directory or glob pattern, one entry (or chunk) at a time.
+
+    Args:
+        source (str): A file, a directory (all `.txt` files below it) or a glob pattern.
+        chunk_size (int): Maximum characters of answer text per document.
+        chunk_overlap (int): Characters repeated between consecutive chunks of one answer.
+
+    Yields:
+        Document: page_content "question\\nanswer", with id, source, section, question and
+        chunk metadata.
+    """
+    from langchain_core.documents import Document  # Pulls in LangChain's runnables; not needed to import the server
+
+    paths = resolve_faq_files(source)
+    if not paths:
+        raise FileNotFoundError(f"No FAQ files found for {source}")
+    # IDs use paths relative to the source, so moving the FAQ directory keeps them stable
+    if os.path.isdir(source):
+        root = source
+    elif os.path.isfile(source):
+        root = os.path.dirname(os.path.abspath(source))
+    else:
+        root = os.getcwd()
+    for path in paths:
+        relative = os.path.relpath(path, root).replace(os.sep, "/")
+        seen = {}
+        with open(path, "r", encoding="utf-8") as f:
+            for entry in parse_faq_entries(f):
+                question = entry["question"]
+                occurrence = seen.get(question, 0)
+                seen[question] = occurrence + 1
+                for chunk, text in enumerate(chunk_text(entry["answer"], chunk_size, chunk_overlap)):
+                    yield Document(
+                        page_content=f"{question}\n{text}",
+                        metadata={
+                            "id": stable_id(relative, question, occurrence, chunk),
+                            "source": relative,
+                            "section": entry["section"],
+                            "question": question,
+                            "chunk": chunk,
+                        }
+                    )
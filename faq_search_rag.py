@@ -1,68 +1,105 @@
 import os
 from dotenv import load_dotenv  # Load environment variables
-from langchain_openai import OpenAIEmbeddings  # OpenAI embeddings
-from langchain_community.vectorstores import Pinecone  # Pinecone integration
-from langchain_community.document_loaders import TextLoader  # Load documents
-from langchain.chains.question_answering import load_qa_chain  # Q&A chain
-from langchain.schema import Document  # Define document structure
-from pinecone import Pinecone, ServerlessSpec  # Pinecone initialization
-import re  # Regular expressions for text processing
+from embedding_store import EmbeddingStore, QueryEmbeddingCache  # On-disk embedding caches
+from vector_index import LocalVectorIndex, as_embedding  # In-process NumPy vector index
+from ingestion import IngestionPipeline, batched, call_with_retries, document_id  # Batched, resumable embedding and upserts
+from faq_loader import iter_faq_documents  # Streaming multi-file FAQ loader
+from lexical_index import BM25Index, fuse_rankings  # Keyword retrieval and rank fusion
+from model_clients import FAKE_BACKENDS, EMBEDDING_MODEL, get_embeddings, get_pinecone  # Clients, created on first use
+from telemetry import record_cache, span  # Per-stage timing and cache hit metrics
+from model_calls import EMBEDDING_CALLS  # Rate limits, retries and coalescing for embedding calls
+import logging
 
 load_dotenv()  # Load environment variables from .env file
 
-# Initialize Pinecone
-try:
-    pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-except Exception as e:
-    print(f"Error initializing Pinecone: {e}")
+logger = logging.getLogger(__name__)
 
 # Define the Pinecone index name and environment
 PINECONE_INDEX_NAME = "faq-index-new"
 
-# Initialize OpenAI Embeddings
-try:
-    embeddings = OpenAIEmbeddings(openai_api_key=os.getenv("OPENAI_API_KEY"))
-except Exception as e:
-    print(f"Error initializing OpenAI embeddings: {e}")
+# Relative paths below are resolved against this module's directory, not the working directory,
+# so the server and ingest_faq.py find the same files wherever they are started from
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# FAQ source: a text file, a directory of .txt files or a glob pattern (e.g. one file per branch)
+FAQ_SOURCE = os.path.join(MODULE_DIR, os.getenv("FAQ_SOURCE", "FAQ_library.txt"))
+
+# Local cache directory for FAQ embeddings (of EMBEDDING_MODEL)
+# (the fake backends get their own cache, so fake vectors never mix with real ones)
+FAQ_CACHE_DIR = os.path.join(
+    MODULE_DIR, os.getenv("FAQ_CACHE_DIR", os.path.join(".faq_cache", "fake") if FAKE_BACKENDS else ".faq_cache")
+)
+
+# Retrieval backend: "pinecone" (default) or "local" for the in-process NumPy index
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "pinecone").lower()
+LOCAL_INDEX_DIR = os.path.join(MODULE_DIR, os.getenv("LOCAL_INDEX_DIR", os.path.join(FAQ_CACHE_DIR, "index")))
+# Precision of the scanned local matrix (float32, float16 or int8) and candidates re-ranked per match
+LOCAL_INDEX_DTYPE = os.getenv("LOCAL_INDEX_DTYPE", "float32").lower()
+LOCAL_INDEX_RESCORE = int(os.getenv("LOCAL_INDEX_RESCORE", "4"))
+local_index = LocalVectorIndex(LOCAL_INDEX_DIR, dtype=LOCAL_INDEX_DTYPE, rescore=LOCAL_INDEX_RESCORE)
+
+# Long FAQ answers are split into chunks of this many characters, overlapping by FAQ_CHUNK_OVERLAP
+FAQ_CHUNK_SIZE = int(os.getenv("FAQ_CHUNK_SIZE", "1000"))
+FAQ_CHUNK_OVERLAP = int(os.getenv("FAQ_CHUNK_OVERLAP", "200"))
+
+# Ingestion: documents per embedding request, concurrent requests, vectors per upsert, retries
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "4"))
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "100"))
+INGEST_MAX_RETRIES = int(os.getenv("INGEST_MAX_RETRIES", "5"))
+INGEST_CHECKPOINT_EVERY = int(os.getenv("INGEST_CHECKPOINT_EVERY", "10"))
+
+# Hybrid retrieval: passages returned, candidates taken from each retriever, and when a keyword
+# match is clear enough (normalized BM25 score and lead over the runner-up) to skip embeddings
+FAQ_TOP_K = int(os.getenv("FAQ_TOP_K", "3"))
+FAQ_CANDIDATES = int(os.getenv("FAQ_CANDIDATES", "10"))
+LEXICAL_SKIP_SCORE = float(os.getenv("LEXICAL_SKIP_SCORE", "0.5"))
+LEXICAL_SKIP_MARGIN = float(os.getenv("LEXICAL_SKIP_MARGIN", "2.0"))
+
+# Keyword index over the loaded FAQ, built by build_lexical_index
+lexical_index = BM25Index()
+
+# Cache of user-query embeddings; set QUERY_CACHE_PATH to share it between worker processes
+query_cache = QueryEmbeddingCache(
+    EMBEDDING_MODEL,
+    max_size=int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("QUERY_CACHE_TTL", "86400")),
+    disk_path=os.getenv("QUERY_CACHE_PATH") or None
+)
+
+def pinecone_client():
+    """Returns the Pinecone client, created on first use (the fake keeps its indexes in FAQ_CACHE_DIR)."""
+    return get_pinecone(os.path.join(FAQ_CACHE_DIR, "pinecone"))
+
+def embed_documents(texts):
+    """Embeds passages with the embeddings client, which is only created once something needs embedding."""
+    return get_embeddings().embed_documents(texts)
 
 def load_faq_data(file_path):
     """
-    Loads FAQ data from a text file and formats it into a list of Document objects.
+    Loads FAQ data from a text file, a directory of text files or a glob pattern and formats
+    it into a list of Document objects.
+
+    Use `iter_faq_documents` directly to stream large corpora without building the list.
     
     Args:
-        file_path (str): The path to the FAQ text file.
+        file_path (str): The path to the FAQ text file, a directory or a glob pattern.
     
     Returns:
-        list: A list of Document objects containing questions and answers.
+        list: A list of Document objects containing questions and answers, with stable IDs
+        and section/source metadata.
     """
     try:
-        # Read the file as a single text
-        with open(file_path, "r", encoding="utf-8") as f:
-            text = f.read()
-
-        # Use regex to split based on numbered questions (e.g., "1. What is...?", "2. How do I...?")  
-        faq_entries = re.split(r"\n\d+\.\s", text)[1:]  # Ignore first empty split
-
-        documents = []
-        for i, entry in enumerate(faq_entries):
-            # Extract the question (first line) and answer (rest of the text)
-            lines = entry.strip().split("\n")
-            question = lines[0]  # First line is the question
-            answer = " ".join(lines[1:]).strip()  # Remaining lines are the answer
-
-            # Store each FAQ as a separate document
-            documents.append(Document(page_content=f"{question}\n{answer}"))
-
-        return documents  # Returns a list of Documents, each representing one FAQ
+        return list(iter_faq_documents(file_path, chunk_size=FAQ_CHUNK_SIZE, chunk_overlap=FAQ_CHUNK_OVERLAP))
     except FileNotFoundError:
-        print("Error: FAQ file not found.")
+        logger.error("FAQ file not found", extra={"path": file_path})
     except Exception as e:
-        print(f"Error loading FAQ data: {e}")
+        logger.error("Error loading FAQ data", extra={"path": file_path, "error": str(e)})
 
 
 def generate_embeddings(faq_data):
     """
-    Generates embeddings for FAQ data using OpenAI embeddings.
+    Generates embeddings for FAQ data using OpenAI embeddings, in batches of INGEST_BATCH_SIZE.
     
     Args:
         faq_data (list): A list of Document objects containing FAQ entries.
@@ -71,16 +108,26 @@ def generate_embeddings(faq_data):
         list: A list of embeddings corresponding to the FAQ entries.
     """
     try:
-        return embeddings.embed_documents([doc.page_content for doc in faq_data])  
+        vectors = []
+        for batch in batched(faq_data, INGEST_BATCH_SIZE):
+            vectors.extend(call_with_retries(
+                EMBEDDING_CALLS.wrap(embed_documents, retries=0),
+                [doc.page_content for doc in batch],
+                max_retries=INGEST_MAX_RETRIES
+            ))
+        return vectors
     except Exception as e:
-        print(f"Error generating embeddings: {e}")
+        logger.error("Error generating embeddings", extra={"error": str(e)})
 
 def create_index():
     """
     Creates a Pinecone index if it does not already exist.
     """
     try:
+        pc = pinecone_client()
         if PINECONE_INDEX_NAME not in pc.list_indexes().names():
+            from pinecone import ServerlessSpec
+
             pc.create_index(
                 name=PINECONE_INDEX_NAME,
                 dimension=1536,  # The dimension should match the embedding size
@@ -91,7 +138,18 @@ def create_index():
                 ) 
             )
     except Exception as e:
-        print(f"Error creating Pinecone index: {e}")
+        logger.error("Error creating Pinecone index", extra={"error": str(e)})
+
+def get_index():
+    """
+    Returns the vector index for the configured retrieval backend.
+
+    Both backends support the same `upsert`, `delete` and `query` calls, so callers do
+    not need to know which one is in use.
+    """
+    if RETRIEVAL_BACKEND == "local":
+        return local_index
+    return pinecone_client().Index(PINECONE_INDEX_NAME)
 
 def upload_faq_to_pinecone(faq_data, faq_embeddings):
     """
@@ -106,77 +164,269 @@ def upload_faq_to_pinecone(faq_data, faq_embeddings):
         create_index()
 
         # Upload FAQ data and embeddings to Pinecone
-        index = pc.Index(PINECONE_INDEX_NAME)
+        index = pinecone_client().Index(PINECONE_INDEX_NAME)
 
         # Delete old data if necessary
         #index.delete(delete_all=True, namespace="faq")
 
-        # Prepare Pinecone upsert requests
-        upsert_data = []
-        for i in range(len(faq_data)):
-            vector = faq_embeddings[i]  # Embedding for current FAQ
-            metadata = {'text': faq_data[i].page_content}  # The FAQ question text
-            upsert_data.append((str(i), vector, metadata))
-
-        #Upsert the data to Pinecone (now each FAQ entry is a separate vector)
-        index.upsert(
-            vectors=upsert_data,
-            namespace="faq"  # Use a namespace to separate this data from others
+        # Prepare Pinecone upsert requests, one batch at a time
+        uploaded = 0
+        for batch in batched(range(len(faq_data)), UPSERT_BATCH_SIZE):
+            upsert_data = []
+            for i in batch:
+                vector = faq_embeddings[i]  # Embedding for current FAQ
+                metadata = {'text': faq_data[i].page_content}  # The FAQ question text
+                upsert_data.append((document_id(i, faq_data[i]), vector, metadata))
+
+            #Upsert the batch to Pinecone (each FAQ entry is a separate vector)
+            call_with_retries(
+                index.upsert,
+                vectors=upsert_data,
+                namespace="faq",  # Use a namespace to separate this data from others
+                max_retries=INGEST_MAX_RETRIES
+            )
+            uploaded += len(upsert_data)
+
+        logger.info("FAQ data uploaded to Pinecone", extra={"uploaded": uploaded})
+    except Exception as e:
+        logger.error("Error uploading to Pinecone", extra={"error": str(e)})
+
+def sync_faq_to_pinecone(faq_data):
+    """
+    Incrementally syncs FAQ data to the configured vector index using the on-disk embedding cache.
+
+    Only entries whose content is not cached are embedded, only entries that differ from
+    what was last synced are upserted, and IDs that no longer exist are deleted. With an
+    unchanged FAQ this makes no embedding calls and no index requests.
+
+    Documents are streamed through the ingestion pipeline: embedded in batches of
+    INGEST_BATCH_SIZE with INGEST_CONCURRENCY requests in flight, upserted in batches of
+    up to UPSERT_BATCH_SIZE vectors, and checkpointed so an interrupted sync resumes where
+    it stopped.
+
+    Args:
+        faq_data (iterable): Document objects containing FAQ entries; may be a generator.
+
+    Returns:
+        dict or None: The pipeline's counts ("documents", "embedded", "upserted", "deleted"),
+        or None if the sync failed.
+    """
+    try:
+        store = EmbeddingStore(FAQ_CACHE_DIR, EMBEDDING_MODEL)
+        if RETRIEVAL_BACKEND == "local":
+            target = f"local:{LOCAL_INDEX_DIR}/faq"
+        else:
+            target = f"{PINECONE_INDEX_NAME}/faq"
+
+        # Compare against what was last synced to this index and namespace
+        synced = store.get_manifest(target)
+        if RETRIEVAL_BACKEND == "local":
+            # The local index is cheap to inspect, so trust its contents over the manifest
+            present = set(local_index.ids("faq"))
+            synced = {vector_id: key for vector_id, key in synced.items() if vector_id in present}
+
+        def open_index():
+            # Only reached when something has to be written
+            if RETRIEVAL_BACKEND != "local":
+                create_index()
+            return get_index()
+
+        pipeline = IngestionPipeline(
+            store,
+            open_index,
+            target,
+            EMBEDDING_CALLS.wrap(embed_documents, retries=0),  # The pipeline retries itself
+            namespace="faq",
+            synced=synced,
+            batch_size=INGEST_BATCH_SIZE,
+            concurrency=INGEST_CONCURRENCY,
+            upsert_batch_size=UPSERT_BATCH_SIZE,
+            max_retries=INGEST_MAX_RETRIES,
+            checkpoint_every=INGEST_CHECKPOINT_EVERY
         )
+        counts = pipeline.run(faq_data)
 
-        print("FAQ data uploaded successfully.")
-        print("Uploaded", len(upsert_data), "FAQ entries to Pinecone")
+        logger.info("FAQ sync", extra=counts)
+        return counts
     except Exception as e:
-        print(f"Error uploading to Pinecone: {e}")
+        logger.error("Error syncing FAQ data to Pinecone", extra={"error": str(e)})
 
-def query_faq_pinecone(query):
+def load_cached_embeddings(faq_data):
     """
-    Queries the Pinecone index with a user question and retrieves the most relevant FAQ answer.
-    
+    Returns the cached embeddings for FAQ data without calling the embeddings API.
+
+    Args:
+        faq_data (list): A list of Document objects containing FAQ entries.
+
+    Returns:
+        list: One embedding per entry, or None for entries that are not cached yet.
+    """
+    store = EmbeddingStore(FAQ_CACHE_DIR, EMBEDDING_MODEL)
+    return [store.get(store.key(doc.page_content)) for doc in faq_data or []]
+
+def embed_query(query):
+    """
+    Generates the embedding for a user query, reusing cached embeddings for repeated questions.
+
+    Queries are matched after normalizing case, whitespace and punctuation. The lookup is
+    timed as the "embedding" stage and counted as a query_embedding cache hit or miss.
+
     Args:
         query (str): The user question.
 
     Returns:
-        str: The best matching answer from the FAQ database.
+        numpy.ndarray: The query embedding as a read-only float32 array.
     """
-    try:
-        #Generate the embedding (vector representation) for the query
-        query_embedding = embeddings.embed_query(query)
+    missed = []
 
-        #Debugging: Print query embedding information
-        #print(f"Query embedding length: {len(query_embedding)}")
-        #print(f"First 10 values of embedding: {query_embedding[:10]}")  # Check the first 10 values
+    def embed(text):
+        missed.append(text)
+        # Concurrent misses for the same question share one embedding call
+        return EMBEDDING_CALLS.call(get_embeddings().embed_query, text, key=text)
 
-        #Ensure the embedding is valid before querying Pinecone
-        if query_embedding is None:
-            raise ValueError("Query embedding is None!")
+    with span("embedding") as stage:
+        vector = query_cache.get_or_embed(query, embed)
+        stage["cache_hit"] = not missed
+    record_cache("query_embedding", not missed)
+    return vector
 
-        if any(x is None or isinstance(x, str) for x in query_embedding):
-            raise ValueError("Query embedding contains invalid values!")
+def embed_queries(queries):
+    """
+    Embeds many user queries at once, e.g. for a batch of chat messages.
 
-        #Ensure embedding has the correct dimension (1536 for OpenAI models)
-        if len(query_embedding) != 1536:
-            raise ValueError(f"Query embedding has incorrect dimension: {len(query_embedding)} (expected 1536)")
+    Cached queries are reused and the rest are embedded in batches of INGEST_BATCH_SIZE, so
+    later `embed_query` calls for the same questions are cache hits.
 
-        #Initialize the Pinecone index
-        index = pc.Index(PINECONE_INDEX_NAME)
+    Args:
+        queries (list): User questions.
+
+    Returns:
+        list: One read-only float32 array per query, in order.
+    """
+    def embed_many(texts):
+        vectors = []
+        for batch in batched(texts, INGEST_BATCH_SIZE):
+            vectors.extend(EMBEDDING_CALLS.call(embed_documents, batch))
+        return vectors
+
+    with span("embedding", queries=len(queries)):
+        return query_cache.get_or_embed_many(queries, embed_many)
+
+def build_lexical_index(faq_data):
+    """
+    Builds the BM25 keyword index used next to the vector index, with the same IDs.
+
+    Args:
+        faq_data (list): A list of Document objects containing FAQ entries.
+    """
+    lexical_index.build(
+        (document_id(i, doc), doc.page_content, {'text': doc.page_content}) for i, doc in enumerate(faq_data or [])
+    )
+    logger.info("Lexical index built", extra={"entries": len(lexical_index)})
+
+def format_passages(passages):
+    """Joins retrieved FAQ passages for the generation prompt."""
+    return "\n\n".join(passages)
+
+def lexical_faq_match(query):
+    """
+    Returns the keyword match for a question that has an obvious one, or None.
+
+    A match is obvious when its normalized BM25 score reaches LEXICAL_SKIP_SCORE and beats
+    the runner-up by LEXICAL_SKIP_MARGIN; such questions need no embedding call.
 
-        #Get index statistics (useful for debugging)
-        #print(index.describe_index_stats())
+    Args:
+        query (str): The user question.
+
+    Returns:
+        dict or None: The keyword index match, with its vector "id" and "metadata".
+    """
+    matches = lexical_index.search(query, top_k=2)
+    if not matches or matches[0]["normalized_score"] < LEXICAL_SKIP_SCORE:
+        return None
+    if len(matches) > 1 and matches[0]["score"] < LEXICAL_SKIP_MARGIN * matches[1]["score"]:
+        return None
+    return matches[0]
 
-        #Query Pinecone using the correct format (Pinecone 2.x)
+def lexical_faq_answer(query):
+    """
+    Returns the FAQ passage for a question that has an obvious keyword match (see
+    `lexical_faq_match`), or None.
+
+    Args:
+        query (str): The user question.
+
+    Returns:
+        str or None: The matching passage.
+    """
+    match = lexical_faq_match(query)
+    return None if match is None else format_passages([match["metadata"]["text"]])
+
+def retrieve_faq(query, top_k=None):
+    """
+    Ranks FAQ passages for a user question with the configured vector index (Pinecone or
+    local) and the keyword index.
+
+    Dense and keyword rankings are combined with reciprocal rank fusion, so exact-term
+    questions are not outranked by looser semantic matches.
+
+    Args:
+        query (str): The user question.
+        top_k (int, optional): Passages to return (default FAQ_TOP_K).
+
+    Returns:
+        list: (vector ID, passage text) pairs, best first.
+    """
+    #Generate the embedding (vector representation) for the query
+    query_embedding = embed_query(query)
+
+    #Ensure the embedding is a finite 1536-dimension vector (OpenAI models) before querying
+    query_vector = as_embedding(query_embedding, dimension=1536)
+
+    #Get the vector index for the configured backend (Pinecone or local)
+    index = get_index()
+
+    #Get index statistics (useful for debugging)
+    #print(index.describe_index_stats())
+
+    #Query Pinecone using the correct format (Pinecone 2.x)
+    with span("vector_query", backend=RETRIEVAL_BACKEND) as stage:
         results = index.query(
-            vector=query_embedding,  
-            top_k=3,  # Retrieve the top 3 most relevant FAQ entries
+            vector=query_vector if RETRIEVAL_BACKEND == "local" else query_vector.tolist(),
+            top_k=FAQ_CANDIDATES,  # Candidates for fusion with the keyword ranking
             include_metadata=True,  # Include stored metadata (the actual text answer)
             namespace="faq"  # Ensure we're searching within the "faq" namespace
         )
+        stage["matches"] = len(results.get("matches", []))
+
+    #Fuse the dense ranking with the keyword ranking
+    texts = {match["id"]: match["metadata"]["text"] for match in results.get("matches", [])}
+    dense_ranking = list(texts)
+    lexical_matches = lexical_index.search(query, top_k=FAQ_CANDIDATES)
+    for match in lexical_matches:
+        texts.setdefault(match["id"], match["metadata"]["text"])
+    fused = fuse_rankings([dense_ranking, [match["id"] for match in lexical_matches]])
+    return [(doc_id, texts[doc_id]) for doc_id, _ in fused[:top_k or FAQ_TOP_K]]
+
+def query_faq_pinecone(query):
+    """
+    Queries the configured vector index (Pinecone or local) and the keyword index with a user
+    question and retrieves the most relevant FAQ passages (see `retrieve_faq`).
+    
+    Args:
+        query (str): The user question.
+
+    Returns:
+        str: The FAQ_TOP_K best matching passages from the FAQ database, best first.
+    """
+    try:
+        passages = retrieve_faq(query)
 
-        #Return the best-matching result if there are any matches
-        if results.get("matches"):
-            return results["matches"][0]["metadata"]["text"]
+        #Return the best-matching passages if there are any matches
+        if passages:
+            return format_passages([text for _, text in passages])
         else:
-            print(f"No match found for query: {query}")
+            logger.info("No FAQ match found", extra={"query": query})
             return "Sorry, I couldn't find a relevant answer."
     except Exception as e:
-        print(f"Error querying Pinecone: {e}")
\ No newline at end of file
+        logger.error("Error querying Pinecone", extra={"error": str(e)})
@@ -0,0 +1,219 @@
+"""
+Local fast-path sentiment and intent classifier.
+
+Obvious messages ("what are your hours?", "book a study room tomorrow at 3") are
+classified with keyword/regex rules, optionally backed by nearest-neighbour matching
+against the cached FAQ embeddings. Every label comes with a confidence score, and the
+server only falls back to the LLM classifier when a confidence is below its threshold.
+"""
+import logging
+import re
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Intent cues
+ESCALATION = re.compile(
+    r"\b(speak|talk|chat)\s+(to|with)\s+(a\s+|the\s+|an?\s+actual\s+|a\s+real\s+)?"
+    r"(librarian|human|person|manager|someone|staff)\b|\bescalate\b|\b(file|make)\s+a\s+complaint\b",
+    re.IGNORECASE,
+)
+BOOKING = re.compile(
+    r"\b(book|reserve|schedule|appointment|consultation|sign\s+me\s+up|register\s+me)\b",
+    re.IGNORECASE,
+)
+# Changes to an existing booking, which the booking flow does not handle
+BOOKING_CHANGE = re.compile(r"\b(cancel\w*|reschedul\w*|postpon\w*|change|move|modify|push\s+back)\b", re.IGNORECASE)
+DATE_TIME = re.compile(
+    r"\b(today|tomorrow|tonight|this\s+(morning|afternoon|evening|week(end)?)|next\s+(week|\w+day)|"
+    r"(mon|tues|wednes|thurs|fri|satur|sun)day|"
+    r"(jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?\s+\d{1,2}(st|nd|rd|th)?|"
+    r"\d{1,2}(:\d{2})?\s*(am|pm|a\.m\.|p\.m\.)|at\s+\d{1,2}(:\d{2})?|\d{1,2}/\d{1,2}(/\d{2,4})?|noon)\b",
+    re.IGNORECASE,
+)
+QUESTION = re.compile(
+    r"^\s*(how|can|could|do|does|is|are|what|what's|where|when|who|which|may|will|would)\b|\?\s*$",
+    re.IGNORECASE,
+)
+FAQ_TOPICS = re.compile(
+    r"\b(hours?|open|opening|close[sd]?|closing|location|located|address|directions|library\s+card|"
+    r"membership|member|renew\w*|borrow\w*|return\w*|late|fees?|fines?|wi-?fi|internet|password|"
+    r"computers?|print\w*|e-?books?|audiobooks?|digital|events?|classes|book\s+clubs?|storytime|"
+    r"study\s+rooms?|donat\w*|lost|damaged|holds?)\b",
+    re.IGNORECASE,
+)
+GREETING = re.compile(
+    r"^\s*(hi|hello|hey|good\s+(morning|afternoon|evening)|thanks?(\s+you)?(\s+so\s+much)?|thank\s+you(\s+so\s+much)?|bye|goodbye)"
+    r"(\s+(there|again|everyone))?[\s!.,:)]*$",
+    re.IGNORECASE,
+)
+
+# Sentiment cues
+NEGATIVE = re.compile(
+    r"\b(frustrat\w*|angry|annoy\w*|upset|terrible|awful|horrible|worst|ridiculous|unacceptable|"
+    r"disappoint\w*|hate|useless|rude|furious|fed\s+up|sick\s+of|not\s+happy|unhappy|complain\w*)\b",
+    re.IGNORECASE,
+)
+POSITIVE = re.compile(
+    r"\b(love|great|awesome|amazing|wonderful|excellent|fantastic|appreciate\w*|helpful|perfect|"
+    r"thanks?|thank\s+you)\b",
+    re.IGNORECASE,
+)
+# Polite openers that contain a negative word but are no complaint ("I hate to bother you, but ...")
+POLITE_IDIOM = re.compile(
+    r"\b(hate|sorry|loath|annoying)\s+to\s+(bother|trouble|ask|interrupt|disturb|say|be\s+a\s+pain)\b",
+    re.IGNORECASE,
+)
+NEGATION = re.compile(r"\b(not|never|no|isn't|wasn't|aren't|don't|didn't)\s+(\w+\s+)?$", re.IGNORECASE)
+# A negative cue describing the speaker's own state or experience ("I am so frustrated", "this
+# is ridiculous", "your website is useless") rather than mentioned in passing ("a book about hate
+# speech"); "I" alone is not enough ("I hate to bother you")
+COMPLAINT = re.compile(
+    r"(\b(i|we)\s+(am|are|was|were|feel|felt|get|getting|got)|\b(i'm|we're|it's|that's|you're)"
+    r"(\s+(getting|feeling))?|\b(this|that|it|you|your\s+\w+|the\s+\w+)\s+(is|are|was|were))"
+    r"(\s+(really|so|very|incredibly|absolutely|totally|just|completely))?\s+$",
+    re.IGNORECASE,
+)
+
+# Confidence that a message without any sentiment or intent cue is neutral
+UNCUED_CONFIDENCE = 0.6
+
+
+class FastClassifier:
+    """
+    Rule-based sentiment/intent classifier with optional FAQ-embedding matching.
+
+    Args:
+        faq_vectors (list, optional): Cached FAQ embeddings used as `faq_question` prototypes.
+        embed_query (callable, optional): Returns the embedding of a message; only called when
+            the rules cannot decide the intent and prototypes are available.
+        threshold (float): Minimum confidence for a label to be used without asking the LLM.
+        similarity_threshold (float): Minimum cosine similarity to an FAQ entry for a
+            `faq_question` match.
+    """
+
+    def __init__(self, faq_vectors=None, embed_query=None, threshold=0.85, similarity_threshold=0.85):
+        self.embed_query = embed_query
+        self.threshold = threshold
+        self.similarity_threshold = similarity_threshold
+        self.set_prototypes(faq_vectors)
+
+    def set_prototypes(self, faq_vectors):
+        """Replaces the FAQ prototype vectors (entries that are None are skipped)."""
+        vectors = [v for v in (faq_vectors or []) if v is not None]
+        if vectors:
+            matrix = np.asarray(vectors, dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            self.prototypes = matrix / norms
+        else:
+            self.prototypes = None
+
+    def classify_sentiment(self, text):
+        """
+        A single negative word is only trusted when it describes the speaker's experience
+        ("this is ridiculous", not "I hate to bother you"), and a message without any sentiment word is only trusted to be
+        neutral when it is a recognizable question or request; everything else is left to the LLM.
+
+        Returns:
+            tuple: (label, confidence) with label 'positive', 'neutral' or 'negative'.
+        """
+        polite = [m.span() for m in POLITE_IDIOM.finditer(text)]
+        mentioned = [m for m in NEGATIVE.finditer(text) if not any(start <= m.start() < end for start, end in polite)]
+        negatives = [m for m in mentioned if not NEGATION.search(text[:m.start()])]
+        negated = len(negatives) < len(mentioned)
+        positives = POSITIVE.findall(text)
+
+        if negatives:
+            complaint = any(COMPLAINT.search(text[:m.start()]) for m in negatives)
+            if len(negatives) > 1 or (complaint and not positives):
+                return "negative", 0.95
+            return "negative", 0.6
+        if negated:
+            # "I'm not upset" and friends are left to the LLM
+            return "neutral", 0.5
+        if positives:
+            return "positive", 0.9
+        if "!!" in text or "??" in text or (len(text) > 12 and text.isupper()):
+            return "neutral", 0.5
+        if any(pattern.search(text) for pattern in (QUESTION, GREETING, BOOKING, ESCALATION, FAQ_TOPICS)):
+            return "neutral", 0.9
+        # A statement with no cue at all ("I've been waiting for twenty minutes") may well be a complaint
+        return "neutral", UNCUED_CONFIDENCE
+
+    def classify_intent(self, text):
+        """
+        Returns:
+            tuple: (label, confidence) with label 'appointment', 'escalation', 'faq_question'
+            or 'general_inquiry'.
+        """
+        if ESCALATION.search(text):
+            return "escalation", 0.95
+
+        booking = BOOKING.search(text)
+        question = QUESTION.search(text)
+        if booking and BOOKING_CHANGE.search(text):
+            # "cancel my appointment tomorrow" is no new booking; the LLM decides what it is
+            return "appointment", 0.6
+        if booking and DATE_TIME.search(text):
+            return "appointment", 0.95
+        if booking and not question:
+            return "appointment", 0.8
+
+        if FAQ_TOPICS.search(text):
+            return "faq_question", 0.9 if question else 0.75
+        if GREETING.match(text):
+            return "general_inquiry", 0.95
+
+        return self._match_faq(text)
+
+    def _match_faq(self, text):
+        """Falls back to nearest-neighbour matching against the FAQ embeddings, if available."""
+        if self.prototypes is None or self.embed_query is None:
+            return "general_inquiry", 0.0
+
+        try:
+            query = np.asarray(self.embed_query(text), dtype=np.float32)
+        except Exception as e:
+            logger.warning("Error embedding message for fast classification", extra={"error": str(e)})
+            return "general_inquiry", 0.0
+
+        norm = np.linalg.norm(query)
+        if not norm or query.shape[0] != self.prototypes.shape[1]:
+            return "general_inquiry", 0.0
+
+        similarity = float(np.max(self.prototypes @ (query / norm)))
+        if similarity >= self.similarity_threshold:
+            return "faq_question", similarity
+        return "general_inquiry", 0.0
+
+    def classify(self, text):
+        """
+        Classifies sentiment and intent. The intent is skipped (None, 0.0) when the message is
+        confidently negative, since the server escalates those without looking at intent, and
+        the embedding fallback is only consulted when the rules cannot decide.
+
+        Returns:
+            dict: {"sentiment", "sentiment_confidence", "intent", "intent_confidence"}
+        """
+        sentiment, sentiment_confidence = self.classify_sentiment(text)
+        if sentiment == "negative" and sentiment_confidence >= self.threshold:
+            intent, intent_confidence = None, 0.0
+        else:
+            intent, intent_confidence = self.classify_intent(text)
+            if sentiment == "neutral" and sentiment_confidence == UNCUED_CONFIDENCE and intent_confidence >= self.threshold:
+                # Close to an FAQ entry: as recognizable a request as one with keyword cues
+                sentiment_confidence = 0.9
+        return {
+            "sentiment": sentiment,
+            "sentiment_confidence": sentiment_confidence,
+            "intent": intent,
+            "intent_confidence": intent_confidence,
+        }
+
+    def is_confident(self, result):
+        """Returns True if every label the server needs from `result` meets the threshold."""
+        if result["sentiment_confidence"] < self.threshold:
+            return False
+        return result["intent"] is None or result["intent_confidence"] >= self.threshold
@@ -1,5 +1,10 @@
 import streamlit as st
 import requests
+import json
+import os
+import time
+
+SESSIONS_TTL = float(os.getenv("FRONTEND_SESSIONS_TTL", "5"))  # Seconds before the session list is revalidated
 
 st.title("Library Support Chatbot")
 
@@ -8,43 +13,117 @@ if "selected_user" not in st.session_state:
     st.session_state.selected_user = "(New User)"
 if "existing_sessions" not in st.session_state:
     st.session_state.existing_sessions = []
+if "sessions_cache" not in st.session_state:
+    st.session_state.sessions_cache = {"etag": None, "fetched_at": None}
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = ""
+if "history_cache" not in st.session_state:
+    st.session_state.history_cache = {}  # session name -> {"text", "last_seq", "etag", "epoch"}
+if "http" not in st.session_state:
+    st.session_state.http = requests.Session()  # Keeps the backend connection alive between reruns
 st.session_state.new_user = ""
+http = st.session_state.http
 
-# Fetch existing sessions with error handling
+# Fetch existing sessions with error handling; 304 when the list has not changed
 def fetch_sessions():
+    cache = st.session_state.sessions_cache
     try:
-        response = requests.get("http://127.0.0.1:5000/sessions")
+        headers = {"If-None-Match": cache["etag"]} if cache["etag"] else {}
+        response = http.get("http://127.0.0.1:5000/sessions", headers=headers)
         response.raise_for_status()  # Raise an exception for HTTP errors (4xx, 5xx)
+        cache["fetched_at"] = time.monotonic()
         if response.status_code == 200:
             st.session_state.existing_sessions = response.json().get("sessions", [])
+            cache["etag"] = response.headers.get("ETag")
     except requests.exceptions.RequestException as e:
         st.error(f"Error fetching sessions: {e}")
 
+# Sessions are created and evicted by other clients too, so the list is revalidated once it is SESSIONS_TTL old
+def refresh_sessions():
+    fetched_at = st.session_state.sessions_cache["fetched_at"]
+    if fetched_at is None or time.monotonic() - fetched_at >= SESSIONS_TTL:
+        fetch_sessions()
+
 
-# Fetch chat history for the selected session
+# Fetch the messages added to a session since the last fetch (cached per session)
 def fetch_chat_history(session_name):
-    st.session_state.chat_history = ""
+    cache = st.session_state.history_cache.setdefault(
+        session_name, {"text": "", "last_seq": 0, "etag": None, "epoch": None}
+    )
     try:
-        response = requests.get(f"http://127.0.0.1:5000/chat_history?session_name={session_name}")
+        headers = {"If-None-Match": cache["etag"]} if cache["etag"] else {}
+        params = {"session_name": session_name, "after": cache["last_seq"]}
+        if cache["epoch"] is not None:
+            params["epoch"] = cache["epoch"]  # Lets the backend tell us the session was recreated
+        response = http.get("http://127.0.0.1:5000/chat_history", params=params, headers=headers)
+        if response.status_code == 400:
+            st.session_state.history_cache.pop(session_name, None)  # The session no longer exists
         response.raise_for_status()
         if response.status_code == 200:
-            history = response.json().get("chat_history", [])
-            st.session_state.chat_history = "\n".join(
-                [f"{msg['role'].capitalize()}: {msg['content']}" for msg in history]
+            body = response.json()
+            if body.get("reset"):
+                # A new session of the same name: our transcript and cursor belong to the old one
+                cache["text"] = ""
+            new_messages = "\n".join(
+                [f"{msg['role'].capitalize()}: {msg['content']}" for msg in body.get("chat_history", [])]
             )
+            if new_messages:
+                cache["text"] = f"{cache['text']}\n{new_messages}" if cache["text"] else new_messages
+            cache["last_seq"] = body.get("latest_seq", cache["last_seq"])
+            cache["epoch"] = body.get("epoch")
+            cache["etag"] = response.headers.get("ETag")
+        st.session_state.chat_history = cache["text"]
     except requests.exceptions.RequestException as e:
         st.session_state.chat_history = "Error loading chat history."
         st.error(f"Error fetching chat history: {e}")
 
-fetch_sessions()  # Load sessions at start
+# Add a completed turn to the cached history without asking the backend for it again
+def append_turn(session_name, user_input, bot_response, seq, epoch):
+    cache = st.session_state.history_cache.get(session_name)
+    # Only when the turn was saved to the session we have cached and nothing else was written since our last fetch
+    if cache is None or epoch != cache["epoch"] or seq != cache["last_seq"] + 2:
+        return
+    turn = f"You: {user_input.strip()}\nBot: {bot_response}"
+    cache["text"] = f"{cache['text']}\n{turn}" if cache["text"] else turn
+    cache["last_seq"] = seq
+    cache["etag"] = None
+    st.session_state.chat_history = cache["text"]
+
+# Stream the bot response token by token from the Server-Sent Events endpoint
+def stream_chat(session_name, message, result):
+    """Yields response tokens; the final `done` event's data is stored in `result`."""
+    with http.post(
+        "http://127.0.0.1:5000/chat/stream",
+        json={'message': message, 'session_name': session_name},
+        stream=True
+    ) as response:
+        response.raise_for_status()
+        event = "message"
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+                if event == "message":
+                    yield data.get("token", "")
+                elif event == "done":
+                    result.update(data)
+            elif not line:
+                event = "message"  # A blank line ends the event
+
+refresh_sessions()  # Also refetched when a session is created or the selector changes
+
+# A session evicted or deleted elsewhere is no longer offered
+if st.session_state.selected_user not in ["(New User)"] + st.session_state.existing_sessions:
+    st.session_state.history_cache.pop(st.session_state.selected_user, None)
+    st.session_state.selected_user = "(New User)"
 
 # Select an existing session or create a new one
 selected_user = st.selectbox(
     "Select an existing session:", 
     ["(New User)"] + st.session_state.existing_sessions, 
-    index=(["(New User)"] + st.session_state.existing_sessions).index(st.session_state.selected_user)
+    index=(["(New User)"] + st.session_state.existing_sessions).index(st.session_state.selected_user),
+    on_change=fetch_sessions
 )
 
 # Disable new user input if an existing user is selected
@@ -53,15 +132,14 @@ new_user = st.text_input("Or create a new session:", disabled=(selected_user !=
 # Button to create/select session
 if st.button("Start Chat"):
     if selected_user != "(New User)":
-        st.session_state.selected_user = selected_user
-        fetch_chat_history(selected_user)  # Fetch chat history when session is selected
+        st.session_state.selected_user = selected_user  # Its history is fetched below
     elif new_user:
         # Check if new_user already exists in the existing sessions
         if new_user in st.session_state.existing_sessions:
             st.warning(f"The session name '{new_user}' already exists. Please choose a different name.")
         else:
             try:
-                response = requests.post("http://127.0.0.1:5000/new_session", json={'session_name': new_user})
+                response = http.post("http://127.0.0.1:5000/new_session", json={'session_name': new_user})
                 response.raise_for_status()  # Raise an exception for HTTP errors
                 if response.status_code == 200:
                     st.session_state.selected_user = new_user  # Auto-select new session
@@ -80,7 +158,7 @@ if st.button("Start Chat"):
 
 # Chat input (only when a session is selected and user is not creating a new session)
 if st.session_state.selected_user != "(New User)" and selected_user != "(New User)":
-    fetch_chat_history(selected_user) 
+    fetch_chat_history(selected_user)  # Only new messages; 304 when nothing changed
     # Chat history
     st.text_area("Chat History", value=st.session_state.chat_history, height=250, disabled=True)
 
@@ -89,16 +167,13 @@ if st.session_state.selected_user != "(New User)" and selected_user != "(New Use
     if st.button("Send"):
         if user_input.strip():  # Check if input is not empty
             try:
-                response = requests.post(
-                    "http://127.0.0.1:5000/chat",
-                    json={'message': user_input, 'session_name': st.session_state.selected_user}
-                )
-                response.raise_for_status()  # Raise an exception for HTTP errors
-                bot_response = response.json().get('response', 'Error')
-                st.write("Bot: " + bot_response)
+                # Render the response incrementally as tokens arrive
+                st.write("Bot:")
+                done = {}
+                bot_response = st.write_stream(stream_chat(st.session_state.selected_user, user_input, done))
 
-                # Update chat history in session state
-                st.session_state.chat_history += f"\nYou: {user_input}\nBot: {bot_response}"
+                # Update the cached chat history instead of fetching the turn back
+                append_turn(st.session_state.selected_user, user_input, bot_response, done.get("seq"), done.get("epoch"))
                 
             except requests.exceptions.RequestException as e:
                 st.error(f"Error communicating with the chatbot backend: {e}")
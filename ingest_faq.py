@@ -0,0 +1,44 @@
+"""
+Embeds the FAQ and uploads it to the vector index, ahead of (or alongside) the server.
+
+Only new or changed entries are embedded and upserted, and entries that were removed are
+deleted (see `faq_search_rag.sync_faq_to_pinecone`), so running it after every FAQ edit is
+cheap. The server then starts without touching the embeddings API or Pinecone; set
+STARTUP_WARMUP=off to skip its own background sync.
+
+The FAQ is streamed from disk (`faq_loader.iter_faq_documents`) rather than loaded as a
+list. Prints the sync counts as JSON and exits with status 1 if the sync failed; an
+empty or unreadable source fails without deleting anything from the index.
+
+Usage:
+    python ingest_faq.py
+    python ingest_faq.py --source faqs/ --backend local
+"""
+import argparse
+import json
+import sys
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", help="FAQ file, directory or glob pattern (default: FAQ_SOURCE)")
+    parser.add_argument("--backend", choices=["pinecone", "local"], help="Vector index (default: RETRIEVAL_BACKEND)")
+    args = parser.parse_args()
+
+    import faq_search_rag
+    import telemetry
+    from faq_loader import iter_faq_documents
+
+    telemetry.configure_logging()
+    if args.backend:
+        faq_search_rag.RETRIEVAL_BACKEND = args.backend
+
+    documents = iter_faq_documents(args.source or faq_search_rag.FAQ_SOURCE, chunk_size=faq_search_rag.FAQ_CHUNK_SIZE,
+                                   chunk_overlap=faq_search_rag.FAQ_CHUNK_OVERLAP)
+    counts = faq_search_rag.sync_faq_to_pinecone(documents)
+    print(json.dumps(counts))
+    sys.exit(0 if counts is not None else 1)
+
+
+if __name__ == "__main__":
+    main()
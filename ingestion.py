@@ -0,0 +1,236 @@
+"""
+Streaming ingestion pipeline for FAQ embeddings.
+
+Documents are read lazily, embedded in batches by a bounded pool of worker threads and
+upserted in batches limited by both vector count and request size, so memory use and
+request sizes stay flat however large the corpus is. Every call is retried with
+exponential backoff and jitter.
+
+Progress is checkpointed through the `EmbeddingStore`: embeddings are cached and the
+manifest of upserted IDs is saved every few upsert batches. An interrupted run can simply
+be started again; it skips every document that was already embedded or upserted.
+"""
+import json
+import logging
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Pinecone rejects upserts over 2 MB or 1000 vectors
+MAX_UPSERT_BYTES = 2 * 1024 * 1024
+MAX_UPSERT_VECTORS = 1000
+
+# Document metadata stored with each vector, next to its text
+UPSERT_METADATA = ("source", "section", "question", "chunk")
+
+
+def batched(iterable, size):
+    """Yields lists of up to `size` items from `iterable` without reading ahead."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def call_with_retries(func, *args, max_retries=5, base_delay=1.0, max_delay=30.0, **kwargs):
+    """
+    Calls `func`, retrying failures with exponential backoff and full jitter.
+
+    Args:
+        func (callable): The call to make.
+        max_retries (int): Retries after the first attempt before the error is raised.
+        base_delay (float): Delay before the first retry, in seconds; doubled for each retry.
+        max_delay (float): Upper bound for a single delay, in seconds.
+
+    Returns:
+        The result of `func(*args, **kwargs)`.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            logger.warning("Ingestion call failed, retrying", extra={"call": getattr(func, "__name__", "call"), "error": str(e), "delay_s": round(delay, 3)})
+            time.sleep(delay)
+
+
+def estimate_upsert_bytes(vector_id, vector, metadata):
+    """Approximate JSON request size of one upserted vector."""
+    return len(vector_id) + len(vector) * 12 + len(json.dumps(metadata)) + 32
+
+
+def document_id(position, document):
+    """Returns a document's vector ID: its "id" metadata if set, otherwise its position."""
+    return str(document.metadata.get("id") or position)
+
+
+class IngestionPipeline:
+    """
+    Embeds documents and upserts them into a vector index, skipping unchanged ones.
+
+    Args:
+        store (EmbeddingStore): Embedding cache and manifest of synced IDs (the checkpoint).
+        get_index (callable): Returns the vector index, with Pinecone-style `upsert(vectors, namespace)` and
+            `delete(ids, namespace)`. Called on the first write, so unchanged runs make no index requests.
+        target (str): Manifest key for the index and namespace, e.g. "faq-index-new/faq".
+        embed_documents (callable): Embeds a list of texts, e.g. `OpenAIEmbeddings.embed_documents`.
+        namespace (str): Index namespace.
+        synced (dict, optional): {vector_id: content_hash} known to be in the index; defaults to the manifest.
+        batch_size (int): Documents per embedding request.
+        concurrency (int): Embedding requests in flight at once.
+        upsert_batch_size (int): Maximum vectors per upsert request.
+        max_upsert_bytes (int): Maximum approximate size of one upsert request.
+        max_retries (int): Retries for each embedding or index request.
+        checkpoint_every (int): Upsert batches between checkpoints.
+    """
+
+    def __init__(self, store, get_index, target, embed_documents, namespace="faq", synced=None, batch_size=64,
+                 concurrency=4, upsert_batch_size=100, max_upsert_bytes=MAX_UPSERT_BYTES, max_retries=5,
+                 checkpoint_every=10):
+        self.store = store
+        self.get_index = get_index
+        self._index = None
+        self.target = target
+        self.embed_documents = embed_documents
+        self.namespace = namespace
+        self.synced = store.get_manifest(target) if synced is None else dict(synced)
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.upsert_batch_size = min(upsert_batch_size, MAX_UPSERT_VECTORS)
+        self.max_upsert_bytes = max_upsert_bytes
+        self.max_retries = max_retries
+        self.checkpoint_every = checkpoint_every
+        self._pending_upserts = []
+        self._pending_bytes = 0
+        self._batches_since_checkpoint = 0
+        self.counts = {"documents": 0, "embedded": 0, "upserted": 0, "deleted": 0}
+
+    def run(self, documents):
+        """
+        Ingests `documents` (any iterable of Documents, read lazily) and deletes IDs that are
+        no longer present.
+
+        An empty run never deletes: if the index already holds synced IDs, an empty
+        `documents` is treated as a failed load rather than a request to clear the index.
+
+        Returns:
+            dict: Counts of documents seen, embedded, upserted and deleted.
+
+        Raises:
+            ValueError: If `documents` is empty but IDs were synced before.
+        """
+        current = {}  # vector_id -> content hash, for every document in this run
+        try:
+            self._ingest(documents, current)
+        except BaseException:
+            self.checkpoint()  # Keep the progress made so far for the next run
+            raise
+        if not current and self.synced:
+            raise ValueError(f"No documents to ingest; refusing to delete the {len(self.synced)} synced IDs")
+
+        removed = [vector_id for vector_id in self.synced if vector_id not in current]
+        for batch in batched(removed, MAX_UPSERT_VECTORS):
+            call_with_retries(self.index().delete, ids=batch, namespace=self.namespace, max_retries=self.max_retries)
+        self.counts["deleted"] = len(removed)
+
+        self.store.prune(current.values())
+        self.store.set_manifest(self.target, current)
+        self.store.save()
+        return dict(self.counts)
+
+    def _ingest(self, documents, current):
+        """Embeds and upserts every document that is not in the index yet, recording all IDs in `current`."""
+        to_embed = []
+        in_flight = set()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for position, document in enumerate(documents):
+                vector_id = document_id(position, document)
+                key = self.store.key(document.page_content)
+                current[vector_id] = key
+                self.counts["documents"] += 1
+                if self.synced.get(vector_id) == key:
+                    continue  # Already in the index
+
+                vector = self.store.get(key)
+                if vector is not None:
+                    self._queue_upsert(vector_id, key, vector, document)
+                    continue
+
+                to_embed.append((vector_id, key, document))
+                if len(to_embed) >= self.batch_size:
+                    in_flight.add(executor.submit(self._embed, to_embed))
+                    to_embed = []
+                    # Bound the documents held in memory to `concurrency` batches
+                    while len(in_flight) >= self.concurrency:
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        self._collect(done)
+
+            if to_embed:
+                in_flight.add(executor.submit(self._embed, to_embed))
+            self._collect(in_flight)
+
+        self._flush_upserts()
+
+    def index(self):
+        """Returns the vector index, creating it on first use."""
+        if self._index is None:
+            self._index = self.get_index()
+        return self._index
+
+    def _embed(self, batch):
+        """Runs in a worker thread: returns the batch with one embedding per document."""
+        texts = [document.page_content for _, _, document in batch]
+        vectors = call_with_retries(self.embed_documents, texts, max_retries=self.max_retries)
+        return batch, vectors
+
+    def _collect(self, futures):
+        """Caches the embeddings from finished batches and queues them for upsert."""
+        for future in futures:
+            batch, vectors = future.result()
+            for (vector_id, key, document), vector in zip(batch, vectors):
+                self.store.put(key, vector)
+                self._queue_upsert(vector_id, key, vector, document)
+            self.counts["embedded"] += len(batch)
+
+    def _queue_upsert(self, vector_id, key, vector, document):
+        metadata = {'text': document.page_content}
+        metadata.update({name: document.metadata[name] for name in UPSERT_METADATA if name in document.metadata})
+        size = estimate_upsert_bytes(vector_id, vector, metadata)
+        if self._pending_upserts and self._pending_bytes + size > self.max_upsert_bytes:
+            self._flush_upserts()
+        self._pending_upserts.append((vector_id, key, np.asarray(vector, dtype=np.float32), metadata))
+        self._pending_bytes += size
+        if len(self._pending_upserts) >= self.upsert_batch_size:
+            self._flush_upserts()
+
+    def _flush_upserts(self):
+        """Sends the queued vectors in one upsert and checkpoints every few batches."""
+        if not self._pending_upserts:
+            return
+        vectors = [(vector_id, vector.tolist(), metadata) for vector_id, _, vector, metadata in self._pending_upserts]
+        call_with_retries(self.index().upsert, vectors=vectors, namespace=self.namespace, max_retries=self.max_retries)
+        for vector_id, key, _, _ in self._pending_upserts:
+            self.synced[vector_id] = key
+        self.counts["upserted"] += len(vectors)
+        self._pending_upserts = []
+        self._pending_bytes = 0
+
+        self._batches_since_checkpoint += 1
+        if self._batches_since_checkpoint >= self.checkpoint_every:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """Saves the cached embeddings and the IDs upserted so far, so a rerun can resume."""
+        self.store.set_manifest(self.target, self.synced)
+        self.store.save()
+        self._batches_since_checkpoint = 0
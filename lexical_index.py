@@ -0,0 +1,133 @@
+"""
+In-memory BM25 index for FAQ retrieval.
+
+Dense embeddings are good at paraphrases but can rank exact-term questions ("late fee",
+"wifi password") below a looser semantic match. `BM25Index` scores documents by keyword
+overlap and is combined with the vector index by reciprocal rank fusion (`fuse_rankings`).
+Scores can be normalized to [0, 1] against the best score the query could reach, so a
+threshold can tell when a keyword match is clear enough to skip the embedding call.
+"""
+import math
+import re
+from collections import Counter, defaultdict
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from how i if in is it my of on or our "
+    "so that the their there this to was we what when where which who why will with you your".split()
+)
+TOKEN = re.compile(r"\w+")
+
+
+def _stem(token):
+    """Very light suffix stripping so "fees"/"fee" and "libraries"/"library" match."""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    """Lowercases text and returns its stemmed, non-stopword tokens; "Wi-Fi" becomes "wifi"."""
+    text = re.sub(r"(\w)-(\w)", r"\1\2", text.lower())
+    return [_stem(token) for token in TOKEN.findall(text) if token not in STOPWORDS]
+
+
+def fuse_rankings(rankings, k=60, weights=None):
+    """
+    Reciprocal rank fusion of several ranked ID lists.
+
+    Args:
+        rankings (list): Lists of IDs, best first.
+        k (int): Damping constant; larger values flatten the contribution of top ranks.
+        weights (list, optional): One weight per ranking, default 1.0 each.
+
+    Returns:
+        list: (id, fused score) pairs, best first.
+    """
+    scores = defaultdict(float)
+    for ranking, weight in zip(rankings, weights or [1.0] * len(rankings)):
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] += weight / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed set of documents.
+
+    Args:
+        k1 (float): Term-frequency saturation.
+        b (float): Document-length normalization.
+    """
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids = []
+        self.metadata = []
+        self._postings = defaultdict(list)  # term -> [(document position, term frequency)]
+        self._lengths = []
+        self._idf = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def build(self, documents):
+        """
+        Indexes (id, text, metadata) tuples, replacing any previous contents.
+
+        Returns:
+            BM25Index: self, for chaining.
+        """
+        self.ids, self.metadata, self._lengths = [], [], []
+        self._postings = defaultdict(list)
+        for position, (doc_id, text, metadata) in enumerate(documents):
+            tokens = tokenize(text)
+            self.ids.append(doc_id)
+            self.metadata.append(metadata)
+            self._lengths.append(len(tokens))
+            for term, count in Counter(tokens).items():
+                self._postings[term].append((position, count))
+
+        n = len(self.ids)
+        # BM25+ style idf that stays positive for terms in most documents
+        self._idf = {term: math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                     for term, postings in self._postings.items()}
+        self._avg_length = sum(self._lengths) / n if n else 0.0
+        return self
+
+    def search(self, query, top_k=5):
+        """
+        Returns the best keyword matches for `query`.
+
+        Returns:
+            list: [{"id", "score", "normalized_score", "metadata"}, ...], best first. The
+            normalized score divides by the query's best achievable score, so 1.0 means
+            every query term matched strongly.
+        """
+        terms = set(tokenize(query))
+        if not terms or not self.ids:
+            return []
+
+        scores = defaultdict(float)
+        for term in terms:
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for position, tf in self._postings[term]:
+                length_norm = 1 - self.b + self.b * self._lengths[position] / self._avg_length
+                scores[position] += idf * tf * (self.k1 + 1) / (tf + self.k1 * length_norm)
+
+        # Upper bound: every query term present with a saturated term frequency
+        best_possible = sum(self._idf.get(term, max(self._idf.values())) for term in terms) * (self.k1 + 1)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [
+            {
+                "id": self.ids[position],
+                "score": score,
+                "normalized_score": score / best_possible,
+                "metadata": self.metadata[position],
+            }
+            for position, score in ranked
+        ]
@@ -0,0 +1,494 @@
+"""
+Shared call layer for model and embedding requests.
+
+Every chat completion and embedding request goes through a `CallLayer`, one per backend
+(`CHAT_CALLS`, `EMBEDDING_CALLS`), which provides:
+
+- a token bucket limiting the request rate; it halves its rate when the API answers
+  429 and creeps back to the configured rate as calls succeed,
+- retries of rate limits, timeouts, connection errors and 5xx responses with
+  exponential backoff and full jitter, honouring `Retry-After`,
+- single-flight coalescing: identical calls already in flight (same `key`) share one
+  request and its result instead of each calling the API,
+- a bounded number of requests in flight; callers beyond it queue in FIFO order, and a
+  call that would wait longer than the queue timeout fails fast with `OverloadedError`.
+
+Under a traffic spike requests therefore queue and slow down instead of failing, and
+only the excess beyond what the queue can absorb is shed. The layer works for both
+synchronous callers (worker threads) and coroutines on any event loop. In-flight calls,
+queue depth, queue wait, retries and coalesced calls are exported on `/metrics`.
+"""
+import asyncio
+import functools
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+# Requests in flight per backend, requests per second (0 for no limit) and burst size
+CHAT_MAX_CONCURRENCY = int(os.getenv("CHAT_MAX_CONCURRENCY", "32"))
+CHAT_RATE_LIMIT = float(os.getenv("CHAT_RATE_LIMIT", "0"))
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "16"))
+EMBEDDING_RATE_LIMIT = float(os.getenv("EMBEDDING_RATE_LIMIT", "0"))
+# Retries after the first attempt, and the longest a call may queue before it is shed (seconds)
+MODEL_MAX_RETRIES = int(os.getenv("MODEL_MAX_RETRIES", "3"))
+MODEL_QUEUE_TIMEOUT = float(os.getenv("MODEL_QUEUE_TIMEOUT", "30"))
+
+
+def retryable_errors():
+    """
+    Returns the errors worth retrying: the request may well succeed a moment later.
+
+    openai is imported here rather than with this module, which is imported at startup.
+    """
+    import openai
+
+    return openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError
+
+
+IN_FLIGHT = telemetry.register(telemetry.Gauge(
+    "model_calls_in_flight", "Model and embedding requests in flight.", ["backend"]))
+QUEUE_DEPTH = telemetry.register(telemetry.Gauge(
+    "model_call_queue_depth", "Calls waiting for a free request slot.", ["backend"]))
+QUEUE_SECONDS = telemetry.register(telemetry.Histogram(
+    "model_call_queue_seconds", "Time calls waited for the rate limit and a request slot.", ["backend"]))
+CALLS = telemetry.register(telemetry.Counter(
+    "model_calls", "Model and embedding calls by outcome.", ["backend", "outcome"]))
+RETRIES = telemetry.register(telemetry.Counter(
+    "model_call_retries", "Retried model and embedding requests, by error.", ["backend", "error"]))
+COALESCED = telemetry.register(telemetry.Counter(
+    "model_calls_coalesced", "Calls answered by an identical call already in flight.", ["backend"]))
+
+
+class OverloadedError(RuntimeError):
+    """Raised when a call would have to queue longer than the queue timeout."""
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket with an adaptive rate.
+
+    Args:
+        rate (float): Tokens added per second; 0 disables the limit.
+        burst (float, optional): Bucket size, i.e. calls allowed back to back. Defaults to `rate`.
+        min_rate (float, optional): Lowest rate `throttle()` may go down to. Defaults to a tenth of `rate`.
+    """
+
+    def __init__(self, rate, burst=None, min_rate=None):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = rate / 10 if min_rate is None else min_rate
+        self.burst = max(1.0, burst if burst is not None else rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait=None):
+        """
+        Takes a token, possibly ahead of time.
+
+        Returns:
+            float: Seconds the caller must wait before using the token.
+
+        Raises:
+            OverloadedError: If the wait would exceed `max_wait`; no token is taken.
+        """
+        if not self.rate:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if max_wait is not None and wait > max_wait:
+                raise OverloadedError(f"rate limit queue is full ({wait:.1f}s wait)")
+            self._tokens -= 1
+            return wait
+
+    def throttle(self):
+        """Halves the rate after the API reported a rate limit."""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def recover(self):
+        """Raises the rate by a twentieth of the configured rate after a successful call."""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class _Waiter:
+    """A queued caller: a thread waiting on an event, or a coroutine awaiting a future."""
+
+    def __init__(self, loop=None):
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class ConcurrencyLimit:
+    """
+    A FIFO semaphore shared by threads and coroutines (on any event loop).
+
+    Args:
+        limit (int): Slots, i.e. calls allowed in flight at once.
+    """
+
+    def __init__(self, limit):
+        self.limit = max(1, limit)
+        self.active = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def queued(self):
+        """Callers waiting for a slot."""
+        return len(self._waiters)
+
+    def _acquire_or_enqueue(self, waiter):
+        with self._lock:
+            if self.active < self.limit and not self._waiters:
+                self.active += 1
+                return True
+            self._waiters.append(waiter)
+            return False
+
+    def _abandon(self, waiter):
+        """Dequeues a waiter that gave up; returns False if it was handed a slot meanwhile."""
+        with self._lock:
+            try:
+                self._waiters.remove(waiter)
+                return True
+            except ValueError:
+                return False
+
+    def acquire(self, timeout=None):
+        """Waits for a slot, raising OverloadedError after `timeout` seconds."""
+        waiter = _Waiter()
+        if self._acquire_or_enqueue(waiter) or waiter.event.wait(timeout) or not self._abandon(waiter):
+            return
+        raise OverloadedError(f"no free request slot after {timeout:.1f}s")
+
+    async def acquire_async(self, timeout=None):
+        """Awaits a slot, raising OverloadedError after `timeout` seconds."""
+        waiter = _Waiter(asyncio.get_running_loop())
+        if self._acquire_or_enqueue(waiter):
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except asyncio.TimeoutError:
+            if self._abandon(waiter):
+                raise OverloadedError(f"no free request slot after {timeout:.1f}s") from None
+        except asyncio.CancelledError:
+            if not self._abandon(waiter):
+                self.release()  # Handed a slot while being cancelled: pass it on
+            raise
+
+    def release(self):
+        """Frees a slot, handing it straight to the longest-waiting caller if there is one."""
+        with self._lock:
+            if not self._waiters:
+                self.active -= 1
+                return
+            waiter = self._waiters.popleft()  # The slot stays taken, now by the waiter
+        waiter.wake()
+
+
+def retry_after(error):
+    """Returns the server's Retry-After delay in seconds, or None."""
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class CallLayer:
+    """
+    Rate limiting, retries, coalescing and a concurrency limit for one backend.
+
+    Args:
+        name (str): Backend name used in metrics and logs, e.g. "chat".
+        max_concurrency (int): Requests in flight at most.
+        rate (float): Requests per second; 0 for no limit.
+        burst (float, optional): Requests allowed back to back before the rate applies.
+        max_retries (int): Retries of retryable errors after the first attempt.
+        base_delay (float): Backoff before the first retry in seconds; doubled for each retry.
+        max_delay (float): Upper bound for a single backoff, in seconds.
+        queue_timeout (float): Longest a call may wait for the rate limit and a slot before
+            OverloadedError is raised.
+    """
+
+    def __init__(self, name, max_concurrency=16, rate=0, burst=None, max_retries=3, base_delay=0.5,
+                 max_delay=20.0, queue_timeout=30.0):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.limit = ConcurrencyLimit(max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.queue_timeout = queue_timeout
+        self._flights = {}  # (event loop or None, key) -> future of the call in flight
+        self._flights_lock = threading.Lock()
+        IN_FLIGHT.set_function(lambda: self.limit.active, backend=name)
+        QUEUE_DEPTH.set_function(lambda: self.limit.queued, backend=name)
+
+    def _backoff(self, error, attempt, max_retries):
+        """Returns the delay before retrying `error`, or None if it should be raised."""
+        import openai  # Loaded by the client that raised the error
+
+        if attempt >= max_retries or not isinstance(error, retryable_errors()):
+            return None
+        if isinstance(error, openai.RateLimitError):
+            self.bucket.throttle()
+        RETRIES.inc(backend=self.name, error=type(error).__name__)
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        delay = max(delay, min(self.max_delay, retry_after(error) or 0))
+        logger.warning("Model call failed, retrying", extra={
+            "backend": self.name, "error": str(error), "attempt": attempt + 1, "delay_s": round(delay, 3)})
+        return delay
+
+    def _succeeded(self):
+        self.bucket.recover()
+        CALLS.inc(backend=self.name, outcome="ok")
+
+    def _failed(self, error):
+        CALLS.inc(backend=self.name, outcome="overloaded" if isinstance(error, OverloadedError) else "error")
+
+    def _enter(self):
+        """Waits for the rate limit and a free slot (synchronously)."""
+        started = time.perf_counter()
+        time.sleep(self.bucket.reserve(self.queue_timeout))
+        self.limit.acquire(max(0.0, self.queue_timeout - (time.perf_counter() - started)))
+        QUEUE_SECONDS.observe(time.perf_counter() - started, backend=self.name)
+
+    async def _enter_async(self):
+        """Waits for the rate limit and a free slot without blocking the event loop."""
+        started = time.perf_counter()
+        await asyncio.sleep(self.bucket.reserve(self.queue_timeout))
+        await self.limit.acquire_async(max(0.0, self.queue_timeout - (time.perf_counter() - started)))
+        QUEUE_SECONDS.observe(time.perf_counter() - started, backend=self.name)
+
+    def _call(self, func, args, kwargs, max_retries):
+        for attempt in range(max_retries + 1):
+            self._enter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                delay = self._backoff(e, attempt, max_retries)
+                if delay is None:
+                    raise
+            else:
+                self._succeeded()
+                return result
+            finally:
+                self.limit.release()
+            time.sleep(delay)
+
+    async def _acall(self, func, args, kwargs, max_retries):
+        for attempt in range(max_retries + 1):
+            await self._enter_async()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                delay = self._backoff(e, attempt, max_retries)
+                if delay is None:
+                    raise
+            else:
+                self._succeeded()
+                return result
+            finally:
+                self.limit.release()
+            await asyncio.sleep(delay)
+
+    def call(self, func, *args, key=None, retries=None, **kwargs):
+        """
+        Calls `func(*args, **kwargs)` through the layer from a synchronous caller.
+
+        Args:
+            func (callable): The request, e.g. `embeddings.embed_query`.
+            key (hashable, optional): Identifies identical calls; a call whose key is already
+                in flight waits for that call's result instead of making its own request.
+            retries (int, optional): Overrides the number of retries, e.g. 0 when the caller
+                retries itself.
+
+        Returns:
+            The result of `func`.
+
+        Raises:
+            OverloadedError: If the call could not get a request slot within the queue timeout.
+        """
+        max_retries = self.max_retries if retries is None else retries
+        if key is None:
+            return self._guarded(self._call, func, args, kwargs, max_retries)
+
+        with self._flights_lock:
+            flight = self._flights.get((None, key))
+            leader = flight is None
+            if leader:
+                flight = self._flights[(None, key)] = Future()
+        if not leader:
+            COALESCED.inc(backend=self.name)
+            return flight.result()
+        try:
+            flight.set_result(self._guarded(self._call, func, args, kwargs, max_retries))
+        except BaseException as e:
+            flight.set_exception(e)
+        finally:
+            with self._flights_lock:
+                self._flights.pop((None, key), None)
+        return flight.result()
+
+    async def acall(self, func, *args, key=None, retries=None, **kwargs):
+        """
+        Awaits `func(*args, **kwargs)` through the layer; `func` returns an awaitable.
+
+        Takes the same `key` and `retries` arguments as `call()`. Coalescing applies to
+        identical calls on the same event loop.
+        """
+        max_retries = self.max_retries if retries is None else retries
+        if key is None:
+            return await self._guarded_async(func, args, kwargs, max_retries)
+
+        loop = asyncio.get_running_loop()
+        while True:
+            flight = self._flights.get((loop, key))  # Only touched from this loop's thread
+            if flight is None:
+                break
+            COALESCED.inc(backend=self.name)
+            try:
+                return await asyncio.shield(flight)
+            except asyncio.CancelledError:
+                if not flight.cancelled():
+                    raise  # This caller was cancelled, not the call it was waiting for
+                # The leading caller was cancelled: make the call ourselves
+
+        flight = self._flights[(loop, key)] = loop.create_future()
+        try:
+            result = await self._guarded_async(func, args, kwargs, max_retries)
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except BaseException as e:
+            flight.set_exception(e)
+            flight.exception()  # Marks it retrieved when nobody else was waiting
+            raise
+        else:
+            flight.set_result(result)
+            return result
+        finally:
+            self._flights.pop((loop, key), None)
+
+    def _guarded(self, call, func, args, kwargs, max_retries):
+        try:
+            return call(func, args, kwargs, max_retries)
+        except Exception as e:
+            self._failed(e)
+            raise
+
+    async def _guarded_async(self, func, args, kwargs, max_retries):
+        try:
+            return await self._acall(func, args, kwargs, max_retries)
+        except Exception as e:
+            self._failed(e)
+            raise
+
+    def stream(self, func, *args, retries=None, **kwargs):
+        """
+        Iterates over `func(*args, **kwargs)`, holding one request slot until it is exhausted.
+
+        A stream that fails before producing its first item is retried like any call;
+        once items have been yielded, errors are raised to the caller.
+        """
+        max_retries = self.max_retries if retries is None else retries
+        attempt = 0
+        while True:
+            self._enter()
+            started = False
+            delay = None
+            try:
+                for item in func(*args, **kwargs):
+                    started = True
+                    yield item
+                self._succeeded()
+                return
+            except Exception as e:
+                delay = None if started else self._backoff(e, attempt, max_retries)
+                if delay is None:
+                    self._failed(e)
+                    raise
+            finally:
+                self.limit.release()
+            time.sleep(delay)
+            attempt += 1
+
+    async def astream(self, func, *args, retries=None, **kwargs):
+        """
+        Iterates asynchronously over `func(*args, **kwargs)`, an async iterator, holding one
+        request slot until it is exhausted. Retries like `stream()`.
+        """
+        max_retries = self.max_retries if retries is None else retries
+        attempt = 0
+        while True:
+            await self._enter_async()
+            started = False
+            delay = None
+            try:
+                async for item in func(*args, **kwargs):
+                    started = True
+                    yield item
+                self._succeeded()
+                return
+            except Exception as e:
+                delay = None if started else self._backoff(e, attempt, max_retries)
+                if delay is None:
+                    self._failed(e)
+                    raise
+            finally:
+                self.limit.release()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def wrap(self, func, retries=None):
+        """Returns `func` routed through `call()`, e.g. to hand to code that expects a plain callable."""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return self.call(func, *args, retries=retries, **kwargs)
+        return wrapper
+
+    def stats(self):
+        """Returns the current rate, calls in flight and queue depth."""
+        return {"rate": self.bucket.rate, "in_flight": self.limit.active, "queued": self.limit.queued}
+
+
+CHAT_CALLS = CallLayer(
+    "chat",
+    max_concurrency=CHAT_MAX_CONCURRENCY,
+    rate=CHAT_RATE_LIMIT,
+    max_retries=MODEL_MAX_RETRIES,
+    queue_timeout=MODEL_QUEUE_TIMEOUT
+)
+EMBEDDING_CALLS = CallLayer(
+    "embedding",
+    max_concurrency=EMBEDDING_MAX_CONCURRENCY,
+    rate=EMBEDDING_RATE_LIMIT,
+    max_retries=MODEL_MAX_RETRIES,
+    queue_timeout=MODEL_QUEUE_TIMEOUT
+)
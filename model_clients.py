@@ -0,0 +1,162 @@
+"""
+Shared, long-lived model clients.
+
+Building a `ChatOpenAI` or `openai.OpenAI` per request throws away its HTTP connection
+pool and pays construction cost on every message. This module creates each client once
+per process, on first use, with a tunable connection pool and keep-alive settings.
+
+Every client is built with `max_retries=0`: retries, with their backoff and rate limiting,
+are left to `model_calls.CallLayer`, so the SDK's own retries do not multiply its attempts.
+
+Async clients are bound to the event loop they were first used on, so they are kept per
+event loop. In the server all async calls run on the single loop from `async_runtime`.
+
+With `FAKE_BACKENDS=1` every client is replaced by its offline stand-in from
+`fake_backends`, for tests, benchmarks and load tests without API keys.
+
+The client libraries (openai, httpx, LangChain's OpenAI integration, Pinecone) are
+imported by the factories, not by this module, so importing it stays cheap and a
+process only pays for the clients it actually uses.
+"""
+import asyncio
+import os
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+CHAT_MODEL = os.getenv("CHAT_MODEL", "gpt-4o-mini")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+
+# Use the deterministic offline fakes instead of OpenAI and Pinecone
+FAKE_BACKENDS = os.getenv("FAKE_BACKENDS", "").lower() in ("1", "true", "yes")
+
+# Connection pool settings shared by every OpenAI client
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+
+_registry = {}  # (name, event loop or None) -> client
+_lock = threading.RLock()  # Re-entrant: factories fetch the HTTP clients they depend on
+
+
+def _current_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def _get(name, factory, per_loop=False):
+    """Returns the registered client called `name`, creating it with `factory` on first use."""
+    key = (name, _current_loop() if per_loop else None)
+    client = _registry.get(key)
+    if client is None:
+        with _lock:
+            client = _registry.get(key)
+            if client is None:
+                client = _registry[key] = factory()
+    return client
+
+
+def http_limits():
+    """Returns the connection pool limits for the HTTP clients."""
+    import httpx
+
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+    )
+
+
+def get_http_client():
+    """Returns the shared synchronous HTTP client (connection pool)."""
+    import openai
+
+    return _get("http", lambda: openai.DefaultHttpxClient(limits=http_limits()))
+
+
+def get_async_http_client():
+    """Returns the async HTTP client (connection pool) for the running event loop."""
+    import openai
+
+    return _get("async_http", lambda: openai.DefaultAsyncHttpxClient(limits=http_limits()), per_loop=True)
+
+
+def get_openai_client():
+    """Returns the shared synchronous OpenAI client."""
+    if FAKE_BACKENDS:
+        from fake_backends import FakeOpenAI
+        return _get("openai", FakeOpenAI)
+    import openai
+
+    return _get("openai", lambda: openai.OpenAI(api_key=OPENAI_API_KEY, http_client=get_http_client(), max_retries=0))
+
+
+def get_async_openai_client():
+    """Returns the async OpenAI client for the running event loop."""
+    if FAKE_BACKENDS:
+        from fake_backends import FakeAsyncOpenAI
+        return _get("async_openai", FakeAsyncOpenAI, per_loop=True)
+    import openai
+
+    return _get(
+        "async_openai",
+        lambda: openai.AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=get_async_http_client(), max_retries=0),
+        per_loop=True
+    )
+
+
+def get_chat_llm():
+    """Returns the LangChain chat model for the running event loop (or for synchronous callers)."""
+    if FAKE_BACKENDS:
+        from fake_backends import FakeChatModel
+        return _get("chat_llm", FakeChatModel, per_loop=True)
+    from langchain_openai import ChatOpenAI
+
+    return _get(
+        "chat_llm",
+        lambda: ChatOpenAI(
+            model=CHAT_MODEL,
+            api_key=OPENAI_API_KEY,
+            http_client=get_http_client(),
+            http_async_client=get_async_http_client(),
+            max_retries=0
+        ),
+        per_loop=True
+    )
+
+
+def get_embeddings():
+    """Returns the shared LangChain embeddings client for EMBEDDING_MODEL."""
+    if FAKE_BACKENDS:
+        from fake_backends import FakeEmbeddings
+        return _get("embeddings", FakeEmbeddings)
+    from langchain_openai import OpenAIEmbeddings
+
+    return _get("embeddings", lambda: OpenAIEmbeddings(model=EMBEDDING_MODEL, openai_api_key=OPENAI_API_KEY,
+                                                            max_retries=0))
+
+
+def get_pinecone(fake_path=None):
+    """
+    Returns the shared Pinecone client.
+
+    Args:
+        fake_path (str, optional): Directory where the offline fake keeps its indexes.
+    """
+    if FAKE_BACKENDS:
+        from fake_backends import FakePinecone
+        return _get("pinecone", lambda: FakePinecone(fake_path))
+    from pinecone import Pinecone
+
+    return _get("pinecone", lambda: Pinecone(api_key=os.getenv("PINECONE_API_KEY")))
+
+
+def reset():
+    """Forgets every registered client, e.g. after changing settings in tests or benchmarks."""
+    with _lock:
+        _registry.clear()
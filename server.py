@@ -3,56 +3,165 @@ Flask Backend for Library Chatbot
 
 This server handles user sessions, chatbot interactions, sentiment analysis, intent detection, 
 and retrieval-augmented generation (RAG) using Pinecone.
+
+Importing this module has no side effects: model clients are created on first use, the FAQ
+is loaded on the first chat request, and embedding and uploading the FAQ (ingestion) is a
+separate step, `python ingest_faq.py`, or a background warmup started by `create_app()`.
+Run it with `python server.py` or a WSGI server pointed at the factory, e.g.
+`gunicorn 'server:create_app()'`.
 """
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, request, jsonify, stream_with_context
 from dotenv import load_dotenv
 import os
-from langchain_openai import ChatOpenAI
-from langchain.memory import ConversationBufferMemory
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables.history import RunnableWithMessageHistory
-from faq_search_rag import query_faq_pinecone, load_faq_data, generate_embeddings, upload_faq_to_pinecone
+from langchain_core.messages import AIMessage, HumanMessage
+from faq_search_rag import (query_faq_pinecone, load_faq_data, sync_faq_to_pinecone, load_cached_embeddings, embed_query,
+                            embed_queries, query_cache, build_lexical_index, lexical_faq_answer, FAQ_SOURCE)
+from faq_loader import resolve_faq_files
+from fast_classifier import FastClassifier
+from appointment_parser import FIELDS as APPOINTMENT_FIELDS, AppointmentParser, format_opening_hours
+from answer_cache import SemanticAnswerCache
+from conversation_memory import RollingSummaryMemory, count_tokens, new_summary_state
+from session_store import create_session_store
+import async_runtime
+from model_clients import CHAT_MODEL, get_chat_llm, get_async_openai_client
+from model_calls import CHAT_CALLS, OverloadedError
+from ingestion import batched
+import telemetry
+from telemetry import record_cache, record_tokens, span
+import asyncio
+import hashlib
 import json
-import openai
-import re
+import logging
+import queue
+import threading
+import time
 
 load_dotenv()  # Load API key from .env
 
-app = Flask(__name__)
+logger = logging.getLogger(__name__)
+
+# Chat API routes, registered on each app built by create_app()
+api = Blueprint("api", __name__)
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-#Store separate memory per user
-session_memory = {}
+# Work done by create_app() before the first request: "background" (default) syncs the FAQ and
+# creates the model clients in a background thread, "blocking" does so before returning, "off" skips it
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "background").lower()
+
+# Minimum confidence for the local classifier to answer without an LLM call
+FAST_PATH_THRESHOLD = float(os.getenv("FAST_PATH_THRESHOLD", "0.85"))
+
+# Batch processing (/chat/batch): messages per batched classification call, sessions processed in parallel
+CLASSIFY_BATCH_SIZE = int(os.getenv("CLASSIFY_BATCH_SIZE", "20"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+
+# Minimum confidence for a locally parsed appointment field to be used without an LLM call
+APPOINTMENT_PARSER_THRESHOLD = float(os.getenv("APPOINTMENT_PARSER_THRESHOLD", "0.8"))
+
+#Store separate memory per user (SESSION_STORE=sqlite shares sessions between processes and restarts)
+# In memory, idle and least recently used sessions are evicted (or spilled to SESSION_SPILL_PATH)
+session_store = create_session_store(
+    backend=os.getenv("SESSION_STORE", "memory"),
+    path=os.getenv("SESSION_DB_PATH", "sessions.db"),
+    max_sessions=int(os.getenv("SESSION_MAX", "10000")),
+    idle_ttl=float(os.getenv("SESSION_IDLE_TTL", "86400")),
+    spill_path=os.getenv("SESSION_SPILL_PATH") or None
+)
+# Seconds between background sweeps for idle sessions (started by create_app)
+SESSION_SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", "60"))
 
 #Define a function to get session history per user
 def get_session_history(session_name: str):
-    return session_memory[session_name].chat_memory.messages if session_name in session_memory else []
+    # Only the newest messages can reach the prompt, so the chain never reads the whole history
+    return session_store.history(session_name, limit=conversation_memory.max_messages)
 
 #RAG part to fetch relevant FAQ
-file_name = 'FAQ_library.txt'
+#FAQ_SOURCE can also be a directory of .txt files or a glob pattern (e.g. one file per branch)
+file_name = FAQ_SOURCE
 
-# Step 1: Load FAQ data
-faq_data = load_faq_data(file_name)  
-    
-# Step 2: Generate embeddings for FAQ data
-faq_embeddings = generate_embeddings(faq_data)
+# FAQ entries, loaded on first use by load_faq()
+faq_data = None
+_faq_lock = threading.Lock()
+
+# Local fast-path classifier; load_faq() adds the cached FAQ embeddings as faq_question prototypes
+fast_classifier = FastClassifier(embed_query=embed_query, threshold=FAST_PATH_THRESHOLD)
+
+# Local date/time/purpose extraction for appointment requests, checked against the opening hours
+appointment_parser = AppointmentParser(threshold=APPOINTMENT_PARSER_THRESHOLD)
+
+def load_faq():
+    """
+    Loads the FAQ for keyword search and the fast-path classifier, once per process.
 
-# Step 3: Upload FAQ data and embeddings to Pinecone
-upload_faq_to_pinecone(faq_data, faq_embeddings)
+    Only local files are read: the FAQ itself and the embeddings cached by the last sync
+    (see `sync_faq`), so the first request never waits for the embeddings API or Pinecone.
+    A failed or empty load is not cached, so the next call tries again.
+
+    Returns:
+        list: The FAQ Documents.
+
+    Raises:
+        RuntimeError: If the FAQ could not be loaded or has no entries.
+    """
+    global faq_data
+    if faq_data is None:
+        with _faq_lock:
+            if faq_data is None:
+                docs = load_faq_data(file_name)
+                if not docs:
+                    raise RuntimeError(f"FAQ could not be loaded from {file_name}")
+                # Index the FAQ for keyword search, fused with the vector results at query time
+                build_lexical_index(docs)
+                fast_classifier.set_prototypes(load_cached_embeddings(docs))
+                faq_data = docs
+    return faq_data
+
+def sync_faq():
+    """
+    Embeds and uploads new or changed FAQ entries, then refreshes the fast-path prototypes.
+
+    Raises:
+        RuntimeError: If the FAQ could not be loaded; nothing is synced or deleted then.
+    """
+    docs = load_faq()
+    counts = sync_faq_to_pinecone(docs)
+    fast_classifier.set_prototypes(load_cached_embeddings(docs))
+    return counts
+
+# Semantic cache of grounded FAQ answers, cleared whenever the FAQ file changes
+answer_cache = SemanticAnswerCache(
+    threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+    max_size=int(os.getenv("ANSWER_CACHE_SIZE", "256")),
+    source_path=resolve_faq_files(file_name)
+)
+
+# Summarizes turns that no longer fit in the prompt (run in the background after a reply)
+async def summarize_history(summary_prompt):
+    """Use OpenAI to update a session's rolling conversation summary."""
+    return (await CHAT_CALLS.acall(get_chat_llm().ainvoke, summary_prompt)).content
+
+# Prompt history: the last few turns verbatim, within a token budget, plus a rolling summary
+conversation_memory = RollingSummaryMemory(
+    summarize=summarize_history,
+    max_turns=int(os.getenv("MEMORY_MAX_TURNS", "6")),
+    max_tokens=int(os.getenv("MEMORY_MAX_TOKENS", "1500")),
+    summary_max_words=int(os.getenv("MEMORY_SUMMARY_WORDS", "150"))
+)
 
 # AI-powered sentiment analysis
-def analyze_sentiment(user_input):
+async def analyze_sentiment(user_input):
     """Use OpenAI to analyze sentiment dynamically."""
-    llm = ChatOpenAI(model="gpt-4o-mini", api_key=OPENAI_API_KEY)
+    llm = get_chat_llm()
     sentiment_prompt = f"Analyze the sentiment of this message and respond with either 'positive', 'neutral', or 'negative': {user_input}"
     
-    response = llm.invoke(sentiment_prompt).content.strip().lower()
+    # Identical messages in flight at the same time share one call
+    response = (await CHAT_CALLS.acall(llm.ainvoke, sentiment_prompt, key=sentiment_prompt)).content.strip().lower()
     return response  # Returns 'positive', 'neutral', or 'negative'
 
 # AI-powered intent detection
-def detect_intent(user_input):
+async def detect_intent(user_input):
     """Use OpenAI to classify user intent dynamically."""
-    llm = ChatOpenAI(model="gpt-4o-mini", api_key=OPENAI_API_KEY)
+    llm = get_chat_llm()
     intent_prompt = (
         "Determine the intent of the following message and respond with one of these categories only:\n"
         "- appointment\n"
@@ -63,19 +172,191 @@ def detect_intent(user_input):
         "Only return one of the categories without explanation."
     )
 
-    response = llm.invoke(intent_prompt).content.strip().lower()
+    response = (await CHAT_CALLS.acall(llm.ainvoke, intent_prompt, key=intent_prompt)).content.strip().lower()
     return response  # Returns 'appointment', 'escalation', or 'general inquiry'
 
+# Categories returned by the fused classifier, matching analyze_sentiment and detect_intent
+SENTIMENTS = ("positive", "neutral", "negative")
+INTENTS = ("appointment", "escalation", "faq_question", "general_inquiry")
+
+CLASSIFICATION_RULES = (
+    "- sentiment: one of 'positive', 'neutral' or 'negative'\n"
+    "- intent: one of 'appointment', 'escalation', 'faq_question' or 'general_inquiry'\n"
+    "- appointment: if the intent is 'appointment', the date, time and purpose mentioned in the message; "
+    "leave any field that is not mentioned as an empty string"
+)
+
+CLASSIFICATION_PROMPT = (
+    "Classify the user's message for a library support chatbot. Return only a JSON object in the format: "
+    "{\"sentiment\": \"\", \"intent\": \"\", \"appointment\": {\"date\": \"\", \"time\": \"\", \"purpose\": \"\"}}.\n"
+    + CLASSIFICATION_RULES
+)
+
+BATCH_CLASSIFICATION_PROMPT = (
+    "Classify each of the user's messages for a library support chatbot. The messages are given as a JSON list of "
+    "{\"id\": ..., \"message\": ...} objects, and each is classified on its own. Return only a JSON object in the format: "
+    "{\"results\": [{\"id\": 0, \"sentiment\": \"\", \"intent\": \"\", \"appointment\": {\"date\": \"\", \"time\": \"\", "
+    "\"purpose\": \"\"}}]} with one result per message.\n"
+    + CLASSIFICATION_RULES
+)
+
+def parse_classification(result):
+    """
+    Validates one classification object returned by the model.
+
+    Raises:
+        KeyError, TypeError, AttributeError or ValueError: If the object is incomplete or
+        uses unknown categories.
+    """
+    sentiment = str(result["sentiment"]).strip().lower()
+    intent = str(result["intent"]).strip().lower()
+    if sentiment not in SENTIMENTS or intent not in INTENTS:
+        raise ValueError(f"unexpected categories: {sentiment!r}, {intent!r}")
+
+    appointment = result.get("appointment") or {}
+    appointment = {key: str(appointment.get(key) or "") for key in ["date", "time", "purpose"]}
+    return {"sentiment": sentiment, "intent": intent, "appointment": appointment}
+
+# AI-powered sentiment, intent and appointment extraction in one call
+async def classify_message(user_input):
+    """
+    Classify sentiment and intent, and extract appointment details, with a single OpenAI call.
+
+    Obvious messages are answered by the local fast-path classifier without any LLM call.
+    Falls back to separate `analyze_sentiment` and `detect_intent` calls, run concurrently, if the
+    model does not return valid JSON with known categories.
+
+    Returns:
+        dict: {"sentiment": str, "intent": str or None, "appointment": dict or None}. The intent is
+        None if the fallback path found a negative sentiment, and the appointment is None when no
+        details were extracted (handle_appointment will then extract them itself).
+    """
+    # The rules are instant, but the FAQ-embedding fallback may call the embeddings API
+    local = await asyncio.to_thread(fast_classifier.classify, user_input)
+    record_cache("fast_path", fast_classifier.is_confident(local))
+    if fast_classifier.is_confident(local):
+        logger.info("Fast path classification", extra={"sentiment": local["sentiment"], "intent": local["intent"]})
+        return {"sentiment": local["sentiment"], "intent": local["intent"], "appointment": None}
+
+    client = get_async_openai_client()
+    response = await CHAT_CALLS.acall(
+        client.chat.completions.create,
+        key=("classify", user_input),  # Identical messages in flight share one call
+        model=CHAT_MODEL,
+        response_format={"type": "json_object"},  # Forces valid JSON output
+        messages=[
+            {"role": "system", "content": CLASSIFICATION_PROMPT},
+            {"role": "user", "content": user_input}
+        ]
+    )
+
+    try:
+        return parse_classification(json.loads(response.choices[0].message.content))
+
+    except (json.JSONDecodeError, KeyError, TypeError, AttributeError, ValueError) as e:
+        logger.warning("Invalid classification response, falling back to separate calls", extra={"error": str(e)})
+        # Run both calls concurrently; negative messages are escalated without an intent
+        intent_task = asyncio.create_task(detect_intent(user_input))
+        try:
+            sentiment = await analyze_sentiment(user_input)
+        except BaseException:
+            intent_task.cancel()
+            raise
+        if sentiment == "negative":
+            intent_task.cancel()
+            intent = None
+        else:
+            intent = await intent_task
+        return {"sentiment": sentiment, "intent": intent, "appointment": None}
+
+# Sentiment, intent and appointment extraction for many messages at once
+async def classify_messages(messages, concurrency=BATCH_CONCURRENCY):
+    """
+    Classify many messages with as few OpenAI calls as possible, e.g. for a batch of transcripts.
+
+    Obvious messages are answered by the fast-path classifier; the rest are sent in groups of
+    CLASSIFY_BATCH_SIZE, one call per group, with the groups classified concurrently. Messages
+    a group's response leaves out (or gets wrong) are classified one by one with `classify_message`,
+    at most `concurrency` at a time.
+
+    Args:
+        messages (list): User messages.
+        concurrency (int): Single-message fallback calls in flight at once.
+
+    Returns:
+        list: One classification per message, in order, as returned by `classify_message`, or
+        the exception raised while classifying that message.
+    """
+    results = [None] * len(messages)
+    local = await asyncio.to_thread(lambda: [fast_classifier.classify(message) for message in messages])
+    pending = []
+    for position, result in enumerate(local):
+        confident = fast_classifier.is_confident(result)
+        record_cache("fast_path", confident)
+        if confident:
+            results[position] = {"sentiment": result["sentiment"], "intent": result["intent"], "appointment": None}
+        else:
+            pending.append(position)
+
+    async def classify_group(positions):
+        client = get_async_openai_client()
+        try:
+            response = await CHAT_CALLS.acall(
+                client.chat.completions.create,
+                model=CHAT_MODEL,
+                response_format={"type": "json_object"},  # Forces valid JSON output
+                messages=[
+                    {"role": "system", "content": BATCH_CLASSIFICATION_PROMPT},
+                    {"role": "user", "content": json.dumps(
+                        [{"id": number, "message": messages[position]} for number, position in enumerate(positions)]
+                    )}
+                ]
+            )
+            entries = json.loads(response.choices[0].message.content)["results"]
+        except Exception as e:
+            logger.warning("Batch classification failed, classifying one by one", extra={"error": str(e)})
+            return
+        for entry in entries if isinstance(entries, list) else []:
+            try:
+                number = int(entry["id"])
+                if 0 <= number < len(positions):
+                    results[positions[number]] = parse_classification(entry)
+            except (KeyError, TypeError, AttributeError, ValueError):
+                continue
+
+    await asyncio.gather(*(classify_group(group) for group in batched(pending, CLASSIFY_BATCH_SIZE)))
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def classify_one(message):
+        async with semaphore:
+            return await classify_message(message)
+
+    # A failing message is reported on its own instead of failing the whole batch
+    missing = [position for position in pending if results[position] is None]
+    for position, result in zip(missing, await asyncio.gather(*(classify_one(messages[p]) for p in missing),
+                                                              return_exceptions=True)):
+        if isinstance(result, Exception):
+            logger.warning("Classification failed", extra={"error": str(result)})
+        results[position] = result
+    return results
+
 # Extract appointment details
-def extract_appointment_details(user_input):
-    """Extract appointment details like date, time, and purpose."""
-    client = openai.OpenAI(api_key=OPENAI_API_KEY)
+async def extract_appointment_details(user_input, fields=APPOINTMENT_FIELDS):
+    """Extract appointment details like date, time, and purpose (or only the given fields)."""
+    client = get_async_openai_client()
+    fields = tuple(fields)
+    json_format = "{" + ", ".join(f'\"{field}\": \"\"' for field in fields) + "}"
+    import openai  # Loaded with the client
+
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",  
+        response = await CHAT_CALLS.acall(
+            client.chat.completions.create,
+            key=("appointment", user_input, fields),
+            model=CHAT_MODEL,  
             response_format={"type": "json_object"},  # Forces valid JSON output
             messages=[
-                {"role": "system", "content": "Extract appointment details (date, time, and purpose) from user input. Return only a JSON object in the format: {\"date\": \"\", \"time\": \"\", \"purpose\": \"\"}."},
+                {"role": "system", "content": f"Extract appointment details ({', '.join(fields)}) from user input. Return only a JSON object in the format: {json_format}."},
                 {"role": "user", "content": user_input}
             ]
         )
@@ -84,53 +365,78 @@ def extract_appointment_details(user_input):
         return details
 
     except json.JSONDecodeError:
-        print("[Error] Invalid JSON response from OpenAI.")
+        logger.warning("Invalid JSON response from OpenAI")
         return {"error": "Invalid JSON response"}
 
     except openai.OpenAIError as e:
-        print(f"[Error] OpenAI API error: {str(e)}")
+        logger.error("OpenAI API error", extra={"error": str(e)})
         return {"error": "OpenAI API error"}
 
 # Enhanced Appointment handling with stricter validation
-def handle_appointment(session_name, user_input):
-    """Handle the appointment booking process with strict checks."""
+async def handle_appointment(session_name, user_input, details=None):
+    """Handle the appointment booking process with strict checks.
+
+    Date, time and purpose are first parsed locally. `details` can carry fields already
+    extracted by `classify_message`; otherwise the LLM is asked only for fields the parser
+    could not fill (including ones worded in ways it does not know, like "half past two") and
+    the session does not have yet. Relative dates are resolved and the
+    slot is checked against the opening hours before it is confirmed.
+    """
+
+    logger.info("Handling appointment", extra={"session": session_name})
 
-    print(f"[Mock] Handling appointment for {session_name}")
+    # Get the current appointment details from the session store (SQLite I/O stays off the event loop)
+    current_details = await asyncio.to_thread(session_store.get_appointment, session_name)
 
-    # Extract details from the user input
-    details = extract_appointment_details(user_input)
+    # Parse the details locally; confident fields win over unresolved ones from the classifier
+    parsed = appointment_parser.parse(user_input)
+    found = {key: value for key, value in (details or {}).items() if key in APPOINTMENT_FIELDS and value}
+    found.update({key: parsed[key] for key in APPOINTMENT_FIELDS if parsed[key]})
 
-    # Get the current appointment details from session memory
-    current_details = session_memory[session_name]["appointment"]
+    # Extract the remaining details from the user input unless the classifier already did
+    rejected = parsed["problem"][0] if parsed["problem"] else None
+    wanted = [key for key in APPOINTMENT_FIELDS
+              if key not in found and key != rejected and not current_details.get(key)]
+    if details is None:
+        record_cache("appointment_parser", not wanted)
+        if wanted:
+            extracted = await extract_appointment_details(user_input, wanted)
+            found.update({key: str(extracted[key]) for key in wanted if extracted.get(key)})
 
     # Merge new details with the current details, only updating missing fields
-    current_details.update({key: value for key, value in details.items() if value})
+    current_details.update(found)
+    if rejected:
+        current_details[rejected] = ''  # e.g. moved to a day the library is closed
 
     # Ensure all required keys are in the dictionary (initialize with empty strings if missing)
-    for key in ['date', 'time', 'purpose']:
+    for key in APPOINTMENT_FIELDS:
         current_details.setdefault(key, '')
 
-    # Update the session memory with the merged details
-    session_memory[session_name]["appointment"] = current_details
+    # Resolve relative dates and drop a date or time when the library is closed then
+    current_details, problem = appointment_parser.resolve(current_details)
+    problem = problem or parsed["problem"]
+
+    # Update the session store with the merged details
+    await asyncio.to_thread(session_store.set_appointment, session_name, current_details)
 
     # Check for missing details
-    missing_details = [key for key, value in current_details.items() if not value]
+    missing_details = [key for key in APPOINTMENT_FIELDS if not current_details[key]]
 
     # If any details are missing, prompt the user to provide those
     if missing_details:
-        augmented_input = f"[Assistant]: I need more details to confirm your appointment. Can you provide the {' and '.join(missing_details)}?"
+        note = f"{problem[1]} " if problem else ""
+        augmented_input = f"[Assistant]: {note}I need more details to confirm your appointment. Can you provide the {' and '.join(missing_details)}?"
     else:
          # If all details are provided, confirm the appointment
-        print(f"[Mock] Confirming appointment for {session_name}, details: {current_details}")
-        appointment_info = session_memory[session_name]["appointment"]
+        logger.info("Confirming appointment", extra={"session": session_name, "appointment": current_details})
+        appointment_info = current_details
         augmented_input = f"[Assistant]: Your appointment has been confirmed for {appointment_info['date']} at {appointment_info['time']} for {appointment_info['purpose']}."
     
     return augmented_input
 
 
-# Define a chat prompt template, initial prompt for the chatbot
-prompt = ChatPromptTemplate.from_messages([
-    ("system", 
+# Initial (system) prompt for the chatbot
+SYSTEM_PROMPT = (
      "You are a friendly, professional, and knowledgeable library assistant for NovelNest Library. Your main task is to provide users with accurate and clear information about library services, including but not limited to:\n"
      "- Library hours and location\n"
      "- Membership registration, accounts, and borrowing policies\n"
@@ -141,28 +447,35 @@ prompt = ChatPromptTemplate.from_messages([
      "Name: NovelNest\n"
      "Location: 123 Main Street, Charleston, South Carolina, 29401\n"
      "Hours of Operation:\n"
-     "  - Monday–Friday: 9:00 AM – 8:00 PM\n"
-     "  - Saturday: 10:00 AM – 6:00 PM\n"
-     "  - Sunday: Closed\n\n"
+     + format_opening_hours() + "\n\n"
      "Additionally, you can assist with the following actions:\n"
      "- **Appointment Booking**: Help users schedule study rooms, librarian consultations, event registrations, and book pickups.\n"
      "- **Escalation to a Librarian**: If a user has account issues, special requests, or serious complaints, escalate their request.\n"
      "- **Sentiment Analysis**: If a user seems frustrated or upset, offer extra support and escalate if needed.\n\n"
      "If the user asks for an appointment, confirm the type and acknowledge the booking.\n"
      "If the user expresses strong frustration or confusion, offer to escalate to a librarian.\n"
-     "If you're unsure about something, ask for clarification or suggest the user contact library staff directly."),
-    ("human", "{input}")
-])
+     "If you're unsure about something, ask for clarification or suggest the user contact library staff directly."
+)
 
 """
 Retrieve a list of all active sessions.
 
 Endpoint: GET /sessions
+The response carries an ETag, and a request with a matching If-None-Match gets 304 Not Modified.
 Response: JSON object with all active session names.
 """
-@app.route('/sessions', methods=['GET'])
+@api.route('/sessions', methods=['GET'])
 def get_sessions():
-    return jsonify({"sessions": list(session_memory.keys())})
+    sessions = session_store.sessions()
+    # Sessions are created and evicted by any client, so the tag covers the list itself
+    etag = hashlib.sha1("\n".join(sessions).encode("utf-8")).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    response = jsonify({"sessions": sessions})
+    response.set_etag(etag)
+    return response
 
 """
 Create a new user session.
@@ -171,18 +484,252 @@ Endpoint: POST /new_session
 Request Body: { "session_name": "user123" }
 Response: JSON message indicating success or if session already exists.
 """
-@app.route('/new_session', methods=['POST'])
+@api.route('/new_session', methods=['POST'])
 def new_session():
     session_name = request.json.get('session_name')
     if not session_name:
         return jsonify({"error": "Session name is required."}), 400
 
-    if session_name not in session_memory:
-        session_memory[session_name] = {"chat_memory": ConversationBufferMemory(return_messages=True), "appointment": {}}
+    if session_store.create(session_name):
         return jsonify({"message": f"Session '{session_name}' created successfully."})
     else:
         return jsonify({"message": f"Session '{session_name}' already exists."})
 
+async def prepare_turn(session_name, user_input, classification=None):
+    """
+    Runs classification, routing and retrieval for one chat turn.
+
+    `classification` can carry the result of `classify_messages` for a message classified
+    in a batch; the message is then not classified again.
+
+    Returns:
+        dict: {"input": augmented input for the conversation chain,
+               "cached_answer": a reusable FAQ answer or None,
+               "question": the original user input,
+               "question_embedding": embedding of an FAQ question (for caching) or None,
+               "cache_scope": None if the answer may be shared with other sessions, else the session,
+               "intent": the detected intent or None}
+    """
+    response_content = user_input + "\n"
+    question_embedding = None  # Set for FAQ questions so the answer can be cached
+    cache_scope = session_name
+    cached_answer = None
+    detected_intent = None
+    if faq_data is None:
+        await asyncio.to_thread(load_faq)  # First request of a process that was not warmed up
+
+    # AI-powered sentiment and intent detection (one call)
+    with span("classification", batched=classification is not None) as stage:
+        if classification is None:
+            classification = await classify_message(user_input)
+        stage.update(sentiment=classification["sentiment"], intent=classification["intent"])
+    sentiment = classification["sentiment"]
+    if sentiment == "negative":
+        logger.info("Escalating conversation due to negative sentiment", extra={"session": session_name})
+        response_content = response_content + "[Assistant]: I sense you're having trouble. I'll escalate this to a librarian for assistance."
+    else:
+        detected_intent = classification["intent"]
+        logger.info("Detected intent", extra={"session": session_name, "intent": detected_intent})
+        # Appointment handling
+        if detected_intent == "appointment":
+            response_content = response_content + await handle_appointment(session_name, user_input, classification["appointment"])
+
+        # Escalation handling
+        elif detected_intent == "escalation":
+            logger.info("Escalating issue", extra={"session": session_name})
+            response_content = response_content + "[Assistant]: I'll escalate this to a librarian for further assistance."
+            
+        # Query Pinecone (RAG part) to fetch relevant FAQ
+        elif detected_intent == "faq_question":
+            # Obvious keyword matches need no embedding call (and so bypass the answer cache)
+            faq_answer = lexical_faq_answer(user_input)
+            record_cache("lexical", faq_answer is not None)
+
+            if faq_answer is None:
+                # Reuse the answer to a near-identical question if one is cached
+                question_embedding = await asyncio.to_thread(embed_query, user_input)
+                cached_answer = answer_cache.lookup(question_embedding, detected_intent, scope=session_name)
+                record_cache("answer_cache", cached_answer is not None)
+
+                if cached_answer is None:
+                    # The reply is generated with the session's history and summary; only an answer
+                    # to the first message of a session depends on nothing but the FAQ
+                    if await asyncio.to_thread(session_store.last_seq, session_name) == 0:
+                        cache_scope = None
+                    faq_answer = await asyncio.to_thread(query_faq_pinecone, user_input)  # Call your RAG query function
+
+            if cached_answer is None:
+                # Append the RAG result to the user's input before passing it to the LLM
+                response_content = response_content+ f"[Assistant]: Here are the relevant FAQ entries I found:\n{faq_answer}"
+        elif detected_intent == "general_inquiry":
+            response_content = user_input
+        else:
+            response_content = response_content + "[Assistant]: I'm not sure how to assist with that. Could you clarify?"
+
+    logger.debug("Augmented input", extra={"session": session_name, "input": response_content})
+    return {
+        "input": response_content,
+        "cached_answer": cached_answer,
+        "question": user_input,
+        "question_embedding": question_embedding,
+        "cache_scope": cache_scope,
+        "intent": detected_intent,
+    }
+
+def record_cached_turn(session_name, turn):
+    """
+    Records a turn answered from the answer cache in the session history without calling the model.
+
+    Writes to the session store, so coroutines call it with `asyncio.to_thread`.
+    """
+    logger.info("Answer cache hit", extra={"session": session_name})
+    get_session_history(session_name).add_messages([
+        HumanMessage(content=turn["input"]),
+        AIMessage(content=turn["cached_answer"])
+    ])
+    schedule_summary(session_name)
+
+def bounded_history(inputs, config):
+    """Replaces the full session history with the summary and the recent turns that fit the budget."""
+    session_name = config["configurable"]["session_id"]
+    return conversation_memory.context(session_store.get_summary(session_name), inputs["history"])
+
+def schedule_summary(session_name):
+    """
+    Folds turns that left the prompt window into the session summary, off the request path.
+
+    Reads the session from the store, so coroutines call it with `asyncio.to_thread`. Only the
+    messages the summary does not cover yet are read.
+    """
+    state = session_store.get_summary(session_name) or new_summary_state()
+    conversation_memory.schedule_update(
+        session_name,
+        state,
+        session_store.get_messages(session_name, after=state["upto"]),
+        async_runtime.submit,
+        save=lambda state: session_store.set_summary(session_name, state),
+        offset=state["upto"]
+    )
+
+# Conversation chain, built once per chat model and shared by every session
+_conversation = None
+_conversation_lock = threading.Lock()
+
+def select_llm(prompt_value):
+    """Returns the chat model for the calling thread's event loop, if any (see `get_chat_llm`)."""
+    return get_chat_llm()
+
+async def aselect_llm(prompt_value):
+    """Returns the chat model for the running event loop; the chain then invokes it with the prompt."""
+    return get_chat_llm()
+
+def get_conversation():
+    """
+    Returns the conversation chain that reads and writes each session's chat history.
+
+    The chain is built once per process. Its model step looks up the chat model when it
+    runs, so /chat (on the shared event loop) and /chat/stream (on the request thread)
+    share one chain while each uses the client bound to its own loop.
+    """
+    global _conversation
+    if _conversation is None:
+        with _conversation_lock:
+            if _conversation is None:
+                # LangChain's runnables are only imported once a conversation is needed
+                from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+                from langchain_core.runnables import RunnableLambda, RunnablePassthrough
+                from langchain_core.runnables.history import RunnableWithMessageHistory
+
+                # Define a chat prompt template, initial prompt for the chatbot
+                prompt = ChatPromptTemplate.from_messages([
+                    ("system", SYSTEM_PROMPT),
+                    MessagesPlaceholder("history"),
+                    ("human", "{input}")
+                ])
+
+                # Create a conversation chain with the augmented input and the bounded history
+                llm = RunnableLambda(select_llm, afunc=aselect_llm, name="chat_llm")
+                chain = RunnablePassthrough.assign(history=RunnableLambda(bounded_history)) | prompt | llm
+
+                #Create a conversation object with the chain and the per-session history
+                _conversation = RunnableWithMessageHistory(
+                    chain,
+                    #Pass the session history
+                    get_session_history=get_session_history,
+                    input_messages_key="input",
+                    history_messages_key="history"
+                )
+    return _conversation
+
+def cache_turn_answer(turn, final_response):
+    """
+    Caches the generated answer to an FAQ question for similar future questions.
+
+    Answers generated with earlier turns in the prompt are only reused within their session.
+    """
+    if turn["question_embedding"] is not None:
+        answer_cache.store(turn["question_embedding"], turn["intent"], turn["question"], final_response,
+                           scope=turn["cache_scope"])
+
+def describe_error(e):
+    """Turns an exception raised while handling a chat turn into the message shown to the user."""
+    import openai  # Loaded with the client
+
+    if isinstance(e, (openai.RateLimitError, OverloadedError)):
+        # Only reached once retries and the request queue could not absorb the load
+        logger.warning("Model calls overloaded", extra={"error": str(e)})
+        return f"Sorry, the system is currently overloaded. Please try again later."
+    if isinstance(e, openai.OpenAIError):
+        return f"OpenAI API error: {str(e)}"
+    return f"Unexpected error: {str(e)}"
+
+async def respond(session_name, user_input, classification=None):
+    """Runs one chat turn through the async pipeline and returns the bot response."""
+    turn = await prepare_turn(session_name, user_input, classification)
+
+    if turn["cached_answer"] is not None:
+        await asyncio.to_thread(record_cached_turn, session_name, turn)
+        return turn["cached_answer"]
+
+    # Invoke the conversation with augmented input
+    with span("generation") as stage:
+        response = await CHAT_CALLS.acall(
+            get_conversation().ainvoke,
+            {"input": turn["input"]},
+            {"configurable": {"session_id": session_name}}
+        )
+
+        # Ensure the response is serializable and return
+        final_response = response.content if hasattr(response, 'content') else str(response)
+        usage = getattr(response, "usage_metadata", None) or {}
+        stage["completion_tokens"] = usage.get("output_tokens") or count_tokens(final_response)
+        stage["prompt_tokens"] = usage.get("input_tokens")
+        record_tokens(prompt=stage["prompt_tokens"], completion=stage["completion_tokens"])
+    cache_turn_answer(turn, final_response)
+    await asyncio.to_thread(schedule_summary, session_name)  # Reads the session from the store
+    return final_response
+
+async def chat_turn(session_name, user_input):
+    """
+    Runs a /chat turn, with its trace and logs, on the shared event loop.
+
+    Returns:
+        str: The bot response, or the error message shown to the user.
+    """
+    trace = telemetry.Trace("/chat", session=session_name)
+    with telemetry.activate(trace):
+        logger.debug("User message", extra={"session": session_name, "text": user_input})
+        outcome = "ok"
+        try:
+            final_response = await respond(session_name, user_input)
+        except Exception as e:
+            final_response = describe_error(e)
+            outcome = "error"
+
+        logger.debug("Bot response", extra={"session": session_name, "response": final_response})
+        logger.info("Chat turn", extra=trace.finish(outcome))
+    return final_response
+
 """
 Handle user chat interactions with session management.
 
@@ -190,115 +737,400 @@ Endpoint: POST /chat
 Request Body: { "session_name": "user123", "message": "How do I book an appointment?" }
 Response: JSON object with chatbot response.
 """
-@app.route('/chat', methods=['POST'])
+@api.route('/chat', methods=['POST'])
 def chat():
     session_name = request.json.get('session_name')
     user_input = request.json.get('message')
 
-    if not session_name or session_name not in session_memory:
+    if not session_name or not session_store.exists(session_name):
         return jsonify({'error': "Invalid session."}), 400
-    
-    print(f"[User: {session_name}] {user_input}")
-    response_content = user_input + "\n"
 
+    # Classification, retrieval and generation are awaited on the shared event loop
+    final_response = async_runtime.run(chat_turn(session_name, user_input))
+    return jsonify({'response': final_response})
+
+async def process_batch(items, emit, concurrency=BATCH_CONCURRENCY):
+    """
+    Runs many chat turns, batching the work that does not depend on the conversation.
+
+    All messages are classified with `classify_messages`, then the FAQ questions without an
+    obvious keyword match (the only turns that embed their message) are embedded together, so
+    their answer-cache lookups and retrieval hit the query cache. Each session's messages are
+    then answered in order, and up to `concurrency` sessions are processed at the same time.
+
+    Args:
+        items (list): {"session_name", "message"} dicts; every session must exist.
+        emit (callable): Called on the event loop with {"index", "session_name", "response",
+            "ok"} for each message as soon as it is answered (so not in input order); "ok" is
+            False, with the error as the response, if the message could not be classified or
+            answered.
+        concurrency (int): Sessions processed in parallel.
+    """
+    messages = [item["message"] for item in items]
+    if faq_data is None:
+        await asyncio.to_thread(load_faq)
+    classifications = await classify_messages(messages, concurrency)
+
+    to_embed = [message for message, classification in zip(messages, classifications)
+                if isinstance(classification, dict) and classification["sentiment"] != "negative"
+                and classification["intent"] == "faq_question" and lexical_faq_answer(message) is None]
+    if to_embed:
+        await asyncio.to_thread(embed_queries, to_embed)
+
+    sessions = {}
+    for position, item in enumerate(items):
+        sessions.setdefault(item["session_name"], []).append(position)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_session(session_name, positions):
+        async with semaphore:
+            for position in positions:
+                trace = telemetry.Trace("/chat/batch", session=session_name)
+                with telemetry.activate(trace):
+                    outcome = "ok"
+                    try:
+                        if isinstance(classifications[position], Exception):
+                            raise classifications[position]
+                        final_response = await respond(session_name, messages[position], classifications[position])
+                    except Exception as e:
+                        final_response = describe_error(e)
+                        outcome = "error"
+                    logger.info("Chat turn", extra=trace.finish(outcome))
+                emit({"index": position, "session_name": session_name, "response": final_response, "ok": outcome == "ok"})
+
+    await asyncio.gather(*(run_session(name, positions) for name, positions in sessions.items()))
+
+def read_batch(body):
+    """
+    Reads the messages of a batch request: a JSON list, {"messages": [...]} or JSON Lines.
+
+    Returns:
+        list: The message objects, in order (malformed lines become {"error": ...}).
+    """
     try:
-        # AI-powered sentiment detection
-        sentiment = analyze_sentiment(user_input)
-        if sentiment == "negative":
-            print(f"[Mock] Escalating conversation due to negative sentiment in session {session_name}")
-            response_content = response_content + "[Assistant]: I sense you're having trouble. I'll escalate this to a librarian for assistance."
+        data = json.loads(body)
+        if isinstance(data, list):
+            return data
+        if isinstance(data, dict) and isinstance(data.get("messages"), list):
+            return data["messages"]
+    except json.JSONDecodeError:
+        pass  # JSON Lines
+    items = []
+    for line in body.splitlines():
+        if line.strip():
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError:
+                items.append({"error": "Invalid JSON line."})
+    return items
+
+def validate_batch(items, create_sessions=False):
+    """
+    Splits the messages of a batch into the ones to process and the ones to reject.
+
+    Returns:
+        tuple: ([(position, item)], [{"index": position, "error": str}]).
+    """
+    accepted, rejected = [], []
+    for position, item in enumerate(items):
+        if not isinstance(item, dict) or "error" in item:
+            error = item.get("error") if isinstance(item, dict) else "Invalid message."
+        elif not item.get("session_name") or not isinstance(item.get("message"), str):
+            error = "session_name and message are required."
+        elif not session_store.exists(item["session_name"]) and not create_sessions:
+            error = "Invalid session."
         else:
-            # AI-powered intent detection
-            detected_intent = detect_intent(user_input)
-            print(f"Detected intent: {detected_intent}")
-            # Appointment handling
-            if detected_intent == "appointment":
-                response_content = response_content + handle_appointment(session_name, user_input)
-
-            # Escalation handling
-            elif detected_intent == "escalation":
-                print(f"[Mock] Escalating issue for {session_name}")
-                response_content = response_content + "[Assistant]: I'll escalate this to a librarian for further assistance."
-                
-            # Query Pinecone (RAG part) to fetch relevant FAQ
-            elif detected_intent == "faq_question":
-                faq_answer = query_faq_pinecone(user_input)  # Call your RAG query function
+            if create_sessions:
+                session_store.create(item["session_name"])
+            accepted.append((position, item))
+            continue
+        rejected.append({"index": position, "error": error})
+    return accepted, rejected
 
-                # Append the RAG result to the user's input before passing it to the LLM
-                response_content = response_content+ f"[Assistant]: Here is a relevant FAQ I found: {faq_answer}"
-            elif detected_intent == "general_inquiry":
-                response_content = user_input
+def batch_result(accepted, result):
+    """Maps a `process_batch` result back to the message's position (and id) in the request."""
+    position, item = accepted[result["index"]]
+    result["index"] = position
+    if "id" in item:
+        result["id"] = item["id"]
+    return result
+
+"""
+Process many messages at once, e.g. to replay support transcripts.
+
+Endpoint: POST /chat/batch
+Request Body: JSON Lines (or a JSON list) of { "session_name": "user123", "message": "..." }
+Request Params: create_sessions (int, optional) - 1 to create sessions that do not exist yet
+Response: application/x-ndjson, one line per message as soon as it is answered:
+{"index": <position in the request>, "session_name": ..., "response": ..., "ok": true} (plus the
+message's "id", if it had one), or
+{"index": ..., "error": ...} for messages that were rejected. Messages of the same session
+are answered in order; different sessions are processed in parallel.
+"""
+@api.route('/chat/batch', methods=['POST'])
+def chat_batch():
+    create_sessions = request.args.get('create_sessions', default=0, type=int)
+    accepted, rejected = validate_batch(read_batch(request.get_data(as_text=True)), create_sessions)
+    results = queue.Queue()
+
+    def emit(result):
+        results.put(batch_result(accepted, result))
+
+    def generate():
+        for result in rejected:
+            yield json.dumps(result) + "\n"
+        if not accepted:
+            return
+        future = async_runtime.submit(process_batch([item for _, item in accepted], emit))
+        future.add_done_callback(lambda _: results.put(None))
+        try:
+            while True:
+                result = results.get()
+                if result is None:
+                    break
+                yield json.dumps(result) + "\n"
+            if future.exception() is not None:
+                yield json.dumps({"error": describe_error(future.exception())}) + "\n"
+        finally:
+            future.cancel()  # Stop working on a batch whose client went away
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def sse_event(data, event=None):
+    """Formats one Server-Sent Event with a JSON payload."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+async def stream_turn(session_name, user_input):
+    """
+    Runs a /chat/stream turn, with its trace and logs, on the shared event loop.
+
+    Yields:
+        str: Server-Sent Events: the response tokens, then the `done` event.
+    """
+    trace = telemetry.Trace("/chat/stream", session=session_name)
+    with telemetry.activate(trace):
+        logger.debug("User message", extra={"session": session_name, "text": user_input})
+        outcome = "ok"
+        try:
+            turn = await prepare_turn(session_name, user_input)
+
+            if turn["cached_answer"] is not None:
+                await asyncio.to_thread(record_cached_turn, session_name, turn)
+                final_response = turn["cached_answer"]
+                yield sse_event({"token": final_response})
             else:
-                response_content = response_content + "[Assistant]: I'm not sure how to assist with that. Could you clarify?"
-        
-        
-        print(f"[Full response: {session_name}] {response_content}")
-
-        #Use OpenAI Model
-        llm = ChatOpenAI(model="gpt-4o-mini", api_key=OPENAI_API_KEY)
-        #Get memory for the specific user session
-        memory = session_memory[session_name]
-        # Create a conversation chain with the augmented input
-        chain = prompt | llm
-
-        #Create a conversation object with the chain and memory
-        conversation = RunnableWithMessageHistory(
-            chain,
-            memory=memory,
-            #Pass the session history
-            get_session_history=lambda session_id: session_memory[session_id]["chat_memory"].chat_memory 
-            if session_id in session_memory else []
-        )
+                # RunnableWithMessageHistory saves the turn once the stream is exhausted
+                chunks = []
+                with span("generation") as stage:
+                    async for chunk in CHAT_CALLS.astream(
+                        get_conversation().astream,
+                        {"input": turn["input"]},
+                        {"configurable": {"session_id": session_name}}
+                    ):
+                        token = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                        if token:
+                            if not chunks:
+                                stage["first_token_ms"] = round((time.perf_counter() - trace.started) * 1000, 3)
+                            chunks.append(token)
+                            yield sse_event({"token": token})
+                    final_response = "".join(chunks)
+                    stage["completion_tokens"] = count_tokens(final_response)
+                    record_tokens(completion=stage["completion_tokens"])
+                cache_turn_answer(turn, final_response)
+                await asyncio.to_thread(schedule_summary, session_name)
 
-        # Invoke the conversation with augmented input
-        response = conversation.invoke(
-            {"input": response_content},
-            {"configurable": {"session_id": session_name}}
-        )
+        except Exception as e:
+            final_response = describe_error(e)
+            outcome = "error"
+            yield sse_event({"token": final_response})
 
-        # Ensure the response is serializable and return
-        final_response = response.content if hasattr(response, 'content') else str(response)
+        logger.debug("Bot response", extra={"session": session_name, "response": final_response})
+        logger.info("Chat turn", extra=trace.finish(outcome))
+        # The sequence number lets clients append the turn to a cached history
+        seq, epoch = await asyncio.to_thread(
+            lambda: (session_store.last_seq(session_name), session_store.epoch(session_name))
+        )
+        yield sse_event({"response": final_response, "seq": seq, "epoch": epoch}, event="done")
 
-    except openai.RateLimitError as e:
-        final_response = f"Sorry, the system is currently overloaded. Please try again later."
-        print(f"OpenAI API error: {str(e)}")
+"""
+Stream chatbot responses as they are generated.
 
-    except openai.OpenAIError as e:
-        final_response = f"OpenAI API error: {str(e)}"
+Endpoint: POST /chat/stream
+Request Body: { "session_name": "user123", "message": "What are your hours?" }
+Response: text/event-stream of `data: {"token": "..."}` events, followed by one
+`event: done` event with `data: {"response": "<full response>", "seq": <latest message seq>,
+"epoch": <session epoch, see /chat_history>}`.
+The complete turn is written to the session history once generation finishes.
+"""
+@api.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    session_name = request.json.get('session_name')
+    user_input = request.json.get('message')
 
-    except Exception as e:
-        final_response = f"Unexpected error: {str(e)}"
+    if not session_name or not session_store.exists(session_name):
+        return jsonify({'error': "Invalid session."}), 400
 
-    # Ensure the response is serializable and return
-    print(f"[Bot: {session_name}] {final_response}")
-    return jsonify({'response': final_response})
+    # The turn runs on the shared event loop; this thread only relays its events
+    return Response(
+        async_runtime.iterate(stream_turn(session_name, user_input)),
+        mimetype="text/event-stream",
+        headers=SSE_HEADERS
+    )
 
 """
-Retrieve chat history for a session.
+Retrieve chat history for a session, optionally one page at a time.
 
 Endpoint: GET /chat_history
 Request Params: session_name (string)
-Response: JSON object with chat history.
+                limit (int, optional) - maximum number of messages to return
+                before (int, optional) - only messages older than this sequence number
+                after (int, optional) - only messages newer than this sequence number (e.g. the
+                                        last one the client has), for incremental updates
+                epoch (int, optional) - the "epoch" of the response the cursors came from
+Without paging parameters the whole history is returned. Messages are numbered from 1 in
+the order they were written; without `after` the page is taken from the end of the history.
+Sequence numbers only apply to one incarnation of a session, identified by its "epoch": if
+the session was deleted and created again since, `before`/`after` are ignored and the
+response has "reset": true, so the client drops its cached history.
+The response carries an ETag, and a request with a matching If-None-Match gets 304 Not Modified.
+Response: JSON object with chat history, plus "first_seq"/"last_seq" of the page (null when
+empty), "latest_seq" and "epoch" of the session, "has_older"/"has_newer" flags for further
+pages and the "reset" flag.
 """
-@app.route('/chat_history', methods=['GET'])
+@api.route('/chat_history', methods=['GET'])
 def chat_history():
     session_name = request.args.get('session_name')
     
-    if not session_name or session_name not in session_memory:
+    if not session_name or not session_store.exists(session_name):
         return jsonify({"error": "Invalid session."}), 400
 
-    # Retrieve chat history
-    history = session_memory[session_name]["chat_memory"].chat_memory.messages
-    chat_history = [
-            {
-                "role": "You" if msg.type == "human" else "Bot", 
-                "content": re.sub(r'\[Assistant\]:.*', '', msg.content, flags=re.DOTALL).strip() if msg.type == "human" else msg.content
-            } for msg in history
-        ]
+    limit = request.args.get('limit', type=int)
+    before = request.args.get('before', type=int)
+    after = request.args.get('after', type=int)
+    client_epoch = request.args.get('epoch', type=int)
+    if limit is not None:
+        limit = max(limit, 0)
+
+    # Cursors from an earlier session of the same name point at messages that no longer exist
+    epoch = session_store.epoch(session_name)
+    reset = client_epoch is not None and client_epoch != epoch
+    if reset:
+        before = after = None
+
+    # Nothing changed since the client's copy of this page: skip building it
+    latest_seq = session_store.last_seq(session_name)
+    etag = f"{epoch}-{latest_seq}-{limit}-{before}-{after}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
 
-    print(f"[History: {session_name}] {chat_history}")
+    # Retrieve chat history (display content is stored when each message is written)
+    page = session_store.get_display_messages(session_name, limit=limit, before=before, after=after)
+    chat_history = [{"role": msg["role"], "content": msg["content"]} for msg in page]
+
+    logger.debug("Chat history page", extra={"session": session_name, "messages": len(chat_history)})
     
-    return jsonify({"chat_history": chat_history})
+    response = jsonify({
+        "chat_history": chat_history,
+        "first_seq": page[0]["seq"] if page else None,
+        "last_seq": page[-1]["seq"] if page else None,
+        "latest_seq": latest_seq,
+        "epoch": epoch,
+        "has_older": bool(page) and page[0]["seq"] > 1,
+        "has_newer": bool(page) and page[-1]["seq"] < latest_seq,
+        "reset": reset
+    })
+    response.set_etag(etag)
+    return response
+
+"""
+Report live sessions, retained messages and cache usage.
+
+Endpoint: GET /stats
+Request Params: top (int, optional) - number of largest sessions to list, default 10
+Response: JSON object with session counts and approximate memory per session, plus cache statistics.
+"""
+@api.route('/stats', methods=['GET'])
+def stats():
+    top = request.args.get('top', default=10, type=int)
+    return jsonify({
+        "sessions": session_store.stats(top=top),
+        "answer_cache": answer_cache.stats(),
+        "query_cache": query_cache.stats()
+    })
+
+"""
+Export request, stage, token and cache metrics for Prometheus.
+
+Endpoint: GET /metrics
+Response: Prometheus text exposition format (histograms of request and per-stage latency,
+counters of tokens, cache lookups and requests). Values are per worker process.
+"""
+@api.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(telemetry.render_metrics(), mimetype="text/plain; version=0.0.4")
+
+async def _create_clients():
+    """Creates the async model clients and the conversation chain on the shared event loop."""
+    get_async_openai_client()
+    get_conversation()
+
+def warm_up():
+    """
+    Does the work the first requests would otherwise wait for: syncs the FAQ to the vector
+    index, loads it, and creates the model clients and the conversation chain.
+    """
+    started = time.perf_counter()
+    try:
+        sync_faq()
+        async_runtime.run(_create_clients())
+    except Exception as e:
+        logger.error("Warmup failed", extra={"error": str(e)})
+        return
+    logger.info("Warmup done", extra={"ms": round((time.perf_counter() - started) * 1000, 1)})
+
+def create_app(warmup=None):
+    """
+    Builds the Flask app.
+
+    Args:
+        warmup (str, optional): "background", "blocking" or "off"; see STARTUP_WARMUP (the default).
+
+    Returns:
+        Flask: The app, serving the chat API.
+    """
+    # Structured JSON logs, written off the request threads and sampled per request (LOG_SAMPLE_RATE)
+    telemetry.configure_logging()
+    app = Flask(__name__)
+    app.register_blueprint(api)
+    # Idle sessions are also evicted while no requests arrive
+    session_store.start_sweeper(SESSION_SWEEP_INTERVAL)
+
+    warmup = (warmup or STARTUP_WARMUP).lower()
+    if warmup == "blocking":
+        warm_up()
+    elif warmup == "background":
+        threading.Thread(target=warm_up, name="warmup", daemon=True).start()
+    return app
+
+_app = None
+
+def __getattr__(name):
+    """
+    Builds `server.app` on first access, without a warmup, for tests and tools that expect a
+    module-level app; the FAQ is then loaded by the first request.
+    """
+    global _app
+    if name == "app":
+        if _app is None:
+            _app = create_app(warmup="off")
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    # With the debug reloader, only the child process that serves requests warms up
+    create_app(warmup=None if os.environ.get("WERKZEUG_RUN_MAIN") else "off").run(debug=True)
@@ -0,0 +1,636 @@
+"""
+Session storage for the chatbot.
+
+Each session has an append-only list of chat messages, the appointment details collected
+so far and the rolling conversation summary. Two backends share one interface:
+
+- `InMemorySessionStore`: a locked dict, for development and tests; sessions are lost on restart.
+  Idle and least recently used sessions can be evicted, optionally spilling them to SQLite.
+- `SQLiteSessionStore`: a SQLite database in WAL mode, so sessions survive restarts and are
+  shared by every worker process on the host.
+
+Message history is read from the store when a request needs it rather than held for every
+session, and `SessionHistory` adapts a session to LangChain's chat history interface.
+Messages are numbered per session (`seq`, starting at 1) and their display form is computed
+once when they are written, so history pages can be served without reprocessing old messages.
+"""
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import message_to_dict, messages_from_dict
+
+from telemetry import span
+
+logger = logging.getLogger(__name__)
+
+# Rough memory held by an empty LangChain message object, measured with tracemalloc
+MESSAGE_OVERHEAD_BYTES = 768
+
+
+def message_bytes(message):
+    """Approximate memory retained by one chat message."""
+    return MESSAGE_OVERHEAD_BYTES + sys.getsizeof(message.content)
+
+
+def display_message(message):
+    """
+    Returns how a message is shown to the user: {"role": "You" or "Bot", "content": str}.
+    User messages lose the "[Assistant]: ..." context that was appended for the model.
+    """
+    if message.type == "human":
+        return {"role": "You", "content": re.sub(r'\[Assistant\]:.*', '', message.content, flags=re.DOTALL).strip()}
+    return {"role": "Bot", "content": message.content}
+
+
+class SessionStore:
+    """Interface shared by the session store backends."""
+
+    def sessions(self):
+        """Returns the names of all sessions, oldest first."""
+        raise NotImplementedError
+
+    def exists(self, session_name):
+        """True if the session has been created."""
+        raise NotImplementedError
+
+    def create(self, session_name, created_at=None):
+        """
+        Creates a session. Returns False if it already exists.
+
+        Args:
+            created_at (float, optional): Creation time (`time.time()`) to keep, e.g. when a
+                session moves between stores; defaults to now.
+        """
+        raise NotImplementedError
+
+    def created_at(self, session_name):
+        """Returns the time the session was created, as `time.time()`."""
+        raise NotImplementedError
+
+    def epoch(self, session_name):
+        """
+        Returns an identifier of this incarnation of the session (its creation time in
+        microseconds). It changes when a session is deleted, or dropped by eviction, and
+        created again, so clients can tell that cached pages and sequence numbers are stale.
+        """
+        return int(self.created_at(session_name) * 1_000_000)
+
+    def delete(self, session_name):
+        """Removes a session and its history. Returns False if it did not exist."""
+        raise NotImplementedError
+
+    def get_messages(self, session_name, limit=None, after=None):
+        """
+        Returns the session's chat messages, oldest first.
+
+        Args:
+            limit (int, optional): Maximum number of messages to return; without `after`, the
+                newest ones (e.g. the turns that can fit in a prompt).
+            after (int, optional): Only messages with a higher sequence number.
+        """
+        raise NotImplementedError
+
+    def append_messages(self, session_name, messages):
+        """Appends chat messages to the session history."""
+        raise NotImplementedError
+
+    def last_seq(self, session_name):
+        """Returns the sequence number of the session's latest message (0 if it has none)."""
+        raise NotImplementedError
+
+    def get_display_messages(self, session_name, limit=None, before=None, after=None):
+        """
+        Returns a page of the session's history in display form, oldest first.
+
+        Args:
+            limit (int, optional): Maximum number of messages to return.
+            before (int, optional): Only messages with a lower sequence number; the page ends just before it.
+            after (int, optional): Only messages with a higher sequence number; the page starts just after it.
+                Without `after` the page is taken from the end of the history.
+
+        Returns:
+            list: [{"seq": int, "role": str, "content": str}, ...]
+        """
+        raise NotImplementedError
+
+    def get_appointment(self, session_name):
+        """Returns the appointment details collected so far (date, time, purpose)."""
+        raise NotImplementedError
+
+    def set_appointment(self, session_name, details):
+        """Replaces the session's appointment details."""
+        raise NotImplementedError
+
+    def get_summary(self, session_name):
+        """Returns the session's rolling summary state, or None if it has none yet."""
+        raise NotImplementedError
+
+    def set_summary(self, session_name, state):
+        """Replaces the session's rolling summary state."""
+        raise NotImplementedError
+
+    def stats(self, top=10):
+        """
+        Returns session and memory accounting.
+
+        Args:
+            top (int): Number of largest sessions to list individually.
+
+        Returns:
+            dict: {"sessions": int, "messages": int, "bytes": int, "bytes_per_session": float,
+                   "largest": [{"session", "messages", "bytes"}, ...], ...backend counters}
+        """
+        raise NotImplementedError
+
+    def start_sweeper(self, interval):
+        """Starts evicting idle sessions in the background; backends without eviction do nothing."""
+
+    def history(self, session_name, limit=None):
+        """
+        Returns the session's history as a LangChain chat message history.
+
+        Args:
+            limit (int, optional): Number of newest messages the history reads; all by default.
+        """
+        return SessionHistory(self, session_name, limit)
+
+
+def summarize_sizes(sizes, top):
+    """Builds the `stats()` totals from {session: (messages, bytes)}."""
+    total_bytes = sum(size for _, size in sizes.values())
+    largest = sorted(sizes.items(), key=lambda item: item[1][1], reverse=True)[:top]
+    return {
+        "sessions": len(sizes),
+        "messages": sum(count for count, _ in sizes.values()),
+        "bytes": total_bytes,
+        "bytes_per_session": total_bytes / len(sizes) if sizes else 0.0,
+        "largest": [{"session": name, "messages": count, "bytes": size} for name, (count, size) in largest],
+    }
+
+
+class SessionHistory(BaseChatMessageHistory):
+    """Append-only LangChain chat history backed by a session store, read up to `limit` newest messages."""
+
+    def __init__(self, store, session_name, limit=None):
+        self.store = store
+        self.session_name = session_name
+        self.limit = limit
+
+    @property
+    def messages(self):
+        return self.store.get_messages(self.session_name, limit=self.limit)
+
+    def add_messages(self, messages):
+        messages = list(messages)
+        with span("memory_write", messages=len(messages)):
+            self.store.append_messages(self.session_name, messages)
+
+    def clear(self):
+        raise NotImplementedError("Session history is append-only.")
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    Keeps sessions in a dict guarded by a lock, with optional eviction.
+
+    Expired sessions are evicted before any lookup, so an idle session is never revived by
+    the request that finds it; `start_sweeper` also evicts them while no requests arrive.
+    Reads and writes of the spill store happen outside the memory lock (serialized by a
+    lock of their own), so requests for sessions in memory never wait on disk I/O.
+
+    Args:
+        max_sessions (int, optional): Sessions kept in memory; the least recently used are evicted beyond it.
+        idle_ttl (float, optional): Seconds without access after which a session is evicted.
+        spill (SessionStore, optional): Evicted sessions are moved here instead of being dropped,
+            and moved back into memory the next time they are used.
+    """
+
+    def __init__(self, max_sessions=None, idle_ttl=None, spill=None):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.spill = spill
+        self._sessions = OrderedDict()  # Least recently used first
+        self._spilling = {}  # Evicted sessions not written to the spill store yet
+        self._lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._sweeper = None
+        self.evicted = 0
+        self.restored = 0
+
+    @contextmanager
+    def _session(self, session_name):
+        """
+        Holds the memory lock with a session's record, marking it as used. Expired sessions
+        are evicted first; a spilled session is restored before the lock is taken.
+
+        Raises:
+            KeyError: If the session does not exist (or has expired without a spill store).
+        """
+        evicted = []
+        try:
+            while True:
+                with self._lock:
+                    evicted += self._evict()
+                    session = self._sessions.get(session_name)
+                    if session is None and session_name in self._spilling:
+                        # Used again before it was written out: take it back
+                        session = self._sessions[session_name] = self._spilling.pop(session_name)
+                    if session is not None:
+                        session["last_access"] = time.monotonic()
+                        self._sessions.move_to_end(session_name)
+                        evicted += self._evict()
+                        yield session
+                        return
+                if self.spill is None or not self._restore(session_name):
+                    raise KeyError(f"Unknown session: {session_name}")
+        finally:
+            self._write_spill(evicted)
+
+    def _new_record(self, messages=(), appointment=None, summary=None, created_at=None):
+        return {
+            "created_at": time.time() if created_at is None else created_at,
+            "messages": list(messages),
+            "appointment": dict(appointment or {}),
+            "summary": summary,
+            "display": [display_message(m) for m in messages],
+            "last_access": time.monotonic(),
+            "bytes": sum(message_bytes(m) for m in messages),
+        }
+
+    def _restore(self, session_name):
+        """Moves a spilled session back into memory. Returns False if the spill store does not have it."""
+        with self._spill_lock:
+            with self._lock:
+                if session_name in self._sessions or session_name in self._spilling:
+                    return True  # Restored by another thread in the meantime
+            if not self.spill.exists(session_name):
+                return False
+            session = self._new_record(
+                self.spill.get_messages(session_name),
+                self.spill.get_appointment(session_name),
+                self.spill.get_summary(session_name),
+                self.spill.created_at(session_name)
+            )
+            with self._lock:
+                self._sessions[session_name] = session
+                self.restored += 1
+            self.spill.delete(session_name)
+        return True
+
+    def _evict(self):
+        """
+        Evicts idle sessions and, past `max_sessions`, the least recently used ones. Called
+        with the memory lock held.
+
+        Returns:
+            list: (name, record) of sessions to pass to `_write_spill` once the lock is released.
+        """
+        now = time.monotonic()
+        evicted = []
+        while self._sessions:
+            name, session = next(iter(self._sessions.items()))
+            idle = self.idle_ttl is not None and now - session["last_access"] > self.idle_ttl
+            full = self.max_sessions is not None and len(self._sessions) > self.max_sessions
+            if not (idle or full):
+                break
+            del self._sessions[name]
+            if self.spill is not None:
+                self._spilling[name] = session
+                evicted.append((name, session))
+            self.evicted += 1
+        return evicted
+
+    def _write_spill(self, evicted):
+        """Writes evicted sessions to the spill store; called without the memory lock."""
+        for name, session in evicted:
+            with self._spill_lock:
+                with self._lock:
+                    if self._spilling.get(name) is not session:
+                        continue  # Taken back or deleted before it was written
+                    snapshot = (list(session["messages"]), dict(session["appointment"]), session["summary"])
+                self.spill.create(name, created_at=session["created_at"])
+                self.spill.append_messages(name, snapshot[0])
+                self.spill.set_appointment(name, snapshot[1])
+                if snapshot[2] is not None:
+                    self.spill.set_summary(name, snapshot[2])
+                with self._lock:
+                    written = self._spilling.get(name) is session
+                    if written:
+                        del self._spilling[name]
+                if not written:
+                    self.spill.delete(name)  # Taken back or deleted while it was being written
+
+    def evict_idle(self):
+        """Applies the eviction policy now, e.g. from a periodic task."""
+        with self._lock:
+            evicted = self._evict()
+        self._write_spill(evicted)
+
+    def start_sweeper(self, interval):
+        """Evicts idle sessions every `interval` seconds from a daemon thread (started once per store)."""
+        if self.idle_ttl is None or interval <= 0:
+            return
+        with self._lock:
+            if self._sweeper is not None:
+                return
+            self._sweeper = threading.Thread(target=self._sweep, args=(interval,), name="session-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def _sweep(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.evict_idle()
+            except Exception as e:
+                logger.error("Error evicting idle sessions", extra={"error": str(e)})
+
+    def sessions(self):
+        with self._lock:
+            evicted = self._evict()
+            names = list(self._sessions) + list(self._spilling)
+        self._write_spill(evicted)
+        if self.spill is not None:
+            known = set(names)
+            names += [name for name in self.spill.sessions() if name not in known]
+        return names
+
+    def exists(self, session_name):
+        with self._lock:
+            evicted = self._evict()
+            found = session_name in self._sessions or session_name in self._spilling
+        self._write_spill(evicted)
+        if found or self.spill is None:
+            return found
+        with self._spill_lock:
+            # Checked again: a restore moves a session to memory before deleting the spilled copy
+            with self._lock:
+                if session_name in self._sessions or session_name in self._spilling:
+                    return True
+            return self.spill.exists(session_name)
+
+    def create(self, session_name, created_at=None):
+        with self._spill_lock if self.spill is not None else nullcontext():
+            if self.spill is not None and self.spill.exists(session_name):
+                return False
+            with self._lock:
+                if session_name in self._sessions or session_name in self._spilling:
+                    return False
+                self._sessions[session_name] = self._new_record(created_at=created_at)
+                evicted = self._evict()
+        self._write_spill(evicted)
+        return True
+
+    def created_at(self, session_name):
+        with self._session(session_name) as session:
+            return session["created_at"]
+
+    def delete(self, session_name):
+        with self._lock:
+            deleted = self._sessions.pop(session_name, None) is not None
+            deleted = self._spilling.pop(session_name, None) is not None or deleted
+        if self.spill is not None:
+            with self._spill_lock:
+                deleted = self.spill.delete(session_name) or deleted
+        return deleted
+
+    def get_messages(self, session_name, limit=None, after=None):
+        with self._session(session_name) as session:
+            messages = session["messages"]
+            # Messages are never removed, so seq n is at index n - 1
+            start, end = max(after or 0, 0), len(messages)
+            if limit is not None and end - start > limit:
+                if after is not None:
+                    end = start + limit
+                else:
+                    start = end - limit
+            return messages[start:end]
+
+    def append_messages(self, session_name, messages):
+        with self._session(session_name) as session:
+            session["messages"].extend(messages)
+            session["display"].extend(display_message(m) for m in messages)
+            session["bytes"] += sum(message_bytes(m) for m in messages)
+
+    def last_seq(self, session_name):
+        with self._session(session_name) as session:
+            return len(session["messages"])
+
+    def get_display_messages(self, session_name, limit=None, before=None, after=None):
+        with self._session(session_name) as session:
+            display = session["display"]
+            # Messages are never removed, so seq n is at index n - 1
+            start = max(after or 0, 0)
+            end = len(display) if before is None else min(max(before - 1, 0), len(display))
+            if limit is not None and end - start > limit:
+                if after is not None:
+                    end = start + limit
+                else:
+                    start = end - limit
+            return [dict(display[i], seq=i + 1) for i in range(start, end)]
+
+    def get_appointment(self, session_name):
+        with self._session(session_name) as session:
+            return dict(session["appointment"])
+
+    def set_appointment(self, session_name, details):
+        with self._session(session_name) as session:
+            session["appointment"] = dict(details)
+
+    def get_summary(self, session_name):
+        with self._session(session_name) as session:
+            summary = session["summary"]
+            return dict(summary) if summary is not None else None
+
+    def set_summary(self, session_name, state):
+        with self._session(session_name) as session:
+            session["summary"] = dict(state)
+
+    def stats(self, top=10):
+        with self._lock:
+            evicted = self._evict()
+            sizes = {name: (len(s["messages"]), s["bytes"]) for name, s in self._sessions.items()}
+            result = summarize_sizes(sizes, top)
+            result.update({"evicted": self.evicted, "restored": self.restored})
+        self._write_spill(evicted)
+        if self.spill is not None:
+            spilled = self.spill.stats(top=0)
+            result["spilled"] = {key: spilled[key] for key in ("sessions", "messages", "bytes")}
+        return result
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Stores sessions in a SQLite database shared by every process on the host.
+
+    Args:
+        path (str): Database file; created with its tables on first use.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()  # One connection per thread
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connection() as db:
+            db.executescript(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " name TEXT PRIMARY KEY, created_at REAL NOT NULL,"
+                " appointment TEXT NOT NULL DEFAULT '{}', summary TEXT);"
+                "CREATE TABLE IF NOT EXISTS messages ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " session TEXT NOT NULL REFERENCES sessions(name), seq INTEGER NOT NULL,"
+                " type TEXT NOT NULL, data TEXT NOT NULL, role TEXT NOT NULL, display TEXT NOT NULL);"
+                "CREATE UNIQUE INDEX IF NOT EXISTS messages_session ON messages(session, seq);"
+            )
+
+    def _connection(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _row(self, session_name, column):
+        row = self._connection().execute(
+            f"SELECT {column} FROM sessions WHERE name = ?", (session_name,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(f"Unknown session: {session_name}")
+        return row[0]
+
+    def _update(self, session_name, column, value):
+        with self._connection() as db:
+            cursor = db.execute(f"UPDATE sessions SET {column} = ? WHERE name = ?", (value, session_name))
+        if cursor.rowcount == 0:
+            raise KeyError(f"Unknown session: {session_name}")
+
+    def sessions(self):
+        rows = self._connection().execute("SELECT name FROM sessions ORDER BY created_at, rowid").fetchall()
+        return [row[0] for row in rows]
+
+    def exists(self, session_name):
+        row = self._connection().execute("SELECT 1 FROM sessions WHERE name = ?", (session_name,)).fetchone()
+        return row is not None
+
+    def create(self, session_name, created_at=None):
+        with self._connection() as db:
+            cursor = db.execute(
+                "INSERT OR IGNORE INTO sessions (name, created_at) VALUES (?, ?)",
+                (session_name, time.time() if created_at is None else created_at)
+            )
+        return cursor.rowcount == 1
+
+    def created_at(self, session_name):
+        return self._row(session_name, "created_at")
+
+    def delete(self, session_name):
+        with self._connection() as db:
+            db.execute("DELETE FROM messages WHERE session = ?", (session_name,))
+            cursor = db.execute("DELETE FROM sessions WHERE name = ?", (session_name,))
+        return cursor.rowcount == 1
+
+    def get_messages(self, session_name, limit=None, after=None):
+        # Like display pages, limited reads without `after` are taken from the end of the history
+        order = "ASC" if after is not None or limit is None else "DESC"
+        rows = self._connection().execute(
+            f"SELECT type, data FROM messages WHERE session = ? AND seq > ? ORDER BY seq {order} LIMIT ?",
+            (session_name, after or 0, limit if limit is not None else -1)
+        ).fetchall()
+        if order == "DESC":
+            rows.reverse()
+        return messages_from_dict([{"type": type_, "data": json.loads(data)} for type_, data in rows])
+
+    def append_messages(self, session_name, messages):
+        if not self.exists(session_name):
+            raise KeyError(f"Unknown session: {session_name}")
+        db = self._connection()
+        with db:
+            # Take the write lock before reading the last seq so concurrent writers cannot reuse it
+            db.execute("BEGIN IMMEDIATE")
+            seq = self.last_seq(session_name)
+            rows = []
+            for message in messages:
+                seq += 1
+                serialized = message_to_dict(message)
+                display = display_message(message)
+                rows.append((session_name, seq, serialized["type"], json.dumps(serialized["data"]),
+                             display["role"], display["content"]))
+            db.executemany(
+                "INSERT INTO messages (session, seq, type, data, role, display) VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+
+    def last_seq(self, session_name):
+        row = self._connection().execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM messages WHERE session = ?", (session_name,)
+        ).fetchone()
+        return row[0]
+
+    def get_display_messages(self, session_name, limit=None, before=None, after=None):
+        conditions, params = ["session = ?"], [session_name]
+        if after is not None:
+            conditions.append("seq > ?")
+            params.append(after)
+        if before is not None:
+            conditions.append("seq < ?")
+            params.append(before)
+        # Pages without `after` are taken from the end of the history
+        order = "ASC" if after is not None else "DESC"
+        params.append(limit if limit is not None else -1)
+        rows = self._connection().execute(
+            f"SELECT seq, role, display FROM messages WHERE {' AND '.join(conditions)} ORDER BY seq {order} LIMIT ?",
+            params
+        ).fetchall()
+        page = [{"seq": seq, "role": role, "content": content} for seq, role, content in rows]
+        return page if after is not None else page[::-1]
+
+    def get_appointment(self, session_name):
+        return json.loads(self._row(session_name, "appointment"))
+
+    def set_appointment(self, session_name, details):
+        self._update(session_name, "appointment", json.dumps(details))
+
+    def get_summary(self, session_name):
+        summary = self._row(session_name, "summary")
+        return json.loads(summary) if summary else None
+
+    def set_summary(self, session_name, state):
+        self._update(session_name, "summary", json.dumps(state))
+
+    def stats(self, top=10):
+        """Reports the serialized size of each session's messages, as stored on disk."""
+        db = self._connection()
+        sizes = {name: (0, 0) for name in self.sessions()}
+        rows = db.execute("SELECT session, COUNT(*), SUM(LENGTH(data)) FROM messages GROUP BY session")
+        for name, count, size in rows:
+            sizes[name] = (count, size or 0)
+        return summarize_sizes(sizes, top)
+
+
+def create_session_store(backend="memory", path="sessions.db", max_sessions=None, idle_ttl=None, spill_path=None):
+    """
+    Creates the session store selected by configuration.
+
+    Args:
+        backend (str): "memory" or "sqlite".
+        path (str): Database file for the SQLite backend.
+        max_sessions (int, optional): In-memory backend only: sessions kept before LRU eviction.
+        idle_ttl (float, optional): In-memory backend only: seconds of inactivity before eviction.
+        spill_path (str, optional): In-memory backend only: SQLite file evicted sessions are moved to.
+    """
+    if backend == "sqlite":
+        return SQLiteSessionStore(path)
+    if backend == "memory":
+        spill = SQLiteSessionStore(spill_path) if spill_path else None
+        return InMemorySessionStore(max_sessions=max_sessions, idle_ttl=idle_ttl, spill=spill)
+    raise ValueError(f"Unknown session store backend: {backend}")
@@ -0,0 +1,355 @@
+"""
+Per-request tracing, Prometheus metrics and structured logging.
+
+Each chat request runs inside a `Trace`. Code along the pipeline opens spans for its
+stages (classification, embedding, vector query, generation, memory write) with
+`span(...)`; a span records its duration and attributes such as token counts or cache
+hits on the current trace and in the `chat_stage_seconds` histogram. The current trace is
+kept in a context variable, so spans opened on the event loop, in `asyncio.to_thread`
+workers and in tasks created by the request all attach to it.
+
+`render_metrics()` returns every metric in the Prometheus text format for `/metrics`.
+Histograms and counters are kept in-process (one set per worker process), with no
+dependency on a Prometheus client library.
+
+`configure_logging()` replaces prints with JSON log lines written by a background
+thread, so request threads never block on stdout. INFO and DEBUG lines of a request are
+kept or dropped together according to the trace's sampling decision (`LOG_SAMPLE_RATE`);
+warnings and errors are always written.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+from bisect import bisect_left
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+
+# Latency buckets in seconds, from cache hits to slow generations
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class Counter:
+    """A monotonically increasing count per label combination."""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(str(labels.get(name, "")) for name in self.labelnames), 0)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}_total{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge:
+    """A value that goes up and down per label combination, set directly or read from a callback at render time."""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # labels -> value or zero-argument callable
+        self._lock = threading.Lock()
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[tuple(str(labels.get(name, "")) for name in self.labelnames)] = value
+
+    def set_function(self, func, **labels):
+        """Reports `func()` as the value, e.g. the current depth of a queue."""
+        self.set(func, **labels)
+
+    def value(self, **labels):
+        value = self._values.get(tuple(str(labels.get(name, "")) for name in self.labelnames), 0)
+        return value() if callable(value) else value
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            value = value() if callable(value) else value
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram:
+    """Observations counted in cumulative buckets per label combination, with their sum and count."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values = {}  # labels -> [bucket counts, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0]
+            entry[0][position] += 1
+            entry[1] += value
+
+    def count(self, **labels):
+        entry = self._values.get(tuple(str(labels.get(name, "")) for name in self.labelnames))
+        return sum(entry[0]) if entry else 0
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}"
+
+
+REQUEST_SECONDS = Histogram("chat_request_seconds", "Time to handle one request, by route.", ["route"])
+STAGE_SECONDS = Histogram("chat_stage_seconds", "Time spent in each pipeline stage.", ["stage"])
+TOKENS = Counter("chat_tokens", "Tokens sent to and generated by the chat model.", ["kind"])
+CACHE_LOOKUPS = Counter("chat_cache_lookups", "Cache and fast-path lookups by result.", ["cache", "result"])
+REQUESTS = Counter("chat_requests", "Requests handled, by route and outcome.", ["route", "outcome"])
+
+METRICS = [REQUEST_SECONDS, STAGE_SECONDS, TOKENS, CACHE_LOOKUPS, REQUESTS]
+
+
+def register(metric):
+    """Adds a metric to the ones rendered on `/metrics` and returns it."""
+    METRICS.append(metric)
+    return metric
+
+
+def render_metrics():
+    """Returns every registered metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+def record_cache(cache, hit):
+    """Counts one lookup in `cache` and flags it on the current trace."""
+    CACHE_LOOKUPS.inc(cache=cache, result="hit" if hit else "miss")
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.attributes[f"{cache}_hit"] = bool(hit)
+
+
+def record_tokens(prompt=None, completion=None):
+    """Counts prompt and completion tokens and adds them to the current trace."""
+    trace = _current_trace.get()
+    for kind, count in (("prompt", prompt), ("completion", completion)):
+        if count:
+            TOKENS.inc(count, kind=kind)
+            if trace is not None:
+                key = f"{kind}_tokens"
+                trace.attributes[key] = trace.attributes.get(key, 0) + count
+
+
+class Span(dict):
+    """Attributes of one timed stage; set keys on it inside the `with` block."""
+
+    def __init__(self, name, attributes):
+        super().__init__(attributes)
+        self.name = name
+        self.duration = None
+
+
+class _SpanContext:
+    def __init__(self, name, attributes):
+        self.span = Span(name, attributes)
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        self.span.duration = time.perf_counter() - self._started
+        if exc_type is not None:
+            self.span["error"] = exc_type.__name__
+        STAGE_SECONDS.observe(self.span.duration, stage=self.span.name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(self.span)
+        return False
+
+
+def span(name, **attributes):
+    """
+    Times a pipeline stage.
+
+    Usage:
+        with span("vector_query", top_k=10) as s:
+            s["matches"] = len(results)
+    """
+    return _SpanContext(name, attributes)
+
+
+class Trace:
+    """
+    The spans and attributes of one request.
+
+    Args:
+        route (str): The endpoint, e.g. "/chat".
+        sample_rate (float): Probability that the request's INFO/DEBUG log lines are written.
+    """
+
+    def __init__(self, route, sample_rate=None, **attributes):
+        self.route = route
+        self.trace_id = f"{random.getrandbits(64):016x}"
+        self.attributes = dict(attributes)
+        self.spans = []
+        self.sampled = random.random() < (LOG_SAMPLE_RATE if sample_rate is None else sample_rate)
+        self.started = time.perf_counter()
+        self.duration = None
+        self._lock = threading.Lock()
+
+    def add(self, finished_span):
+        with self._lock:
+            self.spans.append(finished_span)
+
+    def finish(self, outcome="ok"):
+        """Records the request duration and outcome; returns a summary for logging."""
+        self.duration = time.perf_counter() - self.started
+        REQUEST_SECONDS.observe(self.duration, route=self.route)
+        REQUESTS.inc(route=self.route, outcome=outcome)
+        with self._lock:
+            spans = [{"stage": s.name, "ms": round(s.duration * 1000, 3), **s} for s in self.spans]
+        return {"trace_id": self.trace_id, "route": self.route, "outcome": outcome, "ms": round(self.duration * 1000, 3),
+                **self.attributes, "spans": spans}
+
+
+def current_trace():
+    """Returns the trace of the request being handled, or None."""
+    return _current_trace.get()
+
+
+class _Activation:
+    def __init__(self, trace):
+        self.trace = trace
+
+    def __enter__(self):
+        self._token = _current_trace.set(self.trace)
+        return self.trace
+
+    def __exit__(self, *exc):
+        _current_trace.reset(self._token)
+        return False
+
+
+def activate(trace):
+    """Makes `trace` current for the `with` block (in this thread or task)."""
+    return _Activation(trace)
+
+
+async def traced(trace, coro):
+    """Awaits `coro` with `trace` current, e.g. for coroutines handed to another thread's event loop."""
+    with activate(trace):
+        return await coro
+
+
+class SampledFilter(logging.Filter):
+    """Drops INFO/DEBUG records of requests whose trace was not sampled and tags the rest with the trace."""
+
+    def filter(self, record):
+        trace = _current_trace.get()
+        if trace is None:
+            return True
+        if record.levelno < logging.WARNING and not trace.sampled:
+            return False
+        record.__dict__.setdefault("trace_id", trace.trace_id)
+        record.__dict__.setdefault("route", trace.route)
+        return True
+
+
+_STANDARD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats records as one JSON object per line, with any `extra` fields as keys."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update({key: value for key, value in record.__dict__.items() if key not in _STANDARD_ATTRIBUTES})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+_listener = None
+
+
+def configure_logging(level=None, stream=None):
+    """
+    Sends log records through a queue to a background thread that writes JSON lines.
+
+    Safe to call more than once; only the first call installs the handlers.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JSONFormatter())
+    records = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(records)
+    queue_handler.addFilter(SampledFilter())  # Decided on the request thread, where the trace is current
+    queue_handler.prepare = lambda record: record  # Format in the background thread, not here
+
+    root = logging.getLogger()
+    root.addHandler(queue_handler)
+    root.setLevel(level or LOG_LEVEL)
+    _listener = logging.handlers.QueueListener(records, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)  # Flush queued records on shutdown
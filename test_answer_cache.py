@@ -0,0 +1,115 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+import server
+from answer_cache import SemanticAnswerCache
+
+
+class TestSemanticAnswerCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.faq_path = os.path.join(self.tmp.name, "faq.txt")
+        with open(self.faq_path, "w", encoding="utf-8") as f:
+            f.write("1. What are the hours?\nOpen 9-8.\n")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_similar_question_with_same_intent_hits(self):
+        """Near-identical questions reuse the answer; other intents and distant questions miss."""
+        cache = SemanticAnswerCache(threshold=0.95)
+        cache.store([1.0, 0.0], "faq_question", "What are your hours?", "We are open 9-8.")
+
+        self.assertEqual(cache.lookup([0.99, 0.05], "faq_question"), "We are open 9-8.")
+        self.assertIsNone(cache.lookup([0.99, 0.05], "general_inquiry"))
+        self.assertIsNone(cache.lookup([0.5, 0.5], "faq_question"))
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 2, "size": 1})
+
+    def test_size_bound_evicts_least_recently_used(self):
+        """The least recently used answer is dropped once the cache is full."""
+        cache = SemanticAnswerCache(threshold=0.99, max_size=2)
+        cache.store([1.0, 0.0, 0.0], "faq_question", "a", "A")
+        cache.store([0.0, 1.0, 0.0], "faq_question", "b", "B")
+        cache.lookup([1.0, 0.0, 0.0], "faq_question")  # "a" is now the most recently used
+        cache.store([0.0, 0.0, 1.0], "faq_question", "c", "C")
+
+        self.assertEqual(cache.lookup([1.0, 0.0, 0.0], "faq_question"), "A")
+        self.assertIsNone(cache.lookup([0.0, 1.0, 0.0], "faq_question"))
+
+    def test_scoped_answers_stay_in_their_scope(self):
+        """Answers stored with a scope are only reused for that scope; unscoped ones are shared."""
+        cache = SemanticAnswerCache(threshold=0.95)
+        cache.store([1.0, 0.0], "faq_question", "hours", "Open 9-8, as I said.", scope="alice")
+        cache.store([0.0, 1.0], "faq_question", "wifi", "Wi-Fi is free.")
+
+        self.assertIsNone(cache.lookup([1.0, 0.0], "faq_question", scope="bob"))
+        self.assertIsNone(cache.lookup([1.0, 0.0], "faq_question"))
+        self.assertEqual(cache.lookup([1.0, 0.0], "faq_question", scope="alice"), "Open 9-8, as I said.")
+        self.assertEqual(cache.lookup([0.0, 1.0], "faq_question", scope="bob"), "Wi-Fi is free.")
+
+    def test_faq_change_invalidates(self):
+        """Editing the FAQ file clears every cached answer."""
+        cache = SemanticAnswerCache(source_path=self.faq_path)
+        cache.store([1.0, 0.0], "faq_question", "hours", "Open 9-8.")
+        self.assertEqual(cache.lookup([1.0, 0.0], "faq_question"), "Open 9-8.")
+
+        with open(self.faq_path, "w", encoding="utf-8") as f:
+            f.write("1. What are the hours?\nOpen 10-6 from now on.\n")
+        self.assertIsNone(cache.lookup([1.0, 0.0], "faq_question"))
+
+
+class TestChatAnswerCache(unittest.TestCase):
+
+    def setUp(self):
+        """Stub out classification, embeddings and retrieval so /chat runs offline."""
+        self.client = server.app.test_client()
+        self.client.post('/new_session', json={"session_name": "cache_session"})
+        self.llm = FakeListChatModel(responses=["We are open 9 AM to 8 PM on weekdays."])
+        patches = [
+            mock.patch.object(server, "classify_message", return_value={
+                "sentiment": "neutral", "intent": "faq_question", "appointment": None}),
+            mock.patch.object(server, "lexical_faq_answer", return_value=None),
+            mock.patch.object(server, "embed_query", return_value=[1.0, 0.0]),
+            mock.patch.object(server, "query_faq_pinecone", return_value="Open 9-8 weekdays."),
+            mock.patch.object(server, "get_chat_llm", return_value=self.llm),
+            mock.patch.object(server, "answer_cache", SemanticAnswerCache()),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_repeated_question_skips_retrieval_and_generation(self):
+        """The second identical question is served from the cache and still recorded in history."""
+        first = self.client.post('/chat', json={"session_name": "cache_session", "message": "Library hours?"})
+        second = self.client.post('/chat', json={"session_name": "cache_session", "message": "library hours"})
+
+        self.assertEqual(first.json["response"], second.json["response"])
+        self.assertEqual(server.query_faq_pinecone.call_count, 1)
+        self.assertEqual(server.get_chat_llm.call_count, 1)
+
+        history = self.client.get('/chat_history?session_name=cache_session').json["chat_history"]
+        self.assertEqual([m["content"] for m in history[-2:]], ["library hours", first.json["response"]])
+
+    def test_answers_with_history_are_not_shared(self):
+        """An answer generated with a session's earlier turns is never served to another session."""
+        vectors = {"Hello": [0.0, 1.0]}
+        server.embed_query.side_effect = lambda text: vectors.get(text, [1.0, 0.0])
+        for session in ["cache_private", "cache_other"]:
+            self.client.post('/new_session', json={"session_name": session})
+
+        self.client.post('/chat', json={"session_name": "cache_private", "message": "Hello"})
+        self.client.post('/chat', json={"session_name": "cache_private", "message": "Library hours?"})
+        self.client.post('/chat', json={"session_name": "cache_other", "message": "library hours"})
+        self.assertEqual(server.get_chat_llm.call_count, 3)  # The other session generated its own answer
+
+        self.client.post('/chat', json={"session_name": "cache_private", "message": "library hours"})
+        self.assertEqual(server.get_chat_llm.call_count, 3)  # Still reused within the session
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,207 @@
+import datetime
+import threading
+import unittest
+from unittest import mock
+
+import async_runtime
+import server
+from appointment_parser import AppointmentParser, format_opening_hours
+
+# A Friday morning
+NOW = datetime.datetime(2026, 10, 16, 9, 30)
+
+
+class TestAppointmentParser(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = AppointmentParser(threshold=0.8, clock=lambda: NOW)
+
+    def test_complete_request_is_parsed_locally(self):
+        """Relative dates are resolved against the clock and every field is confident."""
+        result = self.parser.parse("tomorrow at 2 PM for a study room")
+        self.assertEqual((result["date"], result["time"], result["purpose"]),
+                         ("Saturday, October 17, 2026", "2:00 PM", "a study room"))
+        self.assertTrue(all(confidence >= 0.8 for confidence in result["confidence"].values()))
+        self.assertIsNone(result["problem"])
+
+    def test_date_formats(self):
+        """Weekdays, absolute dates and offsets resolve to the next matching day."""
+        cases = {
+            "next Tuesday": "Tuesday, October 20, 2026",
+            "on October 22": "Thursday, October 22, 2026",
+            "the 3rd of March": "Wednesday, March 3, 2027",  # Already passed this year
+            "10/28": "Wednesday, October 28, 2026",
+            "in 3 days": "Monday, October 19, 2026",
+            "in a week": "Friday, October 23, 2026",
+        }
+        for text, expected in cases.items():
+            with self.subTest(text=text):
+                self.assertEqual(self.parser.parse(text)["date"], expected)
+
+    def test_hours_without_am_pm_use_opening_hours(self):
+        """"at 3" can only mean 3 PM and "at 10" only 10 AM while the library is open."""
+        self.assertEqual(self.parser.parse("Monday at 3")["time"], "3:00 PM")
+        self.assertEqual(self.parser.parse("Monday at 10")["time"], "10:00 AM")
+        self.assertEqual(self.parser.parse("Monday at 6 in the evening")["time"], "6:00 PM")
+
+    def test_vague_fields_have_low_confidence(self):
+        """Vague cues are reported with low confidence; missing ones with none."""
+        result = self.parser.parse("Can I book something next week in the afternoon?")
+        self.assertEqual((result["date"], result["time"]), ("", ""))
+        self.assertGreater(result["confidence"]["date"], 0)
+        self.assertLess(result["confidence"]["date"], 0.8)
+        self.assertEqual(self.parser.parse("for my history essay")["confidence"]["date"], 0.0)
+
+    def test_purpose_combines_service_and_reason(self):
+        """A booked service and the reason for it are kept together; date and time are left out."""
+        result = self.parser.parse("Book a study room tomorrow at 3 for a group project")
+        self.assertEqual(result["purpose"], "a study room for a group project")
+        result = self.parser.parse("I'd like to book an appointment for 2 PM on Monday to discuss my membership.")
+        self.assertEqual(result["purpose"], "discuss my membership")
+
+    def test_purpose_leaves_out_dates_and_dangling_connectors(self):
+        """Dates end the booked object, and "for" before a date is not kept in the purpose."""
+        cases = {
+            "book a room for Tuesday at 3 for my book club": "a room for my book club",
+            "schedule a tour for may 5": "a tour",
+            "reserve a study room for the 5th of May": "a study room",
+            "book a study room for 10/28": "a study room",
+        }
+        for text, expected in cases.items():
+            with self.subTest(text=text):
+                self.assertEqual(self.parser.parse(text)["purpose"], expected)
+
+    def test_time_ranges_start_at_their_first_time(self):
+        """A range is booked at its start, not at the only time that has AM/PM."""
+        cases = {
+            "book a room tomorrow from 2 to 4pm": "2:00 PM",
+            "book a room tomorrow 2-4 PM": "2:00 PM",
+            "Monday between 11 and 1pm": "11:00 AM",
+        }
+        for text, expected in cases.items():
+            with self.subTest(text=text):
+                result = self.parser.parse(text)
+                self.assertEqual(result["time"], expected)
+                self.assertEqual(result["purpose"], "a room" if "room" in text else "")
+
+    def test_time_phrases_are_not_purposes(self):
+        """"for two o'clock" is when the appointment is, not what it is for."""
+        result = self.parser.parse("book a room for two o'clock tomorrow")
+        self.assertEqual((result["date"], result["time"], result["purpose"]),
+                         ("Saturday, October 17, 2026", "2:00 PM", "a room"))
+        self.assertEqual(self.parser.parse("book a room for the afternoon on Monday")["purpose"], "a room")
+
+    def test_next_weekday_is_in_the_following_week(self):
+        """"next Monday" said on a Sunday is eight days away, not tomorrow (weeks start on Sunday)."""
+        sunday = datetime.datetime(2026, 10, 18, 9, 30)
+        self.assertEqual(self.parser.parse("next Monday", now=sunday)["date"], "Monday, October 26, 2026")
+        self.assertEqual(self.parser.parse("next Tuesday")["date"], "Tuesday, October 20, 2026")
+        self.assertEqual(self.parser.parse("next Saturday")["date"], "Saturday, October 24, 2026")
+        # Skipping a nearer Saturday is less certain than naming the only candidate
+        self.assertLess(self.parser.parse("next Saturday")["confidence"]["date"],
+                        self.parser.parse("next Tuesday")["confidence"]["date"])
+
+    def test_closed_days_and_hours_are_rejected(self):
+        """Slots outside the opening hours or in the past are dropped with an explanation."""
+        sunday = self.parser.parse("Sunday at 2pm for a study room")
+        self.assertEqual((sunday["date"], sunday["time"]), ("", "2:00 PM"))
+        self.assertEqual(sunday["problem"], ("date", "The library is closed on Sundays."))
+
+        saturday_evening = self.parser.parse("tomorrow at 7 PM")
+        self.assertEqual(saturday_evening["time"], "")
+        self.assertEqual(saturday_evening["problem"][0], "time")
+
+        self.assertEqual(self.parser.parse("today at 9:00 AM")["problem"], ("time", "That time has already passed today."))
+
+    def test_resolve_normalizes_llm_details(self):
+        """Relative values from the LLM are resolved before they are stored and confirmed."""
+        details, problem = self.parser.resolve({"date": "tomorrow", "time": "2 PM", "purpose": "a study room"})
+        self.assertEqual(details, {"date": "Saturday, October 17, 2026", "time": "2:00 PM", "purpose": "a study room"})
+        self.assertIsNone(problem)
+        details, problem = self.parser.resolve({"date": "sometime soon", "time": "", "purpose": ""})
+        self.assertEqual(details["date"], "sometime soon")
+
+    def test_opening_hours_match_the_system_prompt(self):
+        """The hours listed to the model are the ones bookings are checked against."""
+        self.assertEqual(format_opening_hours(), "  - Monday–Friday: 9:00 AM – 8:00 PM\n"
+                                                 "  - Saturday: 10:00 AM – 6:00 PM\n"
+                                                 "  - Sunday: Closed")
+
+
+class TestHandleAppointment(unittest.TestCase):
+
+    def setUp(self):
+        """Fix the clock and give each test a fresh session."""
+        self.session = f"appointment_{self._testMethodName}"
+        server.session_store.create(self.session)
+        patches = [
+            mock.patch.object(server, "appointment_parser", AppointmentParser(threshold=0.8, clock=lambda: NOW)),
+            mock.patch.object(server, "extract_appointment_details"),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_parsed_request_skips_the_llm(self):
+        """A fully parsed request is confirmed without an extraction call."""
+        reply = async_runtime.run(server.handle_appointment(self.session, "Book a study room on Monday at 3 PM"))
+        server.extract_appointment_details.assert_not_called()
+        self.assertIn("confirmed for Monday, October 19, 2026 at 3:00 PM for a study room", reply)
+
+    def test_session_store_is_used_off_the_event_loop(self):
+        """Reading and saving the appointment never blocks the shared event loop."""
+        threads = []
+        store = server.session_store
+
+        def record(method):
+            def call(*args):
+                threads.append(threading.current_thread())
+                return method(*args)
+            return call
+
+        with mock.patch.object(store, "get_appointment", side_effect=record(store.get_appointment)), \
+             mock.patch.object(store, "set_appointment", side_effect=record(store.set_appointment)):
+            async_runtime.run(server.handle_appointment(self.session, "Book a study room on Monday at 3 PM"))
+
+        async def current_thread():
+            return threading.current_thread()
+
+        loop_thread = async_runtime.run(current_thread())
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(loop_thread, threads)
+
+    def test_llm_is_asked_for_every_unfilled_field(self):
+        """Every field the parser could not fill goes to the LLM; what it cannot find is asked of the user."""
+        server.extract_appointment_details.return_value = {"date": "Tuesday"}
+        reply = async_runtime.run(server.handle_appointment(self.session, "Book a study room early next week"))
+        server.extract_appointment_details.assert_called_once_with("Book a study room early next week", ["date", "time"])
+        self.assertEqual(server.session_store.get_appointment(self.session)["date"], "Tuesday, October 20, 2026")
+        self.assertIn("Can you provide the time?", reply)
+
+    def test_fields_in_unknown_words_go_to_the_llm(self):
+        """A field worded in a way the parser does not know is extracted, even when others were parsed."""
+        cases = [
+            ("reserve a study room on the twenty-second at 3pm", {"date": "October 22"}, ["date"]),
+            ("book a study room tomorrow at half past two", {"time": "2:30 PM"}, ["time"]),
+        ]
+        for i, (message, extracted, wanted) in enumerate(cases):
+            with self.subTest(message=message):
+                session = f"{self.session}_{i}"
+                server.session_store.create(session)
+                server.extract_appointment_details.reset_mock()
+                server.extract_appointment_details.return_value = extracted
+                reply = async_runtime.run(server.handle_appointment(session, message))
+                server.extract_appointment_details.assert_called_once_with(message, wanted)
+                self.assertIn("Your appointment has been confirmed", reply)
+
+    def test_closed_day_is_asked_again(self):
+        """A booking on a closed day replaces an earlier date and explains why."""
+        server.session_store.set_appointment(self.session, {"date": "Monday, October 19, 2026", "time": "", "purpose": ""})
+        reply = async_runtime.run(server.handle_appointment(self.session, "Actually make it Sunday at 2 PM to study"))
+        server.extract_appointment_details.assert_not_called()
+        self.assertIn("The library is closed on Sundays.", reply)
+        self.assertIn("Can you provide the date?", reply)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+import asyncio
+import json
+import threading
+import time
+import unittest
+from unittest import mock
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+import async_runtime
+import server
+from answer_cache import SemanticAnswerCache
+from asgi import ChatASGIApp
+from test_chat_stream import parse_events
+
+
+async def request(app, method, path, payload=None, query=b"", content_type=b"application/json", disconnect=None):
+    """Sends one HTTP request through an ASGI app; returns (status, headers, body)."""
+    body = json.dumps(payload).encode() if payload is not None else b""
+    incoming = [{"type": "http.request", "body": body, "more_body": False}]
+    disconnect = disconnect or asyncio.Event()
+    sent = []
+
+    async def receive():
+        if incoming:
+            return incoming.pop(0)
+        await disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "query_string": query,
+             "headers": [(b"content-type", content_type)]}
+    await app(scope, receive, send)
+    return sent[0]["status"], dict(sent[0]["headers"]), b"".join(message.get("body", b"") for message in sent[1:])
+
+
+async def current_thread():
+    return threading.current_thread()
+
+
+class TestASGI(unittest.TestCase):
+
+    def setUp(self):
+        """Stub out classification and the model so chat turns run offline."""
+        self.app = ChatASGIApp(server.app)
+        server.session_store.create("asgi_session")
+        patches = [
+            mock.patch.object(server, "classify_message", return_value={
+                "sentiment": "neutral", "intent": "general_inquiry", "appointment": None}),
+            mock.patch.object(server, "get_chat_llm", return_value=FakeListChatModel(responses=["Hello there!"])),
+            mock.patch.object(server, "answer_cache", SemanticAnswerCache()),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_chat(self):
+        status, _, body = asyncio.run(request(self.app, "POST", "/chat", {"session_name": "asgi_session", "message": "Hi"}))
+        self.assertEqual((status, json.loads(body)), (200, {"response": "Hello there!"}))
+        status, _, _ = asyncio.run(request(self.app, "POST", "/chat", {"session_name": "missing", "message": "Hi"}))
+        self.assertEqual(status, 400)
+
+    def test_chat_stream(self):
+        """Tokens are streamed as events, and the done event carries the saved turn's seq and epoch."""
+        status, headers, body = asyncio.run(
+            request(self.app, "POST", "/chat/stream", {"session_name": "asgi_session", "message": "Hi"}))
+        self.assertEqual(status, 200)
+        self.assertTrue(headers[b"content-type"].startswith(b"text/event-stream"))
+        events = parse_events(body.decode())
+        self.assertEqual("".join(data["token"] for event, data in events if event == "message"), "Hello there!")
+        self.assertEqual(events[-1], ("done", {"response": "Hello there!",
+                                               "seq": server.session_store.last_seq("asgi_session"),
+                                               "epoch": server.session_store.epoch("asgi_session")}))
+
+    def test_other_routes_are_served_by_flask(self):
+        """Routes without a native handler, and requests Flask must reject, go through the WSGI app."""
+        status, _, body = asyncio.run(request(self.app, "GET", "/chat_history", query=b"session_name=asgi_session"))
+        self.assertEqual(status, 200)
+        self.assertIn("chat_history", json.loads(body))
+        status, _, _ = asyncio.run(request(self.app, "POST", "/chat", {"message": "Hi"}, content_type=b"text/plain"))
+        self.assertEqual(status, 415)
+
+    def test_concurrent_turns_hold_no_threads(self):
+        """Many turns wait on their model calls at once without a thread each."""
+        in_flight, peak, threads = [0], {"turns": 0, "threads": 0}, set()
+
+        async def slow_respond(session_name, user_input):
+            threads.add(threading.current_thread())
+            in_flight[0] += 1
+            peak["turns"] = max(peak["turns"], in_flight[0])
+            peak["threads"] = max(peak["threads"], threading.active_count())
+            await asyncio.sleep(0.3)
+            in_flight[0] -= 1
+            return "Hello there!"
+
+        async def main():
+            return await asyncio.gather(*(
+                request(self.app, "POST", "/chat", {"session_name": "asgi_session", "message": "Hi"}) for _ in range(100)
+            ))
+
+        started = time.perf_counter()
+        with mock.patch.object(server, "respond", slow_respond):
+            responses = asyncio.run(main())
+        self.assertTrue(all(status == 200 for status, _, _ in responses))
+        self.assertEqual(threads, {async_runtime.run(current_thread())})
+        self.assertEqual(peak["turns"], 100)
+        self.assertLess(peak["threads"], 100)
+        self.assertLess(time.perf_counter() - started, 5)
+
+    def test_disconnect_stops_the_stream(self):
+        """A client that goes away mid-stream cancels the turn on the shared loop."""
+        cancelled = threading.Event()
+
+        async def endless(session_name, user_input):
+            try:
+                while True:
+                    yield server.sse_event({"token": "."})
+                    await asyncio.sleep(0.01)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        async def main():
+            disconnect = asyncio.Event()
+            asyncio.get_running_loop().call_later(0.1, disconnect.set)
+            return await request(self.app, "POST", "/chat/stream", {"session_name": "asgi_session", "message": "Hi"},
+                                 disconnect=disconnect)
+
+        with mock.patch.object(server, "stream_turn", endless):
+            status, _, body = asyncio.run(main())
+        self.assertEqual(status, 200)
+        self.assertTrue(body)
+        self.assertTrue(cancelled.wait(1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import json
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+import async_runtime
+import server
+from answer_cache import SemanticAnswerCache
+
+
+def completion(content):
+    """An object shaped like an OpenAI chat completion with the given message content."""
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class BatchClassifier:
+    """Async OpenAI client stand-in that classifies every message of a batch as a general inquiry."""
+
+    def __init__(self, skip=(), faq=()):
+        self.calls = []
+        self.skip = set(skip)
+        self.faq = set(faq)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, messages, **kwargs):
+        self.calls.append(messages)
+        if messages[0]["content"] == server.CLASSIFICATION_PROMPT:
+            return completion(json.dumps({"sentiment": "neutral", "intent": "faq_question", "appointment": {}}))
+        items = json.loads(messages[1]["content"])
+        return completion(json.dumps({"results": [
+            {"id": item["id"], "sentiment": "neutral",
+             "intent": "faq_question" if item["message"] in self.faq else "general_inquiry",
+             "appointment": {"date": "", "time": "", "purpose": ""}}
+            for item in items if item["message"] not in self.skip
+        ]}))
+
+
+class TestChatBatch(unittest.TestCase):
+
+    def setUp(self):
+        """Run the batch pipeline offline with a batch-aware classifier and a fake model."""
+        self.client = server.app.test_client()
+        self.openai = BatchClassifier()
+        patches = [
+            mock.patch.object(server, "get_async_openai_client", side_effect=lambda: self.openai),
+            mock.patch.object(server, "get_chat_llm", return_value=FakeListChatModel(responses=["Noted."])),
+            mock.patch.object(server, "embed_queries"),
+            mock.patch.object(server, "embed_query", return_value=None),
+            mock.patch.object(server, "query_faq_pinecone", return_value="Open 9 to 8."),
+            mock.patch.object(server, "lexical_faq_answer", side_effect=lambda message: "Fees are listed online."
+                              if "fee" in message else None),
+            mock.patch.object(server, "answer_cache", SemanticAnswerCache()),
+            mock.patch.object(server.fast_classifier, "is_confident", return_value=False),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def post(self, items, **params):
+        body = "\n".join(json.dumps(item) for item in items)
+        response = self.client.post('/chat/batch', data=body, query_string=params)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    def test_messages_are_classified_in_one_call(self):
+        """A batch of general inquiries is classified with a single model call and never embedded."""
+        items = [{"session_name": f"batch_one_call_{n % 3}", "message": f"Question number {n}"} for n in range(9)]
+        results = self.post(items, create_sessions=1)
+        self.assertEqual(sorted(result["index"] for result in results), list(range(9)))
+        self.assertTrue(all(result["ok"] and result["response"] == "Noted." for result in results))
+        self.assertEqual(len(self.openai.calls), 1)
+        server.embed_queries.assert_not_called()
+
+    def test_only_faq_questions_without_keyword_match_are_embedded(self):
+        """Classification runs first; FAQ questions the keyword index cannot answer are embedded together."""
+        self.openai.faq = {"When do you open?", "What is the late fee?", "Can I print here?"}
+        items = [{"session_name": "batch_embed", "message": message}
+                 for message in ["Hello", "When do you open?", "What is the late fee?", "Can I print here?"]]
+        results = self.post(items, create_sessions=1)
+        self.assertTrue(all(result["ok"] for result in results))
+        server.embed_queries.assert_called_once_with(["When do you open?", "Can I print here?"])
+
+    def test_session_order_is_preserved(self):
+        """Each session's messages are answered, and stored, in the order they were sent."""
+        items = [{"session_name": f"batch_order_{n % 2}", "message": f"Message {n}", "id": f"m{n}"} for n in range(6)]
+        results = self.post(items, create_sessions=1)
+        for session in ["batch_order_0", "batch_order_1"]:
+            indices = [result["index"] for result in results if result["session_name"] == session]
+            self.assertEqual(indices, sorted(indices))
+            history = [message.content for message in server.session_store.get_messages(session)
+                       if message.type == "human"]
+            self.assertEqual(history, [item["message"] for item in items if item["session_name"] == session])
+        self.assertEqual({result["id"] for result in results}, {f"m{n}" for n in range(6)})
+
+    def test_invalid_messages_get_error_lines(self):
+        """Unknown sessions and malformed lines are reported without stopping the batch."""
+        self.client.post('/new_session', json={"session_name": "batch_valid"})
+        response = self.client.post('/chat/batch', data='{"session_name": "batch_valid", "message": "Hi there"}\n'
+                                                        '{"session_name": "batch_missing", "message": "Hello"}\n'
+                                                        'not json\n')
+        results = {result["index"]: result for result in map(json.loads, response.get_data(as_text=True).splitlines())}
+        self.assertTrue(results[0]["ok"])
+        self.assertEqual(results[1]["error"], "Invalid session.")
+        self.assertEqual(results[2]["error"], "Invalid JSON line.")
+
+    def test_messages_missing_from_the_batch_are_classified_alone(self):
+        """A message the batch response leaves out falls back to its own classification call."""
+        self.openai.skip = {"What are your hours?"}
+        classifications = async_runtime.run(server.classify_messages(["Hello", "What are your hours?"]))
+        self.assertEqual([c["intent"] for c in classifications], ["general_inquiry", "faq_question"])
+        self.assertEqual(len(self.openai.calls), 2)
+
+    def test_failed_classification_is_reported_per_message(self):
+        """A message whose fallback classification fails gets an error line; the rest are answered."""
+        self.openai.skip = {"Broken message"}
+        real_classify = server.classify_message
+
+        async def classify_message(message):
+            if message == "Broken message":
+                raise RuntimeError("classifier unavailable")
+            return await real_classify(message)
+
+        items = [{"session_name": "batch_failure", "message": message}
+                 for message in ["Hello", "Broken message", "Goodbye"]]
+        with mock.patch.object(server, "classify_message", side_effect=classify_message):
+            results = {result["index"]: result for result in self.post(items, create_sessions=1)}
+        self.assertEqual([results[n]["ok"] for n in range(3)], [True, False, True])
+        self.assertIn("classifier unavailable", results[1]["response"])
+
+
+if __name__ == "__main__":
+    unittest.main()
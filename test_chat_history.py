@@ -0,0 +1,74 @@
+import unittest
+from unittest import mock
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+import server
+from session_store import InMemorySessionStore
+
+
+class TestChatHistoryPagination(unittest.TestCase):
+
+    def setUp(self):
+        self.store = InMemorySessionStore()
+        patch = mock.patch.object(server, "session_store", self.store)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.client = server.app.test_client()
+        self.store.create("reader")
+        for i in range(5):
+            self.store.append_messages("reader", [HumanMessage(content=f"q{i}"), AIMessage(content=f"a{i}")])
+
+    def get(self, headers=None, **params):
+        params["session_name"] = "reader"
+        return self.client.get('/chat_history', query_string=params, headers=headers)
+
+    def test_full_history_by_default(self):
+        """Without paging parameters every message is returned, as before."""
+        body = self.get().json
+        self.assertEqual(len(body["chat_history"]), 10)
+        self.assertEqual((body["first_seq"], body["last_seq"], body["latest_seq"]), (1, 10, 10))
+        self.assertFalse(body["has_older"] or body["has_newer"])
+
+    def test_backward_pages(self):
+        """`limit` returns the newest messages and `before` walks back through older ones."""
+        latest = self.get(limit=4).json
+        self.assertEqual([m["content"] for m in latest["chat_history"]], ["q3", "a3", "q4", "a4"])
+        self.assertTrue(latest["has_older"])
+
+        older = self.get(limit=4, before=latest["first_seq"]).json
+        self.assertEqual([m["content"] for m in older["chat_history"]], ["q1", "a1", "q2", "a2"])
+
+    def test_incremental_updates_and_etag(self):
+        """`after` returns only new messages, and an unchanged page answers 304."""
+        first = self.get(after=10)
+        self.assertEqual(first.json["chat_history"], [])
+        etag = first.headers["ETag"]
+
+        self.assertEqual(self.get(after=10, headers={"If-None-Match": etag}).status_code, 304)
+
+        self.store.append_messages("reader", [HumanMessage(content="q5"), AIMessage(content="a5")])
+        update = self.get(after=10, headers={"If-None-Match": etag})
+        self.assertEqual(update.status_code, 200)
+        self.assertEqual(update.json["chat_history"], [{"role": "You", "content": "q5"}, {"role": "Bot", "content": "a5"}])
+        self.assertEqual(update.json["latest_seq"], 12)
+
+    def test_recreated_session_invalidates_etag_and_cursors(self):
+        """A session deleted and created again gets a new epoch: no stale 304, and old cursors reset."""
+        old = self.get(after=10)
+        created_at = self.store.created_at("reader")
+        self.store.delete("reader")
+        self.store.create("reader", created_at=created_at + 1)
+        for i in range(5):
+            self.store.append_messages("reader", [HumanMessage(content=f"new q{i}"), AIMessage(content=f"new a{i}")])
+
+        fresh = self.get(after=10, epoch=old.json["epoch"], headers={"If-None-Match": old.headers["ETag"]})
+        self.assertEqual(fresh.status_code, 200)
+        self.assertTrue(fresh.json["reset"])
+        self.assertNotEqual(fresh.json["epoch"], old.json["epoch"])
+        self.assertEqual(fresh.json["chat_history"][0]["content"], "new q0")
+        self.assertEqual(len(fresh.json["chat_history"]), 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import json
+import unittest
+from unittest import mock
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+import server
+from answer_cache import SemanticAnswerCache
+
+
+def parse_events(body):
+    """Splits an SSE body into (event, data) pairs."""
+    events = []
+    for block in body.strip().split("\n\n"):
+        event, data = "message", None
+        for line in block.split("\n"):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+        events.append((event, data))
+    return events
+
+
+class TestChatStream(unittest.TestCase):
+
+    def setUp(self):
+        """Stub out classification and the model so /chat/stream runs offline."""
+        self.client = server.app.test_client()
+        self.client.post('/new_session', json={"session_name": "stream_session"})
+        patches = [
+            mock.patch.object(server, "classify_message", return_value={
+                "sentiment": "neutral", "intent": "general_inquiry", "appointment": None}),
+            mock.patch.object(server, "get_chat_llm", return_value=FakeListChatModel(responses=["Hello there!"])),
+            mock.patch.object(server, "answer_cache", SemanticAnswerCache()),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_tokens_stream_and_turn_is_saved(self):
+        """Tokens arrive as separate events and the full turn lands in the session history."""
+        response = self.client.post('/chat/stream', json={"session_name": "stream_session", "message": "Hi"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.mimetype.startswith("text/event-stream"))
+
+        events = parse_events(response.get_data(as_text=True))
+        tokens = [data["token"] for event, data in events if event == "message"]
+        self.assertGreater(len(tokens), 1)
+        self.assertEqual("".join(tokens), "Hello there!")
+        self.assertEqual(events[-1][0], "done")
+        self.assertEqual(events[-1][1]["response"], "Hello there!")
+        self.assertEqual(events[-1][1]["seq"], server.session_store.last_seq("stream_session"))
+
+        history = self.client.get('/chat_history?session_name=stream_session').json["chat_history"]
+        self.assertEqual(history[-2:], [{"role": "You", "content": "Hi"}, {"role": "Bot", "content": "Hello there!"}])
+
+    def test_chain_is_built_once(self):
+        """Alternating /chat and /chat/stream reuses one chain."""
+        from langchain_core.runnables import history
+
+        with mock.patch.object(server, "_conversation", None), \
+             mock.patch.object(history, "RunnableWithMessageHistory", wraps=history.RunnableWithMessageHistory) as build:
+            for _ in range(3):
+                for route in ['/chat', '/chat/stream']:
+                    response = self.client.post(route, json={"session_name": "stream_session", "message": "Hi"})
+                    self.assertEqual(response.status_code, 200)
+                    self.assertIn("Hello there!", response.get_data(as_text=True))
+        self.assertEqual(build.call_count, 1)
+
+    def test_invalid_session(self):
+        """Unknown sessions are rejected before streaming starts."""
+        response = self.client.post('/chat/stream', json={"session_name": "missing", "message": "Hi"})
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import asyncio
+import json
+import time
+import unittest
+from unittest import mock
+
+import async_runtime
+import server
+
+
+def completion(content):
+    """Build a minimal chat completion response with the given message content."""
+    return mock.Mock(choices=[mock.Mock(message=mock.Mock(content=content))])
+
+
+class TestClassifyMessage(unittest.TestCase):
+
+    def setUp(self):
+        """Patch the OpenAI client used by the fused classifier and disable the fast path."""
+        self.client = mock.Mock()
+        self.client.chat.completions.create = mock.AsyncMock()
+        patches = [
+            mock.patch.object(server, "get_async_openai_client", return_value=self.client),
+            mock.patch.object(server.fast_classifier, "is_confident", return_value=False),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_single_call_returns_sentiment_intent_and_slots(self):
+        """A valid JSON response is parsed without any follow-up calls."""
+        self.client.chat.completions.create.return_value = completion(json.dumps({
+            "sentiment": "Neutral",
+            "intent": "appointment",
+            "appointment": {"date": "tomorrow", "time": "2 PM", "purpose": None},
+        }))
+        with mock.patch.object(server, "analyze_sentiment") as sentiment, \
+                mock.patch.object(server, "detect_intent") as intent:
+            result = async_runtime.run(server.classify_message("Book me in tomorrow at 2 PM"))
+
+        self.assertEqual(result, {
+            "sentiment": "neutral",
+            "intent": "appointment",
+            "appointment": {"date": "tomorrow", "time": "2 PM", "purpose": ""},
+        })
+        self.assertEqual(self.client.chat.completions.create.call_count, 1)
+        sentiment.assert_not_called()
+        intent.assert_not_called()
+
+    def test_invalid_json_falls_back_to_separate_calls(self):
+        """Unparseable output falls back to analyze_sentiment and detect_intent."""
+        self.client.chat.completions.create.return_value = completion("not json")
+        with mock.patch.object(server, "analyze_sentiment", return_value="positive"), \
+                mock.patch.object(server, "detect_intent", return_value="faq_question"):
+            result = async_runtime.run(server.classify_message("What are your hours?"))
+
+        self.assertEqual(result, {"sentiment": "positive", "intent": "faq_question", "appointment": None})
+
+    def test_fallback_skips_intent_for_negative_sentiment(self):
+        """Unknown categories fall back, and negative sentiment still short-circuits intent."""
+        self.client.chat.completions.create.return_value = completion('{"sentiment": "angry", "intent": "complaint"}')
+        with mock.patch.object(server, "analyze_sentiment", return_value="negative"), \
+                mock.patch.object(server, "detect_intent", return_value="faq_question"):
+            result = async_runtime.run(server.classify_message("This is terrible."))
+
+        self.assertEqual(result["sentiment"], "negative")
+        self.assertIsNone(result["intent"])
+
+    def test_fallback_calls_run_concurrently(self):
+        """The fallback sentiment and intent calls overlap instead of running back to back."""
+        async def slow_sentiment(text):
+            await asyncio.sleep(0.2)
+            return "neutral"
+
+        async def slow_intent(text):
+            await asyncio.sleep(0.2)
+            return "faq_question"
+
+        self.client.chat.completions.create.return_value = completion("not json")
+        with mock.patch.object(server, "analyze_sentiment", slow_sentiment), \
+                mock.patch.object(server, "detect_intent", slow_intent):
+            started = time.perf_counter()
+            result = async_runtime.run(server.classify_message("Something unusual"))
+            elapsed = time.perf_counter() - started
+
+        self.assertEqual(result["intent"], "faq_question")
+        self.assertLess(elapsed, 0.35)
+
+
+class TestFastPath(unittest.TestCase):
+
+    def test_obvious_messages_skip_the_llm(self):
+        """Confident local classifications never touch the OpenAI client."""
+        with mock.patch.object(server, "get_async_openai_client") as client:
+            self.assertEqual(
+                async_runtime.run(server.classify_message("What are your opening hours?")),
+                {"sentiment": "neutral", "intent": "faq_question", "appointment": None},
+            )
+            result = async_runtime.run(server.classify_message("This is ridiculous, I am so frustrated."))
+            self.assertEqual(result["sentiment"], "negative")
+        client.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,163 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+
+import async_runtime
+import server
+from answer_cache import SemanticAnswerCache
+from conversation_memory import RollingSummaryMemory, new_summary_state
+
+
+def make_history(turns, words=3):
+    """Builds `turns` user/assistant message pairs."""
+    messages = []
+    for i in range(turns):
+        messages.append(HumanMessage(content=f"question {i} " + "word " * words))
+        messages.append(AIMessage(content=f"answer {i} " + "word " * words))
+    return messages
+
+
+class TestRollingSummaryMemory(unittest.TestCase):
+
+    def setUp(self):
+        self.prompts = []
+
+        async def summarize(prompt):
+            self.prompts.append(prompt)
+            return f"summary {len(self.prompts)}"
+
+        self.memory = RollingSummaryMemory(summarize, max_turns=2, max_tokens=1000)
+
+    def test_window_is_bounded_by_turns(self):
+        """Only the last `max_turns` turns are kept verbatim."""
+        messages = make_history(5)
+        context = self.memory.context(new_summary_state(), messages)
+        self.assertEqual(context, messages[-4:])
+
+    def test_window_is_bounded_by_tokens(self):
+        """Long messages shrink the window below the turn limit."""
+        memory = RollingSummaryMemory(self.memory.summarize, max_turns=10, max_tokens=300)
+        messages = make_history(5, words=200)
+        start = memory.window_start(messages)
+        self.assertGreater(start, 0)
+        self.assertLess(len(messages) - start, 4)
+
+    def test_update_folds_older_turns_into_summary(self):
+        """Messages that left the window are summarized once and prepended to the prompt history."""
+        state = new_summary_state()
+        messages = make_history(5)
+        async_runtime.run(self.memory.update("s", state, messages))
+
+        self.assertEqual(state, {"text": "summary 1", "upto": 6})
+        self.assertIn("question 2", self.prompts[0])
+        self.assertNotIn("question 3", self.prompts[0])
+        context = self.memory.context(state, messages)
+        self.assertIn("summary 1", context[0].content)
+        self.assertEqual(context[1:], messages[-4:])
+
+        # Nothing new left the window, so no further call is made
+        self.assertFalse(self.memory.needs_update(state, messages))
+        async_runtime.run(self.memory.update("s", state, messages))
+        self.assertEqual(len(self.prompts), 1)
+
+        # The next update only sends the newly evicted turn along with the previous summary
+        messages += make_history(1)
+        async_runtime.run(self.memory.update("s", state, messages))
+        self.assertIn("summary 1", self.prompts[1])
+        self.assertNotIn("question 2", self.prompts[1])
+        self.assertEqual(state["upto"], 8)
+
+    def test_update_from_the_unsummarized_tail(self):
+        """Given only the messages after `upto`, an update summarizes the same turns as with the full history."""
+        state = {"text": "summary 0", "upto": 4}
+        messages = make_history(6)
+        tail = messages[4:]
+        self.assertTrue(self.memory.needs_update(state, tail, offset=4))
+        async_runtime.run(self.memory.update("s", state, tail, offset=4))
+
+        self.assertEqual(state, {"text": "summary 1", "upto": 8})
+        self.assertIn("question 2", self.prompts[0])
+        self.assertIn("answer 3", self.prompts[0])
+        self.assertNotIn("question 1", self.prompts[0])
+        self.assertNotIn("question 4", self.prompts[0])
+        self.assertFalse(self.memory.needs_update(state, messages[8:], offset=8))
+
+    def test_schedule_update_runs_in_background_once_per_session(self):
+        """A second request for the same session is skipped while an update is running."""
+        state = new_summary_state()
+        submitted = []
+        self.memory.schedule_update("s", state, make_history(5), submitted.append)
+        self.memory.schedule_update("s", state, make_history(5), submitted.append)
+        self.assertEqual(len(submitted), 1)
+
+        async_runtime.run(submitted[0])
+        self.assertEqual(state["upto"], 6)
+        self.memory.schedule_update("s", state, make_history(6), submitted.append)
+        self.assertEqual(len(submitted), 2)
+        submitted[1].close()
+
+
+class TestChatBoundedHistory(unittest.TestCase):
+
+    def setUp(self):
+        """Stub out classification and the model so /chat runs offline."""
+        self.client = server.app.test_client()
+        self.client.post('/new_session', json={"session_name": "memory_session"})
+        memory = RollingSummaryMemory(self.summarize, max_turns=2, max_tokens=1000)
+        patches = [
+            mock.patch.object(server, "classify_message", return_value={
+                "sentiment": "neutral", "intent": "general_inquiry", "appointment": None}),
+            mock.patch.object(server, "get_chat_llm", return_value=FakeListChatModel(responses=["Sure."])),
+            mock.patch.object(server, "answer_cache", SemanticAnswerCache()),
+            mock.patch.object(server, "conversation_memory", memory),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    async def summarize(self, prompt):
+        return "The patron asked several questions."
+
+    def test_long_session_keeps_full_history_but_bounded_prompt(self):
+        """The stored history grows while the prompt history stays at the summary plus two turns."""
+        for i in range(4):
+            self.client.post('/chat', json={"session_name": "memory_session", "message": f"Question {i}"})
+        async_runtime.run(asyncio.sleep(0.05))  # Let the background summary finish
+
+        messages = server.session_store.get_messages("memory_session")
+        self.assertEqual(len(messages), 8)
+        self.assertEqual(server.session_store.get_summary("memory_session")["text"], "The patron asked several questions.")
+
+        history = server.bounded_history({"history": messages}, {"configurable": {"session_id": "memory_session"}})
+        self.assertEqual(len(history), 5)
+        self.assertIn("several questions", history[0].content)
+
+    def test_turns_read_only_the_window_and_the_unsummarized_tail(self):
+        """A chat turn never loads the whole stored history."""
+        server.session_store.delete("long_session")
+        server.session_store.create("long_session")
+        server.session_store.append_messages("long_session", make_history(20))
+        server.session_store.set_summary("long_session", {"text": "Earlier questions.", "upto": 36})
+        reads = []
+        get_messages = server.session_store.get_messages
+
+        def recording_get_messages(session_name, limit=None, after=None):
+            messages = get_messages(session_name, limit=limit, after=after)
+            reads.append((limit, after, len(messages)))
+            return messages
+
+        with mock.patch.object(server.session_store, "get_messages", recording_get_messages):
+            self.client.post('/chat', json={"session_name": "long_session", "message": "One more"})
+            async_runtime.run(asyncio.sleep(0.05))
+
+        self.assertTrue(reads)
+        self.assertTrue(all(limit is not None or after is not None for limit, after, _ in reads))
+        self.assertLessEqual(max(count for _, _, count in reads), 6)
+        self.assertEqual(server.session_store.get_summary("long_session")["upto"], 38)
+
+
+if __name__ == "__main__":
+    unittest.main()
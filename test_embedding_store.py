@@ -0,0 +1,174 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+from langchain.schema import Document
+
+import faq_search_rag
+from embedding_store import EmbeddingStore, QueryEmbeddingCache, content_hash, normalize_query
+
+
+class TestEmbeddingStore(unittest.TestCase):
+
+    def setUp(self):
+        """Use a throwaway cache directory for every test."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp.name, "cache")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_key_depends_on_model_and_content(self):
+        """Changing either the model or the text changes the cache key."""
+        self.assertNotEqual(content_hash("hours", "model-a"), content_hash("hours", "model-b"))
+        self.assertNotEqual(content_hash("hours", "model-a"), content_hash("location", "model-a"))
+
+    def test_store_persists_embeddings_and_manifest(self):
+        """Embeddings and manifests survive a reload from disk."""
+        store = EmbeddingStore(self.cache_dir, "model-a")
+        key = store.key("What are the library hours?")
+        store.put(key, [0.1, 0.2])
+        store.set_manifest("index/faq", {"0": key})
+        store.save()
+
+        reloaded = EmbeddingStore(self.cache_dir, "model-a")
+        self.assertEqual(reloaded.get(key).tolist(), np.float32([0.1, 0.2]).tolist())
+        self.assertEqual(reloaded.get_manifest("index/faq"), {"0": key})
+
+    def test_embeddings_are_packed_float32_rows(self):
+        """Saved embeddings are rows of one memory-mapped float32 matrix; pruned ones are dropped."""
+        store = EmbeddingStore(self.cache_dir, "model-a")
+        for text in ["a", "b", "c"]:
+            store.put(store.key(text), [float(len(text)), 1.0, 2.0])
+        store.prune([store.key("a"), store.key("c")])
+        store.save()
+
+        reloaded = EmbeddingStore(self.cache_dir, "model-a")
+        vector = reloaded.get(reloaded.key("c"))
+        self.assertIsInstance(vector, np.memmap)
+        self.assertEqual(vector.dtype, np.float32)
+        self.assertIsNone(reloaded.get(reloaded.key("b")))
+        self.assertEqual(np.load(reloaded.vectors_path).shape, (2, 3))
+
+    def test_json_cache_is_converted(self):
+        """A cache written as JSON lists of floats is read and rewritten in the packed format."""
+        os.makedirs(self.cache_dir)
+        key = content_hash("hours", "model-a")
+        with open(os.path.join(self.cache_dir, "embeddings.json"), "w", encoding="utf-8") as f:
+            json.dump({key: [0.5, 0.25]}, f)
+
+        store = EmbeddingStore(self.cache_dir, "model-a")
+        self.assertEqual(store.get(key).tolist(), [0.5, 0.25])
+        store.set_manifest("index/faq", {"0": key})
+        store.save()
+        self.assertFalse(os.path.exists(store.embeddings_path))
+        self.assertEqual(EmbeddingStore(self.cache_dir, "model-a").get(key).tolist(), [0.5, 0.25])
+
+
+class TestSyncFaqToPinecone(unittest.TestCase):
+
+    def setUp(self):
+        """Patch the embeddings client and Pinecone so sync runs offline."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.embeddings = mock.Mock()
+        self.embeddings.embed_documents.side_effect = lambda texts: [[float(len(t)), 1.0] for t in texts]
+        self.index = mock.Mock()
+        self.pc = mock.Mock()
+        self.pc.Index.return_value = self.index
+        self.pc.list_indexes.return_value.names.return_value = [faq_search_rag.PINECONE_INDEX_NAME]
+
+        patches = [
+            mock.patch.object(faq_search_rag, "get_embeddings", return_value=self.embeddings),
+            mock.patch.object(faq_search_rag, "get_pinecone", return_value=self.pc),
+            mock.patch.object(faq_search_rag, "FAQ_CACHE_DIR", self.tmp.name),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_unchanged_faq_makes_no_calls(self):
+        """A second sync with the same FAQ embeds and upserts nothing."""
+        docs = [Document(page_content="Q1\nA1"), Document(page_content="Q2\nA2")]
+        faq_search_rag.sync_faq_to_pinecone(docs)
+        self.assertEqual(self.embeddings.embed_documents.call_count, 1)
+        self.assertEqual(self.index.upsert.call_count, 1)
+
+        self.embeddings.reset_mock()
+        self.index.reset_mock()
+        faq_search_rag.sync_faq_to_pinecone(docs)
+        self.embeddings.embed_documents.assert_not_called()
+        self.index.upsert.assert_not_called()
+        self.index.delete.assert_not_called()
+
+    def test_only_changed_entries_are_synced(self):
+        """Edited entries are re-embedded and removed entries are deleted."""
+        faq_search_rag.sync_faq_to_pinecone([
+            Document(page_content="Q1\nA1"),
+            Document(page_content="Q2\nA2"),
+            Document(page_content="Q3\nA3"),
+        ])
+        self.embeddings.reset_mock()
+        self.index.reset_mock()
+
+        faq_search_rag.sync_faq_to_pinecone([
+            Document(page_content="Q1\nA1"),
+            Document(page_content="Q2\nA2 (updated)"),
+        ])
+        self.embeddings.embed_documents.assert_called_once_with(["Q2\nA2 (updated)"])
+        upserted = self.index.upsert.call_args.kwargs["vectors"]
+        self.assertEqual([vector_id for vector_id, _, _ in upserted], ["1"])
+        self.index.delete.assert_called_once_with(ids=["2"], namespace="faq")
+
+
+class TestQueryEmbeddingCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.embed = mock.Mock(side_effect=lambda text: [float(len(text)), 0.5])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_normalized_repeats_cost_no_embedding_calls(self):
+        """Case, whitespace and punctuation variants share one embedding."""
+        cache = QueryEmbeddingCache("model-a")
+        self.assertEqual(normalize_query("  Library HOURS?! "), "library hours")
+        first = cache.get_or_embed("Library hours?", self.embed)
+        self.assertIs(cache.get_or_embed("library   hours", self.embed), first)
+        self.assertEqual(self.embed.call_count, 1)
+        self.assertEqual(cache.stats(), {"hits": 1, "disk_hits": 0, "misses": 1, "size": 1})
+
+    def test_lru_eviction_and_ttl(self):
+        """The least recently used entry is evicted and expired entries are re-embedded."""
+        cache = QueryEmbeddingCache("model-a", max_size=2)
+        for query in ["a", "b", "a", "c"]:
+            cache.get_or_embed(query, self.embed)
+        cache.get_or_embed("b", self.embed)
+        self.assertEqual(self.embed.call_count, 4)  # "b" was evicted when "c" arrived
+
+        expiring = QueryEmbeddingCache("model-a", ttl=10)
+        with mock.patch("embedding_store.time.time", return_value=1000.0):
+            expiring.get_or_embed("hours", self.embed)
+        with mock.patch("embedding_store.time.time", return_value=1011.0):
+            expiring.get_or_embed("hours", self.embed)
+        self.assertEqual(expiring.stats()["misses"], 2)
+
+    def test_disk_tier_is_shared_between_instances(self):
+        """A second cache (e.g. another worker) reads embeddings from the shared SQLite file."""
+        path = os.path.join(self.tmp.name, "queries.sqlite")
+        QueryEmbeddingCache("model-a", disk_path=path).get_or_embed("renew card", self.embed)
+
+        other = QueryEmbeddingCache("model-a", disk_path=path)
+        self.assertEqual(other.get_or_embed("Renew card!", self.embed).tolist(), [10.0, 0.5])
+        self.assertEqual(self.embed.call_count, 1)
+        self.assertEqual(other.stats()["disk_hits"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import asyncio
+import json
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+from langchain_core.messages import HumanMessage, SystemMessage
+
+import faq_search_rag
+from benchmarks.load_test import percentile, replay, summarize
+from embedding_store import QueryEmbeddingCache
+from faq_loader import iter_faq_documents
+from fake_backends import FakeAsyncOpenAI, FakeChatModel, FakeEmbeddings, FakePinecone, hash_embedding
+
+
+class TestFakeBackends(unittest.TestCase):
+
+    def test_hash_embeddings_are_deterministic_and_similar_for_shared_words(self):
+        """The same text always maps to the same vector; shared words mean higher similarity."""
+        hours = hash_embedding("What are the library hours?")
+        np.testing.assert_array_equal(hours, hash_embedding("What are the library hours?"))
+        self.assertAlmostEqual(float(np.linalg.norm(hours)), 1.0, places=5)
+        self.assertGreater(hours @ hash_embedding("library opening hours"), hours @ hash_embedding("lost book fee"))
+
+    def test_faq_sync_and_query_offline(self):
+        """The Pinecone code path runs end to end against the fakes, with no API calls."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        fake_embeddings = FakeEmbeddings()
+        patches = [
+            mock.patch.object(faq_search_rag, "get_embeddings", return_value=fake_embeddings),
+            mock.patch.object(faq_search_rag, "get_pinecone", return_value=FakePinecone()),
+            mock.patch.object(faq_search_rag, "FAQ_CACHE_DIR", tmp.name),
+            mock.patch.object(faq_search_rag, "RETRIEVAL_BACKEND", "pinecone"),
+            mock.patch.object(faq_search_rag, "query_cache", QueryEmbeddingCache("fake")),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        docs = list(iter_faq_documents("FAQ_library.txt"))
+        faq_search_rag.sync_faq_to_pinecone(docs)
+        faq_search_rag.build_lexical_index(docs)
+        self.assertIn("borrow up to 10 books", faq_search_rag.query_faq_pinecone("How many books can I borrow?"))
+
+        calls = fake_embeddings.calls
+        faq_search_rag.sync_faq_to_pinecone(docs)  # Unchanged FAQ: nothing to embed
+        self.assertEqual(fake_embeddings.calls, calls)
+
+    def test_chat_model_invoke_and_stream(self):
+        """The fake chat model answers classification prompts and streams conversational replies."""
+        llm = FakeChatModel()
+        self.assertEqual(llm.invoke("Analyze the sentiment of this message and respond with either "
+                                    "'positive', 'neutral', or 'negative': I love it!").content, "positive")
+        messages = [SystemMessage(content="You are a library assistant."),
+                    HumanMessage(content="hours?\n[Assistant]: Open 9-8.")]
+        streamed = "".join(chunk.content for chunk in llm.stream(messages))
+        self.assertEqual(streamed, llm.invoke(messages).content)
+        self.assertIn("Open 9-8.", streamed)
+
+    def test_async_openai_classification_json(self):
+        """JSON classification calls return the categories and appointment fields the server expects."""
+        client = FakeAsyncOpenAI()
+        response = asyncio.run(client.chat.completions.create(model="gpt-4o-mini", messages=[
+            {"role": "system", "content": "Classify the user's message for a library support chatbot."},
+            {"role": "user", "content": "Book a study room tomorrow at 3 PM for a group project"},
+        ]))
+        result = json.loads(response.choices[0].message.content)
+        self.assertEqual(result["intent"], "appointment")
+        self.assertEqual(result["appointment"], {"date": "tomorrow", "time": "3 PM", "purpose": "a group project"})
+
+    def test_latency_is_applied_per_call(self):
+        """Configured latency is slept once per request, not once per text."""
+        embeddings = FakeEmbeddings(latency=0.05)
+        started = time.perf_counter()
+        embeddings.embed_documents(["a", "b", "c"])
+        self.assertGreaterEqual(time.perf_counter() - started, 0.05)
+        self.assertLess(time.perf_counter() - started, 0.15)
+
+
+class TestLoadTest(unittest.TestCase):
+
+    def test_percentiles_use_nearest_rank(self):
+        """Percentiles pick an actual sample: the smallest covering q% of them."""
+        samples = list(range(1, 101))
+        self.assertEqual((percentile(samples, 50), percentile(samples, 95), percentile(samples, 99)), (50, 95, 99))
+        self.assertIsNone(percentile([], 50))
+
+    def test_replay_paces_requests_and_reports_per_route(self):
+        """Requests go out at the target rate, cycling through the traffic, and are summarized by route."""
+        sent = []
+
+        def send(route, payload):
+            sent.append((route, payload["message"], time.perf_counter()))
+            return payload["message"] != "fail", None
+
+        traffic = [{"route": "/chat", "session_name": "a", "message": "hi"},
+                   {"route": "/chat/stream", "session_name": "b", "message": "fail"}]
+        results, elapsed = replay(traffic, send, rps=50, total=6, concurrency=4)
+
+        self.assertEqual([message for _, message, _ in sorted(sent, key=lambda s: s[2])], ["hi", "fail"] * 3)
+        self.assertGreaterEqual(elapsed, 5 / 50)
+        report = summarize(results, elapsed)
+        self.assertEqual(report["/chat"]["requests"], 3)
+        self.assertEqual(report["/chat/stream"]["errors"], 3)
+        self.assertLessEqual(report["/chat"]["p50_ms"], report["/chat"]["p99_ms"])
+
+
+if __name__ == "__main__":
+    unittest.main()
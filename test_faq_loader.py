@@ -0,0 +1,104 @@
+import os
+import tempfile
+import unittest
+
+from faq_loader import chunk_text, iter_faq_documents, parse_faq_entries
+
+FAQ = """Frequently Asked Questions (FAQ)
+General Information
+
+1. What are the hours?
+Open:
+
+Monday: 9-8
+Sunday: Closed
+
+2. Where are you?
+123 Main Street
+
+Membership & Accounts
+2. How do I get a card?
+Bring an ID.
+"""
+
+
+class TestFaqLoader(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write(self, name, text):
+        path = os.path.join(self.tmp.name, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def test_sections_and_duplicate_numbers(self):
+        """Headings become sections instead of answer text, and repeated numbers are harmless."""
+        entries = list(parse_faq_entries(FAQ.splitlines(keepends=True)))
+        self.assertEqual([(e["section"], e["question"]) for e in entries], [
+            ("General Information", "What are the hours?"),
+            ("General Information", "Where are you?"),
+            ("Membership & Accounts", "How do I get a card?"),
+        ])
+        self.assertEqual(entries[0]["answer"], "Open: Monday: 9-8 Sunday: Closed")
+        self.assertEqual(entries[1]["answer"], "123 Main Street")
+
+    def test_repository_faq(self):
+        """Every entry of the shipped FAQ is loaded with a unique ID and a section."""
+        docs = list(iter_faq_documents("FAQ_library.txt"))
+        self.assertEqual(len(docs), 18)
+        self.assertEqual(len({doc.metadata["id"] for doc in docs}), 18)
+        self.assertTrue(all(doc.metadata["section"] for doc in docs))
+        self.assertNotIn("Membership", docs[2].page_content)
+
+    def test_ids_are_stable_when_entries_are_inserted(self):
+        """Adding an entry leaves the IDs of the others unchanged."""
+        path = self.write("faq.txt", FAQ)
+        before = {doc.metadata["question"]: doc.metadata["id"] for doc in iter_faq_documents(path)}
+
+        self.write("faq.txt", FAQ.replace("2. Where are you?", "2. Is there parking?\nYes.\n\n3. Where are you?"))
+        after = {doc.metadata["question"]: doc.metadata["id"] for doc in iter_faq_documents(path)}
+
+        self.assertEqual(len(after), 4)
+        for question, vector_id in before.items():
+            self.assertEqual(after[question], vector_id)
+
+    def test_directory_and_glob_sources(self):
+        """A directory or glob loads every matching file, recording each document's source."""
+        self.write("main/faq.txt", FAQ)
+        self.write("branch/faq.txt", "1. Is the branch open on Sunday?\nNo.\n")
+        self.write("branch/notes.md", "1. Ignored?\nYes.\n")
+
+        docs = iter_faq_documents(self.tmp.name)
+        self.assertFalse(isinstance(docs, list))  # Streamed, not built up front
+        sources = [doc.metadata["source"] for doc in docs]
+        self.assertEqual(sources, ["branch/faq.txt"] + ["main/faq.txt"] * 3)
+
+        pattern = os.path.join(self.tmp.name, "branch", "*.txt")
+        self.assertEqual(len(list(iter_faq_documents(pattern))), 1)
+
+        with self.assertRaises(FileNotFoundError):
+            list(iter_faq_documents(os.path.join(self.tmp.name, "missing", "*.txt")))
+
+    def test_long_answers_are_chunked_with_overlap(self):
+        """Long answers split into overlapping chunks, each with the question and its own ID."""
+        words = [f"word{i}" for i in range(100)]
+        chunks = chunk_text(" ".join(words), chunk_size=100, chunk_overlap=20)
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(chunk) <= 100 for chunk in chunks))
+        for previous, current in zip(chunks, chunks[1:]):
+            self.assertEqual(previous.split()[-1], current.split()[1])  # Last two words carry over
+        self.assertEqual(" ".join(chunks[0].split() + [w for c in chunks[1:] for w in c.split()[2:]]), " ".join(words))
+
+        path = self.write("long.txt", "1. Long question?\n" + " ".join(words) + "\n")
+        docs = list(iter_faq_documents(path, chunk_size=100, chunk_overlap=20))
+        self.assertEqual(len(docs), len(chunks))
+        self.assertTrue(all(doc.page_content.startswith("Long question?\n") for doc in docs))
+        self.assertEqual(len({doc.metadata["id"] for doc in docs}), len(docs))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+
+from fast_classifier import FastClassifier
+
+
+class TestFastClassifier(unittest.TestCase):
+
+    def setUp(self):
+        self.classifier = FastClassifier(threshold=0.85)
+
+    def test_obvious_intents_are_confident(self):
+        """Clear FAQ, appointment and escalation messages are answered locally."""
+        for message, intent in [
+            ("What are your hours?", "faq_question"),
+            ("Book a study room tomorrow at 3", "appointment"),
+            ("I want to speak to a librarian", "escalation"),
+            ("Hello!", "general_inquiry"),
+        ]:
+            result = self.classifier.classify(message)
+            self.assertEqual(result["intent"], intent, message)
+            self.assertTrue(self.classifier.is_confident(result), message)
+
+    def test_study_room_question_is_not_a_booking(self):
+        """Asking whether rooms can be booked is an FAQ question, not an appointment."""
+        self.assertEqual(self.classifier.classify("Can I book a study room?")["intent"], "faq_question")
+
+    def test_negative_sentiment_skips_intent(self):
+        """Confidently negative messages do not need an intent."""
+        result = self.classifier.classify("I am really frustrated with the service.")
+        self.assertEqual(result["sentiment"], "negative")
+        self.assertIsNone(result["intent"])
+        self.assertTrue(self.classifier.is_confident(result))
+
+    def test_negated_and_unclear_messages_fall_back(self):
+        """Negated sentiment words and unknown intents are left to the LLM."""
+        self.assertFalse(self.classifier.is_confident(self.classifier.classify("I'm not upset, just curious.")))
+        self.assertFalse(self.classifier.is_confident(self.classifier.classify("Who wrote Pride and Prejudice?")))
+
+    def test_passing_negative_words_fall_back(self):
+        """A single negative word that is not a complaint is not enough to escalate locally."""
+        for message in ["Where can I return a book about hate speech?",
+                        "Is it ridiculous to ask for a longer loan on textbooks?",
+                        "This guide to the terrible twos is great, can I renew it?"]:
+            result = self.classifier.classify(message)
+            self.assertLess(result["sentiment_confidence"], self.classifier.threshold, message)
+            self.assertFalse(self.classifier.is_confident(result), message)
+        self.assertEqual(self.classifier.classify_sentiment("This is ridiculous, my card is blocked."), ("negative", 0.95))
+
+    def test_polite_openers_are_not_complaints(self):
+        """"I hate to bother you" is politeness, and "I" before a negative word is no complaint on its own."""
+        for message in ["I hate to bother you, but what are your hours?", "Sorry to trouble you, can I renew a book online?"]:
+            self.assertEqual(self.classifier.classify_sentiment(message), ("neutral", 0.9), message)
+        self.assertEqual(self.classifier.classify_sentiment("I hate this library"), ("negative", 0.6))
+        self.assertEqual(self.classifier.classify_sentiment("I am so frustrated"), ("negative", 0.95))
+
+    def test_booking_changes_fall_back(self):
+        """Cancelling or rescheduling is not fast-pathed into the booking flow."""
+        for message in ["I want to cancel my appointment tomorrow", "Can I reschedule my consultation to Friday?"]:
+            self.assertFalse(self.classifier.is_confident(self.classifier.classify(message)), message)
+
+    def test_statements_without_cues_fall_back(self):
+        """Only recognizable questions and requests are trusted to be neutral without a sentiment cue."""
+        self.assertEqual(self.classifier.classify_sentiment("What are your hours?"), ("neutral", 0.9))
+        for message in ["I've been waiting at the front desk for twenty minutes", "My card got blocked again"]:
+            self.assertFalse(self.classifier.is_confident(self.classifier.classify(message)), message)
+
+    def test_faq_embedding_match(self):
+        """Messages close to a cached FAQ embedding are classified as FAQ questions."""
+        classifier = FastClassifier(
+            faq_vectors=[[1.0, 0.0], [0.0, 1.0], None],
+            embed_query=lambda text: [0.95, 0.05] if "quiet" in text else [0.6, -0.8],
+            threshold=0.85,
+        )
+        result = classifier.classify("Somewhere quiet for a group to work together")
+        self.assertEqual(result["intent"], "faq_question")
+        self.assertTrue(classifier.is_confident(result))
+        self.assertFalse(classifier.is_confident(classifier.classify("Tell me a joke")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from langchain.schema import Document
+
+from embedding_store import EmbeddingStore
+from ingestion import IngestionPipeline, batched, call_with_retries
+
+
+def make_docs(count):
+    return [Document(page_content=f"Q{i}\nA{i}") for i in range(count)]
+
+
+class TestHelpers(unittest.TestCase):
+
+    def test_batched_reads_lazily(self):
+        """Batches are produced without consuming the input ahead of time."""
+        consumed = []
+
+        def source():
+            for i in range(5):
+                consumed.append(i)
+                yield i
+
+        batches = batched(source(), 2)
+        self.assertEqual(next(batches), [0, 1])
+        self.assertEqual(consumed, [0, 1])
+        self.assertEqual(list(batches), [[2, 3], [4]])
+
+    def test_retries_with_backoff(self):
+        """Failures are retried with growing delays until the call succeeds or retries run out."""
+        func = mock.Mock(side_effect=[RuntimeError("429"), RuntimeError("429"), "ok"])
+        with mock.patch("ingestion.time.sleep") as sleep, mock.patch("ingestion.random.uniform", lambda a, b: b):
+            self.assertEqual(call_with_retries(func, max_retries=3, base_delay=1.0), "ok")
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [1.0, 2.0])
+
+        with mock.patch("ingestion.time.sleep"):
+            with self.assertRaises(RuntimeError):
+                call_with_retries(mock.Mock(side_effect=RuntimeError("down")), max_retries=2)
+
+
+class TestIngestionPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.index = mock.Mock()
+        self.embed = mock.Mock(side_effect=lambda texts: [[float(len(t)), 1.0] for t in texts])
+
+    def pipeline(self, **kwargs):
+        store = EmbeddingStore(self.tmp.name, "model-a")
+        options = {"batch_size": 4, "concurrency": 2, "upsert_batch_size": 5, "max_retries": 0}
+        options.update(kwargs)
+        return IngestionPipeline(store, lambda: self.index, "test/faq", self.embed, **options)
+
+    def test_batches_embeddings_and_upserts(self):
+        """Embedding and upsert requests are split into batches of the configured sizes."""
+        counts = self.pipeline().run(iter(make_docs(10)))
+
+        self.assertEqual(counts, {"documents": 10, "embedded": 10, "upserted": 10, "deleted": 0})
+        self.assertEqual(sorted(len(call.args[0]) for call in self.embed.call_args_list), [2, 4, 4])
+        self.assertEqual([len(call.kwargs["vectors"]) for call in self.index.upsert.call_args_list], [5, 5])
+
+    def test_upserts_respect_size_limit(self):
+        """Large metadata splits upserts before the request size limit is reached."""
+        docs = [Document(page_content="x" * 1000 + str(i)) for i in range(6)]
+        self.pipeline(max_upsert_bytes=2500).run(docs)
+        self.assertEqual([len(call.kwargs["vectors"]) for call in self.index.upsert.call_args_list], [2, 2, 2])
+
+    def test_concurrency_is_bounded(self):
+        """No more than `concurrency` embedding requests run at once."""
+        active, peak = [0], [0]
+        lock = threading.Lock()
+
+        def slow_embed(texts):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+            return [[1.0, 0.0] for _ in texts]
+
+        self.embed.side_effect = slow_embed
+        self.pipeline(batch_size=1, concurrency=3).run(make_docs(12))
+        self.assertEqual(self.embed.call_count, 12)
+        self.assertLessEqual(peak[0], 3)
+        self.assertGreater(peak[0], 1)
+
+    def test_interrupted_run_resumes(self):
+        """After a failed upsert, a rerun re-embeds nothing and upserts only what is missing."""
+        self.index.upsert.side_effect = [None, RuntimeError("index unavailable")]
+        with self.assertRaises(RuntimeError):
+            self.pipeline(checkpoint_every=1).run(make_docs(10))
+        first = {vector_id for vector_id, _, _ in self.index.upsert.call_args_list[0].kwargs["vectors"]}
+
+        self.embed.reset_mock()
+        self.index.reset_mock(side_effect=True)
+        counts = self.pipeline().run(make_docs(10))
+
+        self.embed.assert_not_called()
+        self.assertEqual(counts["upserted"], 5)
+        upserted = {vector_id for vector_id, _, _ in self.index.upsert.call_args.kwargs["vectors"]}
+        self.assertEqual(upserted, {str(i) for i in range(10)} - first)
+
+    def test_unchanged_run_opens_no_index(self):
+        """With nothing to write the index is never opened."""
+        self.pipeline().run(make_docs(3))
+        get_index = mock.Mock()
+        store = EmbeddingStore(self.tmp.name, "model-a")
+        counts = IngestionPipeline(store, get_index, "test/faq", self.embed).run(make_docs(3))
+        self.assertEqual(counts["upserted"], 0)
+        get_index.assert_not_called()
+
+    def test_empty_run_deletes_nothing(self):
+        """An empty input after a sync fails instead of deleting every ID and pruning the cache."""
+        self.pipeline().run(make_docs(3))
+        self.index.reset_mock()
+        with self.assertRaises(ValueError):
+            self.pipeline().run([])
+        self.index.delete.assert_not_called()
+        store = EmbeddingStore(self.tmp.name, "model-a")
+        self.assertEqual(len(store.get_manifest("test/faq")), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+from unittest import mock
+
+import faq_search_rag
+from faq_loader import iter_faq_documents
+from lexical_index import BM25Index, fuse_rankings, tokenize
+
+
+class TestBM25Index(unittest.TestCase):
+
+    def setUp(self):
+        self.docs = list(iter_faq_documents("FAQ_library.txt"))
+        self.index = BM25Index().build(
+            (doc.metadata["id"], doc.page_content, {"question": doc.metadata["question"]}) for doc in self.docs
+        )
+
+    def test_tokenize(self):
+        """Stopwords are dropped, hyphenated words are joined and plurals are folded."""
+        self.assertEqual(tokenize("What are the Wi-Fi fees?"), ["wifi", "fee"])
+        self.assertEqual(tokenize("libraries"), ["library"])
+
+    def test_exact_terms_rank_first(self):
+        """Keyword questions find the entry that contains their terms."""
+        self.assertEqual(self.index.search("late fee")[0]["metadata"]["question"], "What happens if I return a book late?")
+        self.assertEqual(self.index.search("wifi password")[0]["metadata"]["question"], "Does the library offer free Wi-Fi?")
+        self.assertEqual(self.index.search("tell me something interesting"), [])
+
+    def test_normalized_scores(self):
+        """Normalized scores stay within [0, 1] and are higher for closer matches."""
+        results = self.index.search("Can I book a study room?", top_k=3)
+        self.assertTrue(all(0 < r["normalized_score"] <= 1 for r in results))
+        self.assertGreater(results[0]["normalized_score"], results[1]["normalized_score"])
+
+    def test_fuse_rankings(self):
+        """Items ranked well by both lists win; weights scale each list's contribution."""
+        fused = fuse_rankings([["a", "b", "c"], ["b", "d"]])
+        self.assertEqual([doc_id for doc_id, _ in fused][:2], ["b", "a"])
+        weighted = fuse_rankings([["a"], ["d"]], weights=[1.0, 2.0])
+        self.assertEqual(weighted[0][0], "d")
+
+
+class TestHybridRetrieval(unittest.TestCase):
+
+    def setUp(self):
+        self.docs = list(iter_faq_documents("FAQ_library.txt"))
+        faq_search_rag.build_lexical_index(self.docs)
+        self.by_question = {doc.metadata["question"]: doc for doc in self.docs}
+
+    def test_obvious_keyword_match_skips_embedding(self):
+        """Clear keyword hits are answered from the lexical index; ambiguous ones are not."""
+        answer = faq_search_rag.lexical_faq_answer("I lost a book")
+        self.assertIn("Report the lost book", answer)
+        self.assertIsNone(faq_search_rag.lexical_faq_answer("where is the library"))
+        self.assertIsNone(faq_search_rag.lexical_faq_answer("Tell me something interesting"))
+
+    def test_dense_and_keyword_rankings_are_fused(self):
+        """A keyword match missed by the dense ranking still reaches the top passages."""
+        def match(question):
+            doc = self.by_question[question]
+            return {"id": doc.metadata["id"], "score": 0.8, "metadata": {"text": doc.page_content}}
+
+        index = mock.Mock()
+        index.query.return_value = {"matches": [
+            match("Does the library host events or classes?"),
+            match("Can I book a study room?"),
+            match("What are the library’s hours of operation?"),
+        ]}
+        with mock.patch.object(faq_search_rag, "embed_query", return_value=[0.1] * 1536), \
+             mock.patch.object(faq_search_rag, "get_index", return_value=index), \
+             mock.patch.object(faq_search_rag, "FAQ_TOP_K", 2):
+            result = faq_search_rag.query_faq_pinecone("library hours of operation")
+
+        passages = result.split("\n\n")
+        self.assertEqual(len(passages), 2)
+        self.assertTrue(passages[0].startswith("What are the library’s hours of operation?"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,250 @@
+import asyncio
+import threading
+import time
+import unittest
+from unittest import mock
+
+import httpx
+import openai
+
+import model_clients
+import telemetry
+from model_calls import RETRIES, CallLayer, ConcurrencyLimit, OverloadedError, TokenBucket
+
+
+def rate_limit_error(retry_after=None):
+    headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+    response = httpx.Response(429, headers=headers, request=httpx.Request("POST", "https://api.openai.com/v1"))
+    return openai.RateLimitError("Rate limit reached", response=response, body=None)
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_burst_then_rate(self):
+        """Calls within the burst go straight through; later ones are spaced at the rate."""
+        bucket = TokenBucket(rate=10, burst=2)
+        self.assertEqual([bucket.reserve(), bucket.reserve()], [0.0, 0.0])
+        self.assertAlmostEqual(bucket.reserve(), 0.1, delta=0.01)
+        self.assertAlmostEqual(bucket.reserve(), 0.2, delta=0.01)
+
+    def test_reservation_beyond_max_wait_is_refused(self):
+        """A call that would wait too long is shed without taking a token."""
+        bucket = TokenBucket(rate=1, burst=1)
+        bucket.reserve()
+        with self.assertRaises(OverloadedError):
+            bucket.reserve(max_wait=0.5)
+        self.assertAlmostEqual(bucket.reserve(), 1.0, delta=0.01)
+
+    def test_rate_adapts_to_rate_limits(self):
+        """The rate halves on each rate limit, down to a floor, and recovers with successes."""
+        bucket = TokenBucket(rate=20)
+        for _ in range(10):
+            bucket.throttle()
+        self.assertEqual(bucket.rate, 2)
+        for _ in range(100):
+            bucket.recover()
+        self.assertEqual(bucket.rate, 20)
+
+    def test_zero_rate_is_unlimited(self):
+        self.assertEqual(TokenBucket(rate=0).reserve(max_wait=0), 0.0)
+
+
+class TestConcurrencyLimit(unittest.TestCase):
+
+    def test_threads_and_coroutines_share_slots(self):
+        """A slot released by a thread is handed to a waiting coroutine, and vice versa."""
+        limit = ConcurrencyLimit(1)
+        limit.acquire()
+        order = []
+
+        async def waiter():
+            await limit.acquire_async(timeout=2)
+            order.append("coroutine")
+            limit.release()
+
+        thread = threading.Thread(target=lambda: asyncio.run(waiter()))
+        thread.start()
+        while limit.queued == 0:
+            time.sleep(0.001)
+        order.append("thread")
+        limit.release()
+        thread.join(2)
+        self.assertEqual(order, ["thread", "coroutine"])
+        self.assertEqual((limit.active, limit.queued), (0, 0))
+
+    def test_queue_timeout_sheds_the_call(self):
+        """A caller that cannot get a slot in time is rejected and leaves the queue."""
+        limit = ConcurrencyLimit(1)
+        limit.acquire()
+        with self.assertRaises(OverloadedError):
+            limit.acquire(timeout=0.01)
+        with self.assertRaises(OverloadedError):
+            asyncio.run(limit.acquire_async(timeout=0.01))
+        self.assertEqual((limit.active, limit.queued), (1, 0))
+
+
+class TestCallLayer(unittest.TestCase):
+
+    def test_retries_rate_limits_with_backoff(self):
+        """Rate limits are retried after the server's Retry-After and the rate is lowered."""
+        layer = CallLayer("test_retry", rate=100, base_delay=0.001)
+        attempts = []
+
+        def flaky():
+            attempts.append(time.perf_counter())
+            if len(attempts) < 3:
+                raise rate_limit_error(retry_after=0.05)
+            return "ok"
+
+        self.assertEqual(layer.call(flaky), "ok")
+        self.assertEqual(len(attempts), 3)
+        self.assertGreaterEqual(attempts[1] - attempts[0], 0.05)
+        self.assertLess(layer.bucket.rate, 100)
+        self.assertEqual(RETRIES.value(backend="test_retry", error="RateLimitError"), 2)
+
+    def test_other_errors_are_not_retried(self):
+        """Errors that will not go away on their own are raised at once."""
+        layer = CallLayer("test_no_retry", base_delay=0.001)
+        calls = []
+
+        def broken():
+            calls.append(1)
+            raise ValueError("bad request")
+
+        with self.assertRaises(ValueError):
+            layer.call(broken)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(layer.limit.active, 0)
+
+    def test_identical_async_calls_are_coalesced(self):
+        """Concurrent calls with the same key share one request; other keys get their own."""
+        layer = CallLayer("test_coalesce")
+        requests = []
+
+        async def classify(text):
+            requests.append(text)
+            await asyncio.sleep(0.02)
+            return text.upper()
+
+        async def main():
+            return await asyncio.gather(*(layer.acall(classify, text, key=text) for text in ["hi"] * 5 + ["bye"]))
+
+        self.assertEqual(asyncio.run(main()), ["HI"] * 5 + ["BYE"])
+        self.assertEqual(sorted(requests), ["bye", "hi"])
+
+    def test_identical_sync_calls_are_coalesced(self):
+        """Threads asking for the same key while it is in flight share one request and its result."""
+        layer = CallLayer("test_coalesce_sync")
+        requests = []
+        started = threading.Event()
+
+        def embed(text):
+            requests.append(text)
+            started.set()
+            time.sleep(0.05)
+            return [1.0, 2.0]
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(layer.call(embed, "hours", key="hours")))
+                   for _ in range(4)]
+        threads[0].start()
+        started.wait(1)
+        for thread in threads[1:]:
+            thread.start()
+        for thread in threads:
+            thread.join(2)
+        self.assertEqual(requests, ["hours"])
+        self.assertEqual(results, [[1.0, 2.0]] * 4)
+
+    def test_concurrency_limit_queues_calls(self):
+        """No more than max_concurrency calls run at once; the rest wait their turn."""
+        layer = CallLayer("test_limit", max_concurrency=2)
+        running = []
+        peak = []
+
+        async def generate():
+            running.append(1)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.pop()
+
+        async def main():
+            await asyncio.gather(*(layer.acall(generate) for _ in range(8)))
+
+        asyncio.run(main())
+        self.assertEqual(max(peak), 2)
+        self.assertEqual(layer.stats()["in_flight"], 0)
+
+    def test_stream_retries_only_before_the_first_item(self):
+        """A stream that fails to start is retried; one that fails midway is not."""
+        layer = CallLayer("test_stream", base_delay=0.001)
+        attempts = []
+
+        def tokens():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise rate_limit_error()
+            yield "Hello"
+            yield " there"
+
+        self.assertEqual("".join(layer.stream(tokens)), "Hello there")
+        self.assertEqual(len(attempts), 2)
+
+        def broken_midway():
+            yield "Hello"
+            raise rate_limit_error()
+
+        received = []
+        with self.assertRaises(openai.RateLimitError):
+            for token in layer.stream(broken_midway):
+                received.append(token)
+        self.assertEqual(received, ["Hello"])
+        self.assertEqual(layer.limit.active, 0)
+
+    def test_async_stream_retries_only_before_the_first_item(self):
+        """The async stream retries a failed start and releases its slot when it ends."""
+        layer = CallLayer("test_astream", base_delay=0.001)
+        attempts = []
+
+        async def tokens():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise rate_limit_error()
+            yield "Hello"
+            yield " there"
+
+        async def collect():
+            return [token async for token in layer.astream(tokens)]
+
+        self.assertEqual("".join(asyncio.run(collect())), "Hello there")
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(layer.limit.active, 0)
+
+    def test_queue_depth_is_exported(self):
+        """In-flight calls and queue depth appear on /metrics."""
+        CallLayer("test_metrics")
+        body = telemetry.render_metrics()
+        self.assertIn('model_calls_in_flight{backend="test_metrics"} 0.0', body)
+        self.assertIn('model_call_queue_depth{backend="test_metrics"} 0.0', body)
+
+
+class TestModelClients(unittest.TestCase):
+
+    def setUp(self):
+        patches = [mock.patch.object(model_clients, "FAKE_BACKENDS", False),
+                   mock.patch.object(model_clients, "OPENAI_API_KEY", "test-key")]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        model_clients.reset()
+        self.addCleanup(model_clients.reset)
+
+    def test_sdk_retries_are_disabled(self):
+        """Only the call layer retries; the SDKs make a single attempt per call."""
+        for factory in [model_clients.get_openai_client, model_clients.get_async_openai_client,
+                        model_clients.get_chat_llm, model_clients.get_embeddings]:
+            self.assertEqual(factory().max_retries, 0, factory.__name__)
+
+
+if __name__ == "__main__":
+    unittest.main()
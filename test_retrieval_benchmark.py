@@ -0,0 +1,109 @@
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import faq_search_rag
+from benchmarks.bench_retrieval import (DEFAULT_QUESTIONS, RecordedEmbeddings, compare, entry_ranking,
+                                        evaluate_backend, load_questions, main, recall_at_k, reciprocal_rank)
+from embedding_store import EmbeddingStore
+from fake_backends import FakeEmbeddings
+
+
+class TestRetrievalBenchmark(unittest.TestCase):
+
+    def test_labels_match_the_faq(self):
+        """Every labeled question points at an entry of FAQ_library.txt."""
+        known = {doc.metadata["question"] for doc in faq_search_rag.load_faq_data("FAQ_library.txt")}
+        for row in load_questions(DEFAULT_QUESTIONS):
+            self.assertTrue(row["relevant"] <= known, row)
+
+    def test_metrics(self):
+        """Chunks collapse into their entry; recall@k and reciprocal rank use entry ranks."""
+        ranking = entry_ranking(["a-0", "b-0", "a-1", "c-0"], {"a-0": "A", "a-1": "A", "b-0": "B", "c-0": "C"})
+        self.assertEqual(ranking, ["A", "B", "C"])
+        self.assertEqual(recall_at_k(ranking, {"C"}, 2), 0.0)
+        self.assertEqual(recall_at_k(ranking, {"B", "C"}, 3), 1.0)
+        self.assertEqual(reciprocal_rank(ranking, {"B"}), 0.5)
+        self.assertEqual(reciprocal_rank(ranking, {"D"}), 0.0)
+
+    def test_regressions_beyond_tolerance_are_reported(self):
+        baseline = {"backends": {"hybrid": {"recall@1": 0.8, "mrr@10": 0.85}}}
+        results = {"backends": {"hybrid": {"recall@1": 0.79, "mrr@10": 0.7, "latency_ms": {}}}}
+        self.assertEqual(compare(results, baseline, tolerance=0.02), [("hybrid", "mrr@10", 0.85, 0.7)])
+
+    def test_recorded_embeddings_replay_offline(self):
+        """Recorded vectors are replayed; missing texts fail unless a live client records them."""
+        with tempfile.TemporaryDirectory() as tmp:
+            store = EmbeddingStore(tmp, "model")
+            with self.assertRaises(KeyError):
+                RecordedEmbeddings(store).embed_query("hours")
+            recorded = RecordedEmbeddings(store, live=FakeEmbeddings(latency=0)).embed_query("hours")
+            self.assertEqual(RecordedEmbeddings(store).embed_query("hours"), recorded)
+
+    def test_backend_evaluation(self):
+        """A backend run reports recall@k, MRR and latency percentiles, and restores the module."""
+        docs = faq_search_rag.load_faq_data("FAQ_library.txt")
+        questions = load_questions(DEFAULT_QUESTIONS)[:10]
+        backend = faq_search_rag.RETRIEVAL_BACKEND
+        with tempfile.TemporaryDirectory() as workdir:
+            report = evaluate_backend("hybrid", docs, questions, FakeEmbeddings(latency=0), workdir, [1, 5], repeat=1)
+        self.assertEqual(set(report), {"recall@1", "recall@5", "mrr@10", "latency_ms", "misses"})
+        self.assertGreaterEqual(report["recall@5"], report["recall@1"])
+        self.assertEqual(set(report["latency_ms"]), {"p50", "p95", "p99", "mean"})
+        self.assertEqual(faq_search_rag.RETRIEVAL_BACKEND, backend)
+
+    def test_production_takes_the_keyword_shortcut_first(self):
+        """The production backend ranks only the keyword match for questions the shortcut answers."""
+        docs = faq_search_rag.load_faq_data("FAQ_library.txt")
+        questions = load_questions(DEFAULT_QUESTIONS)[:10]
+        with tempfile.TemporaryDirectory() as workdir, \
+             mock.patch.object(faq_search_rag, "lexical_faq_match", return_value=None) as match, \
+             mock.patch.object(faq_search_rag, "retrieve_faq", return_value=[]) as retrieve:
+            report = evaluate_backend("production", docs, questions, FakeEmbeddings(latency=0), workdir, [1], repeat=1)
+        self.assertEqual(report["lexical_shortcut"], 0.0)
+        self.assertEqual(retrieve.call_count, len(questions) * 2)
+        self.assertEqual(match.call_count, len(questions) * 3)
+
+        question = docs[0].metadata["question"]
+        with tempfile.TemporaryDirectory() as workdir, \
+             mock.patch.object(faq_search_rag, "retrieve_faq", return_value=[]) as retrieve:
+            report = evaluate_backend("production", docs, [{"question": question, "relevant": {question}}],
+                                      FakeEmbeddings(latency=0), workdir, [1], repeat=1)
+        self.assertEqual((report["lexical_shortcut"], report["recall@1"]), (1.0, 1.0))
+        retrieve.assert_not_called()
+
+    def run_main(self, *args):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with mock.patch.object(sys, "argv", ["bench_retrieval", *args]), \
+             contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr), \
+             self.assertRaises(SystemExit) as exit:
+            main()
+        return exit.exception.code, stdout.getvalue(), stderr.getvalue()
+
+    def test_missing_recording_fails_unless_fake_is_asked_for(self):
+        """Without a recording the run stops; fake embeddings must be asked for and are labeled."""
+        with tempfile.TemporaryDirectory() as tmp:
+            code, _, stderr = self.run_main("--recording", tmp, "--backends", "lexical")
+            self.assertEqual(code, 2)
+            self.assertIn("--record", stderr)
+
+            questions = os.path.join(tmp, "questions.jsonl")
+            with open(questions, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps({"question": row["question"], "faq": row["faq"]}) + "\n"
+                             for row in load_questions(DEFAULT_QUESTIONS)[:3])
+            code, stdout, stderr = self.run_main("--recording", tmp, "--embeddings", "fake", "--questions", questions,
+                                                 "--backends", "lexical", "--repeat", "1", "--json")
+        self.assertEqual(code, 0)
+        self.assertIn("fake embeddings", stderr)
+        results = json.loads(stdout)
+        self.assertTrue(results["fake_embeddings"])
+        self.assertIn("warning", results)
+
+
+if __name__ == "__main__":
+    unittest.main()
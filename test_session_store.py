@@ -0,0 +1,317 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+
+import server
+from session_store import InMemorySessionStore, SQLiteSessionStore
+
+
+class SessionStoreTests:
+    """Behaviour shared by every backend; subclasses provide `make_store`."""
+
+    def test_create_and_list(self):
+        """Sessions are created once and listed in creation order."""
+        store = self.make_store()
+        self.assertTrue(store.create("a"))
+        self.assertTrue(store.create("b"))
+        self.assertFalse(store.create("a"))
+        self.assertEqual(store.sessions(), ["a", "b"])
+        self.assertTrue(store.exists("a"))
+        self.assertFalse(store.exists("c"))
+
+    def test_messages_are_appended_in_order(self):
+        """The history adapter appends to and reads from the store."""
+        store = self.make_store()
+        store.create("a")
+        history = store.history("a")
+        history.add_messages([HumanMessage(content="Hi"), AIMessage(content="Hello!")])
+        history.add_user_message("Hours?")
+
+        self.assertEqual([(m.type, m.content) for m in store.get_messages("a")],
+                         [("human", "Hi"), ("ai", "Hello!"), ("human", "Hours?")])
+        self.assertEqual(history.messages, store.get_messages("a"))
+
+    def test_appointment_and_summary_state(self):
+        """Appointment details and the summary state are stored per session."""
+        store = self.make_store()
+        store.create("a")
+        store.create("b")
+        self.assertEqual(store.get_appointment("a"), {})
+        self.assertIsNone(store.get_summary("a"))
+
+        store.set_appointment("a", {"date": "Friday", "time": "", "purpose": ""})
+        store.set_summary("a", {"text": "Asked about hours.", "upto": 4})
+        self.assertEqual(store.get_appointment("a")["date"], "Friday")
+        self.assertEqual(store.get_summary("a"), {"text": "Asked about hours.", "upto": 4})
+        self.assertEqual(store.get_appointment("b"), {})
+
+    def test_display_pages(self):
+        """History pages are numbered, stripped of model context and taken from either end."""
+        store = self.make_store()
+        store.create("a")
+        store.append_messages("a", [
+            HumanMessage(content="Hours?\n[Assistant]: Here is a relevant FAQ I found: ..."),
+            AIMessage(content="9 to 8."),
+        ])
+        store.append_messages("a", [HumanMessage(content=f"q{i}") for i in range(3, 7)])
+
+        self.assertEqual(store.last_seq("a"), 6)
+        everything = store.get_display_messages("a")
+        self.assertEqual([m["seq"] for m in everything], [1, 2, 3, 4, 5, 6])
+        self.assertEqual(everything[0], {"seq": 1, "role": "You", "content": "Hours?"})
+        self.assertEqual(everything[1], {"seq": 2, "role": "Bot", "content": "9 to 8."})
+
+        seqs = lambda **kwargs: [m["seq"] for m in store.get_display_messages("a", **kwargs)]
+        self.assertEqual(seqs(limit=2), [5, 6])
+        self.assertEqual(seqs(limit=2, before=5), [3, 4])
+        self.assertEqual(seqs(limit=2, after=1), [2, 3])
+        self.assertEqual(seqs(after=4), [5, 6])
+        self.assertEqual(seqs(after=6), [])
+        self.assertEqual(seqs(after=1, before=4), [2, 3])
+
+    def test_message_windows(self):
+        """Limited reads return the newest messages, and `after` the tail past a sequence number."""
+        store = self.make_store()
+        store.create("a")
+        store.append_messages("a", [HumanMessage(content=f"q{i}") for i in range(1, 7)])
+
+        contents = lambda **kwargs: [m.content for m in store.get_messages("a", **kwargs)]
+        self.assertEqual(contents(limit=2), ["q5", "q6"])
+        self.assertEqual(contents(after=4), ["q5", "q6"])
+        self.assertEqual(contents(limit=2, after=1), ["q2", "q3"])
+        self.assertEqual(contents(after=6), [])
+        self.assertEqual(contents(limit=10), contents())
+        self.assertEqual([m.content for m in store.history("a", limit=3).messages], ["q4", "q5", "q6"])
+
+    def test_epoch_changes_when_a_session_is_recreated(self):
+        """The epoch identifies one incarnation of a session name."""
+        store = self.make_store()
+        store.create("a", created_at=100.0)
+        self.assertEqual(store.epoch("a"), 100_000_000)
+        store.delete("a")
+        store.create("a", created_at=100.5)
+        self.assertEqual(store.epoch("a"), 100_500_000)
+
+    def test_unknown_session(self):
+        """Reading or writing a session that was never created raises KeyError."""
+        store = self.make_store()
+        with self.assertRaises(KeyError):
+            store.get_appointment("missing")
+        with self.assertRaises(KeyError):
+            store.append_messages("missing", [HumanMessage(content="Hi")])
+
+    def test_concurrent_appends(self):
+        """Appends from many threads are all kept."""
+        store = self.make_store()
+        store.create("a")
+
+        def worker(n):
+            for i in range(20):
+                store.append_messages("a", [HumanMessage(content=f"{n}-{i}")])
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(store.get_messages("a")), 80)
+
+
+class TestInMemorySessionStore(SessionStoreTests, unittest.TestCase):
+
+    def make_store(self):
+        return InMemorySessionStore()
+
+
+class TestSQLiteSessionStore(SessionStoreTests, unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "sessions.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_store(self):
+        return SQLiteSessionStore(self.path)
+
+    def test_sessions_survive_restart(self):
+        """A new store on the same file (another process or a restart) sees the same sessions."""
+        store = self.make_store()
+        store.create("a")
+        store.append_messages("a", [HumanMessage(content="Hi")])
+        store.set_appointment("a", {"date": "Friday"})
+
+        reopened = self.make_store()
+        self.assertEqual(reopened.sessions(), ["a"])
+        self.assertEqual([m.content for m in reopened.get_messages("a")], ["Hi"])
+        self.assertEqual(reopened.get_appointment("a"), {"date": "Friday"})
+
+
+class TestSessionEviction(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.now = 1000.0
+        patch = mock.patch("session_store.time.monotonic", lambda: self.now)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_least_recently_used_session_is_dropped(self):
+        """Past max_sessions the least recently used session is evicted."""
+        store = InMemorySessionStore(max_sessions=2)
+        store.create("a")
+        store.create("b")
+        store.get_messages("a")  # "b" is now the least recently used
+        store.create("c")
+        self.assertEqual(store.sessions(), ["a", "c"])
+        self.assertFalse(store.exists("b"))
+        self.assertEqual(store.stats()["evicted"], 1)
+
+    def test_idle_session_expires(self):
+        """Sessions unused for longer than idle_ttl are evicted."""
+        store = InMemorySessionStore(idle_ttl=60)
+        store.create("a")
+        self.now += 30
+        store.create("b")
+        self.now += 45
+        self.assertEqual(store.sessions(), ["b"])
+
+    def test_expired_session_is_not_revived(self):
+        """Using or checking an expired session evicts it instead of refreshing it."""
+        store = InMemorySessionStore(idle_ttl=60)
+        store.create("a")
+        self.now += 61
+        with self.assertRaises(KeyError):
+            store.get_messages("a")
+        self.assertFalse(store.exists("a"))
+
+        store.create("b")
+        self.now += 61
+        self.assertFalse(store.exists("b"))
+        self.assertEqual(store.stats()["evicted"], 2)
+
+    def test_sweeper_evicts_without_requests(self):
+        """The background sweep evicts idle sessions on its own."""
+        store = InMemorySessionStore(idle_ttl=60)
+        store.create("a")
+        self.now += 61
+        store.start_sweeper(0.01)
+        for _ in range(200):
+            if store.evicted:
+                break
+            threading.Event().wait(0.01)
+        self.assertEqual(store.evicted, 1)
+
+    def test_spill_writes_do_not_block_memory_sessions(self):
+        """While an evicted session is written to disk, sessions in memory stay usable."""
+        spill = SQLiteSessionStore(os.path.join(self.tmp.name, "spill.db"))
+        release = threading.Event()
+        create = spill.create
+        spill.create = lambda *args, **kwargs: release.wait(5) and create(*args, **kwargs)
+        store = InMemorySessionStore(max_sessions=1, spill=spill)
+        store.create("a")
+        evicting = threading.Thread(target=store.create, args=("b",))  # Evicts "a" to the spill store
+        evicting.start()
+        try:
+            for _ in range(200):
+                if "a" in store._spilling:
+                    break
+                threading.Event().wait(0.01)
+            store.append_messages("b", [HumanMessage(content="Hi")])
+            self.assertEqual(store.last_seq("b"), 1)
+            self.assertTrue(store.exists("a"))
+        finally:
+            release.set()
+            evicting.join()
+        self.assertEqual(spill.sessions(), ["a"])
+
+    def test_evicted_session_spills_and_restores(self):
+        """With a spill store, an evicted session comes back intact on its next use."""
+        spill = SQLiteSessionStore(os.path.join(self.tmp.name, "spill.db"))
+        store = InMemorySessionStore(max_sessions=1, spill=spill)
+        store.create("a")
+        store.append_messages("a", [HumanMessage(content="Hi"), AIMessage(content="Hello!")])
+        store.set_appointment("a", {"date": "Friday"})
+        epoch = store.epoch("a")
+        store.create("b")
+
+        self.assertEqual(spill.sessions(), ["a"])
+        self.assertTrue(store.exists("a"))
+        self.assertEqual(store.stats()["spilled"]["sessions"], 1)
+
+        self.assertEqual([m.content for m in store.get_messages("a")], ["Hi", "Hello!"])
+        self.assertEqual(store.get_appointment("a"), {"date": "Friday"})
+        self.assertEqual(store.epoch("a"), epoch)  # Still the same session
+        self.assertEqual(spill.sessions(), ["b"])  # "b" made room for "a"
+        self.assertEqual(store.stats()["restored"], 1)
+
+    def test_stats_accounts_messages_and_bytes(self):
+        """Stats report live sessions, retained messages and the largest sessions."""
+        store = InMemorySessionStore()
+        store.create("small")
+        store.create("large")
+        store.append_messages("small", [HumanMessage(content="Hi")])
+        store.append_messages("large", [HumanMessage(content="x" * 5000), AIMessage(content="ok")])
+
+        stats = store.stats(top=1)
+        self.assertEqual((stats["sessions"], stats["messages"]), (2, 3))
+        self.assertEqual([entry["session"] for entry in stats["largest"]], ["large"])
+        self.assertGreater(stats["largest"][0]["bytes"], 5000)
+        self.assertEqual(stats["bytes_per_session"], stats["bytes"] / 2)
+
+
+class TestRoutesUseSessionStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.store = SQLiteSessionStore(os.path.join(self.tmp.name, "sessions.db"))
+        patch = mock.patch.object(server, "session_store", self.store)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.client = server.app.test_client()
+
+    def test_routes(self):
+        """/new_session, /sessions, /chat and /chat_history all read and write the configured store."""
+        self.client.post('/new_session', json={"session_name": "patron"})
+        self.assertEqual(self.client.get('/sessions').json["sessions"], ["patron"])
+
+        llm = FakeListChatModel(responses=["A librarian will help you shortly."])
+        with mock.patch.object(server, "classify_message", return_value={
+                "sentiment": "negative", "intent": None, "appointment": None}), \
+             mock.patch.object(server, "get_chat_llm", return_value=llm):
+            response = self.client.post('/chat', json={"session_name": "patron", "message": "This is awful"})
+        self.assertEqual(response.json["response"], "A librarian will help you shortly.")
+
+        self.assertEqual(len(self.store.get_messages("patron")), 2)
+        history = self.client.get('/chat_history?session_name=patron').json["chat_history"]
+        self.assertEqual(history, [{"role": "You", "content": "This is awful"},
+                                   {"role": "Bot", "content": "A librarian will help you shortly."}])
+
+        stats = self.client.get('/stats').json
+        self.assertEqual(stats["sessions"]["sessions"], 1)
+        self.assertEqual(stats["sessions"]["messages"], 2)
+
+    def test_session_list_is_revalidated(self):
+        """/sessions answers 304 until a session is created or deleted, by this client or another."""
+        self.client.post('/new_session', json={"session_name": "patron"})
+        first = self.client.get('/sessions')
+        etag = first.headers["ETag"]
+        self.assertEqual(self.client.get('/sessions', headers={"If-None-Match": etag}).status_code, 304)
+
+        self.store.create("other")
+        changed = self.client.get('/sessions', headers={"If-None-Match": etag})
+        self.assertEqual((changed.status_code, changed.json["sessions"]), (200, ["patron", "other"]))
+        self.store.delete("other")
+        self.assertEqual(self.client.get('/sessions', headers={"If-None-Match": etag}).status_code, 304)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import server
+
+
+class TestStartup(unittest.TestCase):
+
+    def test_import_is_side_effect_free(self):
+        """Importing the server loads no client libraries and neither reads nor syncs the FAQ."""
+        code = (
+            "import json, sys, server\n"
+            "print(json.dumps({'faq_loaded': server.faq_data is not None,\n"
+            "                  'modules': [m for m in ('openai', 'langchain_openai', 'pinecone', 'langchain_core.runnables')\n"
+            "                              if m in sys.modules]}))"
+        )
+        result = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, check=True)
+        self.assertEqual(json.loads(result.stdout.strip().splitlines()[-1]), {"faq_loaded": False, "modules": []})
+
+    def test_create_app_warmup_modes(self):
+        """Each app serves the chat API; only "blocking" warms up before returning."""
+        with mock.patch.object(server, "warm_up") as warm_up:
+            app = server.create_app(warmup="off")
+            warm_up.assert_not_called()
+            server.create_app(warmup="blocking")
+            warm_up.assert_called_once_with()
+        self.assertIn("/chat/stream", {rule.rule for rule in app.url_map.iter_rules()})
+
+    def test_faq_is_loaded_once(self):
+        """load_faq reads the FAQ on first use and reuses it afterwards."""
+        with mock.patch.object(server, "faq_data", None), \
+             mock.patch.object(server, "load_faq_data", return_value=[mock.Mock()]) as load_faq_data, \
+             mock.patch.object(server, "build_lexical_index"), \
+             mock.patch.object(server, "load_cached_embeddings", return_value=[]), \
+             mock.patch.object(server.fast_classifier, "set_prototypes"):
+            server.load_faq()
+            server.load_faq()
+        load_faq_data.assert_called_once_with(server.file_name)
+
+    def test_failed_load_is_not_cached_or_synced(self):
+        """A failed FAQ load raises, is retried on the next call and never reaches the sync."""
+        for result in [None, []]:
+            with mock.patch.object(server, "faq_data", None), \
+                 mock.patch.object(server, "load_faq_data", return_value=result) as load_faq_data, \
+                 mock.patch.object(server, "sync_faq_to_pinecone") as sync:
+                with self.assertRaises(RuntimeError):
+                    server.load_faq()
+                self.assertIsNone(server.faq_data)
+                server.warm_up()
+                self.assertEqual(load_faq_data.call_count, 2)
+                sync.assert_not_called()
+
+    def test_faq_source_is_relative_to_the_module(self):
+        self.assertEqual(os.path.dirname(server.file_name), os.path.dirname(os.path.abspath(server.__file__)))
+
+    def test_faq_cache_is_relative_to_the_module(self):
+        """The server and ingest_faq.py use the same embedding and index cache from any working directory."""
+        root = os.path.dirname(os.path.abspath(__file__))
+        code = ("import json, faq_search_rag\n"
+                "print(json.dumps([faq_search_rag.FAQ_CACHE_DIR, faq_search_rag.LOCAL_INDEX_DIR]))")
+        env = {name: value for name, value in os.environ.items() if name not in ("FAQ_CACHE_DIR", "LOCAL_INDEX_DIR")}
+        env["PYTHONPATH"] = root
+        with tempfile.TemporaryDirectory() as elsewhere:
+            result = subprocess.run([sys.executable, "-c", code], cwd=elsewhere, env=env,
+                                    capture_output=True, text=True, check=True)
+        cache_dir, index_dir = json.loads(result.stdout.strip().splitlines()[-1])
+        self.assertTrue(cache_dir.startswith(os.path.join(root, ".faq_cache")))
+        self.assertEqual(index_dir, os.path.join(cache_dir, "index"))
+
+
+if __name__ == "__main__":
+    unittest.main()
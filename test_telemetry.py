@@ -0,0 +1,137 @@
+import asyncio
+import io
+import json
+import logging
+import unittest
+from unittest import mock
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+import server
+import telemetry
+from answer_cache import SemanticAnswerCache
+from telemetry import Counter, Histogram, JSONFormatter, SampledFilter, Trace, span
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_histogram_renders_cumulative_buckets(self):
+        """Buckets are cumulative and end with +Inf, followed by the sum and count."""
+        histogram = Histogram("test_seconds", "Test latency.", ["stage"], buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value, stage="embedding")
+        lines = list(histogram.samples())
+        self.assertEqual(lines, [
+            'test_seconds_bucket{stage="embedding",le="0.1"} 1',
+            'test_seconds_bucket{stage="embedding",le="1.0"} 2',
+            'test_seconds_bucket{stage="embedding",le="+Inf"} 3',
+            'test_seconds_sum{stage="embedding"} 5.55',
+            'test_seconds_count{stage="embedding"} 3',
+        ])
+
+    def test_counter_renders_total_and_escapes_labels(self):
+        """Counters are exported with a _total suffix and quoted label values are escaped."""
+        counter = Counter("test_lookups", "Test lookups.", ["cache"])
+        counter.inc(cache='say "hi"')
+        counter.inc(2, cache='say "hi"')
+        self.assertEqual(list(counter.samples()), ['test_lookups_total{cache="say \\"hi\\""} 3.0'])
+
+
+class TestTracing(unittest.TestCase):
+
+    def test_spans_attach_to_trace_across_threads(self):
+        """Spans opened in asyncio.to_thread workers are recorded on the request's trace."""
+        trace = Trace("/test", sample_rate=1.0)
+
+        def embed():
+            with span("embedding") as stage:
+                stage["cache_hit"] = False
+
+        async def handle():
+            with span("classification", intent="faq_question"):
+                pass
+            await asyncio.to_thread(embed)
+
+        asyncio.run(telemetry.traced(trace, handle()))
+        summary = trace.finish()
+        self.assertEqual([s["stage"] for s in summary["spans"]], ["classification", "embedding"])
+        self.assertEqual(summary["spans"][0]["intent"], "faq_question")
+        self.assertIs(summary["spans"][1]["cache_hit"], False)
+        self.assertIsNone(telemetry.current_trace())
+
+    def test_failed_span_is_flagged(self):
+        """A span that raises records the exception type and still counts its duration."""
+        trace = Trace("/test")
+        before = telemetry.STAGE_SECONDS.count(stage="generation")
+        with telemetry.activate(trace), self.assertRaises(TimeoutError):
+            with span("generation"):
+                raise TimeoutError()
+        self.assertEqual(trace.spans[0]["error"], "TimeoutError")
+        self.assertEqual(telemetry.STAGE_SECONDS.count(stage="generation"), before + 1)
+
+
+class TestSampledLogging(unittest.TestCase):
+
+    def log_lines(self, trace, level):
+        stream = io.StringIO()
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(JSONFormatter())
+        handler.addFilter(SampledFilter())
+        logger = logging.getLogger("test_telemetry.sampled")
+        logger.propagate = False
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        with telemetry.activate(trace):
+            logger.log(level, "Chat turn", extra={"session": "s1"})
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    def test_sampled_trace_is_logged_with_trace_id(self):
+        """Records of a sampled request are written as JSON tagged with the trace."""
+        trace = Trace("/chat", sample_rate=1.0)
+        [entry] = self.log_lines(trace, logging.INFO)
+        self.assertEqual((entry["msg"], entry["session"], entry["route"]), ("Chat turn", "s1", "/chat"))
+        self.assertEqual(entry["trace_id"], trace.trace_id)
+
+    def test_unsampled_trace_keeps_only_warnings(self):
+        """INFO lines of unsampled requests are dropped; warnings are always written."""
+        trace = Trace("/chat", sample_rate=0.0)
+        self.assertEqual(self.log_lines(trace, logging.INFO), [])
+        self.assertEqual(len(self.log_lines(trace, logging.WARNING)), 1)
+
+
+class TestMetricsEndpoint(unittest.TestCase):
+
+    def setUp(self):
+        """Stub out classification and the model so /chat runs offline."""
+        self.client = server.app.test_client()
+        self.client.post('/new_session', json={"session_name": "metrics_session"})
+        patches = [
+            mock.patch.object(server, "classify_message", return_value={
+                "sentiment": "neutral", "intent": "general_inquiry", "appointment": None}),
+            mock.patch.object(server, "get_chat_llm", return_value=FakeListChatModel(responses=["Hello there!"])),
+            mock.patch.object(server, "answer_cache", SemanticAnswerCache()),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_chat_turn_is_exported(self):
+        """A /chat turn shows up in the request, stage and token metrics."""
+        requests = telemetry.REQUESTS.value(route="/chat", outcome="ok")
+        response = self.client.post('/chat', json={"session_name": "metrics_session", "message": "Hi"})
+        self.assertEqual(response.json["response"], "Hello there!")
+        self.assertEqual(telemetry.REQUESTS.value(route="/chat", outcome="ok"), requests + 1)
+
+        metrics = self.client.get('/metrics')
+        self.assertEqual(metrics.status_code, 200)
+        self.assertTrue(metrics.mimetype.startswith("text/plain"))
+        body = metrics.get_data(as_text=True)
+        self.assertIn("# TYPE chat_request_seconds histogram", body)
+        self.assertIn('chat_request_seconds_bucket{route="/chat",le="+Inf"}', body)
+        self.assertIn('chat_stage_seconds_count{stage="classification"}', body)
+        self.assertIn('chat_stage_seconds_count{stage="memory_write"}', body)
+        self.assertIn('chat_tokens_total{kind="completion"}', body)
+
+
+if __name__ == "__main__":
+    unittest.main()
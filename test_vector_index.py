@@ -0,0 +1,166 @@
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+from langchain.schema import Document
+
+import faq_search_rag
+from embedding_store import QueryEmbeddingCache
+from vector_index import LocalVectorIndex, as_embedding
+
+
+class TestLocalVectorIndex(unittest.TestCase):
+
+    def setUp(self):
+        """Create an empty index in a temporary directory."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.index = LocalVectorIndex(self.tmp.name, dimension=4)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_query_returns_matches_by_cosine_similarity(self):
+        """Matches are sorted by cosine similarity and carry their metadata."""
+        self.index.upsert([
+            ("hours", [1, 0, 0, 0], {"text": "We are open 9-8."}),
+            ("location", [0, 1, 0, 0], {"text": "123 Main Street."}),
+            ("wifi", [0.7, 0.7, 0, 0], {"text": "Free Wi-Fi."}),
+        ], namespace="faq")
+
+        results = self.index.query(vector=[2, 0.1, 0, 0], top_k=2, namespace="faq")
+        self.assertEqual([m["id"] for m in results["matches"]], ["hours", "wifi"])
+        self.assertEqual(results["matches"][0]["metadata"]["text"], "We are open 9-8.")
+        self.assertAlmostEqual(results["matches"][0]["score"], 2 / np.linalg.norm([2, 0.1]), places=5)
+
+    def test_top_k_matches_brute_force(self):
+        """argpartition top-k agrees with a full sort."""
+        rng = np.random.default_rng(0)
+        vectors = rng.normal(size=(50, 4))
+        self.index.upsert([(str(i), v, {}) for i, v in enumerate(vectors)])
+        query = rng.normal(size=4)
+
+        normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        expected = [str(i) for i in np.argsort(-(normalized @ (query / np.linalg.norm(query))))[:5]]
+        results = self.index.query(vector=query, top_k=5)
+        self.assertEqual([m["id"] for m in results["matches"]], expected)
+
+    def test_upsert_delete_and_reload(self):
+        """Upserts replace by ID, deletes remove, and a new instance sees the same data."""
+        self.index.upsert([("a", [1, 0, 0, 0], {"text": "a"}), ("b", [0, 1, 0, 0], {"text": "b"})])
+        self.index.upsert([("a", [0, 0, 1, 0], {"text": "a2"})])
+        self.index.delete(ids=["b"])
+
+        reloaded = LocalVectorIndex(self.tmp.name, dimension=4)
+        self.assertEqual(reloaded.ids(), ["a"])
+        match = reloaded.query(vector=[0, 0, 1, 0], top_k=3)["matches"][0]
+        self.assertEqual(match["metadata"]["text"], "a2")
+        self.assertAlmostEqual(match["score"], 1.0, places=5)
+
+    def test_rejects_wrong_dimension(self):
+        """Vectors with the wrong dimension are rejected."""
+        with self.assertRaises(ValueError):
+            self.index.upsert([("a", [1, 0, 0], {})])
+
+    def test_as_embedding_validates_in_bulk(self):
+        """Valid embeddings become float32 arrays; None, strings, NaN and wrong sizes are rejected."""
+        self.assertEqual(as_embedding([1, 2.5], dimension=2).dtype, np.float32)
+        for invalid in (None, [1.0, None], [1.0, "2"], [1.0, float("nan")], [1.0, 2.0, 3.0], [[1.0, 2.0]]):
+            with self.assertRaises(ValueError):
+                as_embedding(invalid, dimension=2)
+
+
+class TestQuantizedIndex(unittest.TestCase):
+
+    def setUp(self):
+        """Fill a float32 index with clustered vectors, like embeddings of related questions."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        rng = np.random.default_rng(1)
+        centers = rng.normal(size=(20, 64))
+        self.vectors = centers[rng.integers(0, 20, size=1000)] + 0.3 * rng.normal(size=(1000, 64))
+        self.queries = centers[rng.integers(0, 20, size=30)] + 0.3 * rng.normal(size=(30, 64))
+        LocalVectorIndex(self.tmp.name, dimension=64).upsert([(str(i), v, {}) for i, v in enumerate(self.vectors)])
+
+    def test_rescoring_keeps_recall_and_exact_scores(self):
+        """int8 and float16 scans with rescoring return the float32 top-k with exact scores."""
+        exact = LocalVectorIndex(self.tmp.name, dimension=64)
+        for dtype in ("int8", "float16"):
+            index = LocalVectorIndex(self.tmp.name, dimension=64, dtype=dtype, rescore=4)
+            self.assertGreaterEqual(index.recall(self.queries, top_k=10), 0.99)
+            expected = exact.query(self.queries[0], top_k=3)["matches"]
+            self.assertEqual(index.query(self.queries[0], top_k=3)["matches"], expected)
+
+    def test_quantized_matrix_is_smaller(self):
+        """The scanned int8 matrix takes about a quarter of the float32 one."""
+        full = LocalVectorIndex(self.tmp.name, dimension=64).memory_bytes()
+        int8 = LocalVectorIndex(self.tmp.name, dimension=64, dtype="int8").memory_bytes()
+        self.assertEqual(full, 1000 * 64 * 4)
+        self.assertLess(int8, full / 3)
+
+    def test_without_rescoring_recall_is_measured(self):
+        """Skipping rescoring trades recall for speed, and `recall` reports by how much."""
+        index = LocalVectorIndex(self.tmp.name, dimension=64, dtype="int8", rescore=0)
+        recall = index.recall(self.queries, top_k=10)
+        self.assertGreater(recall, 0.8)
+        self.assertLessEqual(recall, 1.0)
+
+    def test_quantized_copy_follows_updates(self):
+        """Upserts through any instance refresh the quantized copy read by the others."""
+        index = LocalVectorIndex(self.tmp.name, dimension=64, dtype="int8")
+        index.query(self.queries[0], top_k=1)
+        target = np.zeros(64)
+        target[0] = 1.0
+        LocalVectorIndex(self.tmp.name, dimension=64).upsert([("new", target, {"text": "new"})])
+        self.assertEqual(index.query(target, top_k=1)["matches"][0]["id"], "new")
+
+    def test_rejects_unknown_dtype(self):
+        """Only float32, float16 and int8 are supported."""
+        with self.assertRaises(ValueError):
+            LocalVectorIndex(self.tmp.name, dtype="int4")
+
+
+class TestLocalRetrievalBackend(unittest.TestCase):
+
+    def setUp(self):
+        """Select the local backend and patch the embeddings client."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.embeddings = mock.Mock()
+        self.embeddings.embed_documents.side_effect = lambda texts: [self._vector(t) for t in texts]
+        self.embeddings.embed_query.side_effect = self._vector
+        self.pc = mock.Mock()
+
+        patches = [
+            mock.patch.object(faq_search_rag, "get_embeddings", return_value=self.embeddings),
+            mock.patch.object(faq_search_rag, "get_pinecone", return_value=self.pc),
+            mock.patch.object(faq_search_rag, "FAQ_CACHE_DIR", self.tmp.name),
+            mock.patch.object(faq_search_rag, "RETRIEVAL_BACKEND", "local"),
+            mock.patch.object(faq_search_rag, "local_index", LocalVectorIndex(self.tmp.name + "/index")),
+            mock.patch.object(faq_search_rag, "query_cache", QueryEmbeddingCache("test-model")),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    @staticmethod
+    def _vector(text):
+        vector = [0.0] * 1536
+        vector[0 if "hours" in text else 1] = 1.0
+        return vector
+
+    def test_sync_and_query_without_pinecone(self):
+        """The local backend answers queries without touching Pinecone."""
+        faq_search_rag.sync_faq_to_pinecone([
+            Document(page_content="What are the library's hours?\nOpen 9-8."),
+            Document(page_content="Where is the library?\n123 Main Street."),
+        ])
+        answer = faq_search_rag.query_faq_pinecone("library hours")
+        self.assertIn("Open 9-8.", answer)
+        self.pc.Index.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,318 @@
+"""
+In-process vector index for FAQ retrieval.
+
+`LocalVectorIndex` mirrors the small part of the Pinecone index API that the RAG code
+uses (`upsert`, `delete`, `query`), so it can be swapped in for `pc.Index(...)`. Vectors
+are stored per namespace as one contiguous, L2-normalized float32 matrix in a `.npy` file
+that is memory-mapped on load, and cosine top-k is a single matrix-vector product.
+
+With `dtype="float16"` or `"int8"` the index also keeps a quantized copy of the matrix
+(2 or 1 bytes per value instead of 4) and scans that instead. The best `top_k * rescore`
+candidates are then re-ranked with their float32 rows, which are read from the memory map
+on demand, so returned scores are exact and recall stays close to a full float32 scan;
+`recall` measures how close on a given set of queries.
+"""
+import json
+import os
+
+import numpy as np
+
+DTYPES = ("float32", "float16", "int8")
+
+# Rows converted to float32 at a time when scanning a quantized matrix, bounding temporary memory
+SCAN_BLOCK_ROWS = 4096
+
+
+def as_embedding(vector, dimension=None):
+    """
+    Returns `vector` as a float32 array after checking it in vectorized form.
+
+    Args:
+        vector (list or numpy.ndarray): An embedding.
+        dimension (int, optional): The required number of values.
+
+    Raises:
+        ValueError: If the vector is empty, not one-dimensional, has the wrong dimension or contains
+            values that are not finite numbers (None, strings, NaN or infinity).
+    """
+    if vector is None:
+        raise ValueError("Embedding is None!")
+    values = np.asarray(vector)
+    if values.dtype.kind not in "fiu":  # None or strings turn the array into objects or text
+        raise ValueError("Embedding contains invalid values!")
+    values = values.astype(np.float32, copy=False)
+    if values.ndim != 1 or not values.size:
+        raise ValueError(f"Embedding has shape {values.shape} (expected a non-empty vector)")
+    if dimension is not None and values.shape[0] != dimension:
+        raise ValueError(f"Embedding has incorrect dimension: {values.shape[0]} (expected {dimension})")
+    if not np.isfinite(values).all():
+        raise ValueError("Embedding contains NaN or infinite values!")
+    return values
+
+
+def quantize(matrix, dtype):
+    """
+    Returns a quantized copy of a normalized float32 matrix and its per-row scales.
+
+    int8 rows are scaled so their largest absolute value maps to 127; float16 needs no scales.
+
+    Returns:
+        tuple: (quantized matrix, float32 scales or None).
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if dtype == "float16":
+        return matrix.astype(np.float16), None
+    scales = np.abs(matrix).max(axis=1) / 127 if len(matrix) else np.empty(0, dtype=np.float32)
+    scales = scales.astype(np.float32)
+    scales[scales == 0] = 1.0
+    return np.round(matrix / scales[:, None]).astype(np.int8), scales
+
+
+class LocalVectorIndex:
+    """
+    A Pinecone-compatible cosine-similarity index backed by memory-mapped NumPy files.
+
+    Args:
+        index_dir (str): Directory holding one sub-directory per namespace.
+        dimension (int): Expected embedding dimension.
+        dtype (str): Precision of the scanned matrix: "float32", "float16" or "int8".
+        rescore (int): With a quantized dtype, candidates per requested match that are re-ranked
+            with float32 vectors; 0 returns the approximate quantized ranking and scores.
+    """
+
+    def __init__(self, index_dir, dimension=1536, dtype="float32", rescore=4):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported index dtype {dtype!r} (expected one of {', '.join(DTYPES)})")
+        self.index_dir = index_dir
+        self.dimension = dimension
+        self.dtype = dtype
+        self.rescore = rescore
+        self._namespaces = {}  # namespace -> (meta mtime, ids, metadata, matrix, quantized, scales)
+
+    def _paths(self, namespace):
+        ns_dir = os.path.join(self.index_dir, namespace or "default")
+        return ns_dir, os.path.join(ns_dir, "vectors.npy"), os.path.join(ns_dir, "meta.json")
+
+    def _empty(self):
+        return [], [], np.empty((0, self.dimension), dtype=np.float32)
+
+    def _load(self, namespace):
+        """Returns (ids, metadata, matrix) for a namespace, reloading if another process rewrote it."""
+        loaded = self._load_all(namespace)
+        return loaded[:3] if loaded else self._empty()
+
+    def _load_all(self, namespace):
+        """Returns (ids, metadata, matrix, quantized, scales), or None if the namespace is empty."""
+        _, vectors_path, meta_path = self._paths(namespace)
+        try:
+            mtime = os.stat(meta_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+        cached = self._namespaces.get(namespace)
+        if cached and cached[0] == mtime:
+            return cached[1:]
+
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if not meta["ids"]:
+            return None
+        matrix = np.load(vectors_path, mmap_mode="r")
+        quantized, scales = matrix, None
+        if self.dtype != "float32":
+            quantized, scales = self._load_quantized(namespace, matrix)
+        self._namespaces[namespace] = (mtime, meta["ids"], meta["metadata"], matrix, quantized, scales)
+        return meta["ids"], meta["metadata"], matrix, quantized, scales
+
+    def _quantized_paths(self, namespace):
+        ns_dir = self._paths(namespace)[0]
+        return os.path.join(ns_dir, f"vectors.{self.dtype}.npy"), os.path.join(ns_dir, f"scales.{self.dtype}.npy")
+
+    def _load_quantized(self, namespace, matrix):
+        """Memory-maps the quantized matrix, rebuilding it if it is missing or older than the float32 one."""
+        quantized_path, scales_path = self._quantized_paths(namespace)
+        vectors_mtime = os.stat(self._paths(namespace)[1]).st_mtime_ns
+        try:
+            if os.stat(quantized_path).st_mtime_ns >= vectors_mtime:
+                quantized = np.load(quantized_path, mmap_mode="r")
+                scales = np.load(scales_path, mmap_mode="r") if self.dtype == "int8" else None
+                if quantized.shape == matrix.shape:
+                    return quantized, scales
+        except FileNotFoundError:
+            pass
+        # Written by another process with a different dtype, or by an older version
+        quantized, scales = quantize(matrix, self.dtype)
+        self._write_quantized(namespace, quantized, scales)
+        return quantized, scales
+
+    def _write_quantized(self, namespace, quantized, scales):
+        quantized_path, scales_path = self._quantized_paths(namespace)
+        for path, array in ((scales_path, scales), (quantized_path, quantized)):
+            if array is not None:
+                tmp_path = f"{path[:-len('.npy')]}.{os.getpid()}.tmp.npy"
+                np.save(tmp_path, array)
+                os.replace(tmp_path, path)
+
+    def _save(self, namespace, ids, metadata, matrix):
+        ns_dir, vectors_path, meta_path = self._paths(namespace)
+        os.makedirs(ns_dir, exist_ok=True)
+        self._namespaces.pop(namespace, None)  # Release our memory map before replacing the file
+
+        # Write to temporary files and swap them in, vectors first so readers keyed on
+        # the metadata file never see metadata that is newer than the matrix.
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        tmp_vectors = os.path.join(ns_dir, f"vectors.{os.getpid()}.tmp.npy")
+        np.save(tmp_vectors, matrix)
+        os.replace(tmp_vectors, vectors_path)
+        if self.dtype != "float32":
+            self._write_quantized(namespace, *quantize(matrix, self.dtype))
+
+        tmp_meta = f"{meta_path}.{os.getpid()}.tmp"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump({"ids": ids, "metadata": metadata}, f)
+        os.replace(tmp_meta, meta_path)
+
+    @staticmethod
+    def _normalize(matrix):
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def ids(self, namespace="default"):
+        """Returns the vector IDs currently stored in a namespace."""
+        return list(self._load(namespace)[0])
+
+    def upsert(self, vectors, namespace="default"):
+        """
+        Inserts or replaces vectors.
+
+        Args:
+            vectors (list): (id, values, metadata) tuples, as accepted by Pinecone.
+            namespace (str): The namespace to write to.
+        """
+        ids, metadata, matrix = self._load(namespace)
+        ids, metadata = list(ids), list(metadata)
+        rows = np.array(matrix, dtype=np.float32)  # Copy out of the memory map before editing
+        positions = {vector_id: i for i, vector_id in enumerate(ids)}
+
+        new_rows = []
+        for vector_id, values, meta in vectors:
+            values = np.asarray(values, dtype=np.float32)
+            if values.shape != (self.dimension,):
+                raise ValueError(f"Vector {vector_id} has dimension {values.shape} (expected {self.dimension})")
+            if vector_id in positions:
+                rows[positions[vector_id]] = values
+                metadata[positions[vector_id]] = meta or {}
+            else:
+                positions[vector_id] = len(ids)
+                ids.append(vector_id)
+                metadata.append(meta or {})
+                new_rows.append(values)
+
+        if new_rows:
+            rows = np.vstack([rows, np.stack(new_rows)])
+        self._save(namespace, ids, metadata, self._normalize(rows))
+
+    def delete(self, ids, namespace="default"):
+        """Removes vectors by ID; unknown IDs are ignored."""
+        current_ids, metadata, matrix = self._load(namespace)
+        drop = set(ids)
+        keep = [i for i, vector_id in enumerate(current_ids) if vector_id not in drop]
+        if len(keep) == len(current_ids):
+            return
+        self._save(
+            namespace,
+            [current_ids[i] for i in keep],
+            [metadata[i] for i in keep],
+            np.asarray(matrix, dtype=np.float32)[keep].reshape(len(keep), self.dimension),
+        )
+
+    def query(self, vector, top_k=3, include_metadata=True, namespace="default"):
+        """
+        Finds the `top_k` stored vectors with the highest cosine similarity to `vector`.
+
+        Returns:
+            dict: {"matches": [{"id", "score", "metadata"}, ...]} sorted by descending score.
+        """
+        loaded = self._load_all(namespace)
+        if not loaded or top_k <= 0:
+            return {"matches": []}
+        ids, metadata, matrix, quantized, scales = loaded
+
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        if quantized is matrix:
+            top, scores = self._top_k(matrix @ query, top_k)
+        else:
+            approximate = self._scan(quantized, scales, query)
+            if self.rescore > 0:
+                # Re-rank the best quantized candidates with their exact float32 rows
+                candidates, _ = self._top_k(approximate, top_k * self.rescore)
+                candidates.sort()  # Sequential reads from the memory map
+                order, scores = self._top_k(matrix[candidates] @ query, top_k)
+                top = candidates[order]
+            else:
+                top, scores = self._top_k(approximate, top_k)
+
+        matches = []
+        for i, score in zip(top, scores):
+            match = {"id": ids[i], "score": float(score)}
+            if include_metadata:
+                match["metadata"] = metadata[i]
+            matches.append(match)
+        return {"matches": matches}
+
+    @staticmethod
+    def _top_k(scores, k):
+        """Returns the positions of the `k` highest scores, best first, and those scores."""
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return top, scores[top]
+
+    @staticmethod
+    def _scan(quantized, scales, query):
+        """Approximate scores of every quantized row, converting one block of rows at a time."""
+        scores = np.empty(len(quantized), dtype=np.float32)
+        for start in range(0, len(quantized), SCAN_BLOCK_ROWS):
+            block = np.asarray(quantized[start:start + SCAN_BLOCK_ROWS], dtype=np.float32)
+            scores[start:start + len(block)] = block @ query
+        if scales is not None:
+            scores *= scales
+        return scores
+
+    def recall(self, queries, top_k=10, namespace="default"):
+        """
+        Measures recall@k of `query` against an exact float32 scan of the same vectors.
+
+        Args:
+            queries (list): Query vectors.
+            top_k (int): Matches compared per query.
+            namespace (str): The namespace to search.
+
+        Returns:
+            float: The mean share of the exact top-k IDs that `query` also returned (1.0 for float32).
+        """
+        loaded = self._load_all(namespace)
+        if not loaded or not len(queries):
+            return 1.0
+        ids, matrix = loaded[0], loaded[2]
+        found = 0
+        for vector in queries:
+            query = np.asarray(vector, dtype=np.float32)
+            query = query / (np.linalg.norm(query) or 1.0)
+            exact = {ids[i] for i in self._top_k(matrix @ query, top_k)[0]}
+            returned = {m["id"] for m in self.query(query, top_k=top_k, include_metadata=False, namespace=namespace)["matches"]}
+            found += len(exact & returned) / len(exact)
+        return found / len(queries)
+
+    def memory_bytes(self, namespace="default"):
+        """Returns the size of the matrix scanned on every query (plus its scales)."""
+        loaded = self._load_all(namespace)
+        if not loaded:
+            return 0
+        quantized, scales = loaded[3], loaded[4]
+        return int(quantized.nbytes + (scales.nbytes if scales is not None else 0))